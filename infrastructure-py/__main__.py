@@ -85,6 +85,48 @@ users_container = documentdb.SqlResourceSqlContainer("users-container",
     )
 )
 
+# Create the UserLookup container (username/email uniqueness index)
+user_lookup_container = documentdb.SqlResourceSqlContainer("user-lookup-container",
+    resource_group_name=resource_group.name,
+    account_name=cosmos_db_account.name,
+    database_name=cosmos_db.name,
+    resource=documentdb.SqlContainerResourceArgs(
+        id="UserLookup",
+        partition_key=documentdb.ContainerPartitionKeyArgs(
+            paths=["/id"],
+            kind="Hash"
+        )
+    )
+)
+
+# Create the Balances container (materialized per-group balances)
+balances_container = documentdb.SqlResourceSqlContainer("balances-container",
+    resource_group_name=resource_group.name,
+    account_name=cosmos_db_account.name,
+    database_name=cosmos_db.name,
+    resource=documentdb.SqlContainerResourceArgs(
+        id="Balances",
+        partition_key=documentdb.ContainerPartitionKeyArgs(
+            paths=["/id"],
+            kind="Hash"
+        )
+    )
+)
+
+# Create the Leases container (change feed checkpoints for realtime push)
+leases_container = documentdb.SqlResourceSqlContainer("leases-container",
+    resource_group_name=resource_group.name,
+    account_name=cosmos_db_account.name,
+    database_name=cosmos_db.name,
+    resource=documentdb.SqlContainerResourceArgs(
+        id="Leases",
+        partition_key=documentdb.ContainerPartitionKeyArgs(
+            paths=["/id"],
+            kind="Hash"
+        )
+    )
+)
+
 # Create the Groups container
 groups_container = documentdb.SqlResourceSqlContainer("groups-container",
     resource_group_name=resource_group.name,
@@ -99,6 +141,34 @@ groups_container = documentdb.SqlResourceSqlContainer("groups-container",
     )
 )
 
+# Create the Payments container (read by the group balances and the realtime change feed)
+payments_container = documentdb.SqlResourceSqlContainer("payments-container",
+    resource_group_name=resource_group.name,
+    account_name=cosmos_db_account.name,
+    database_name=cosmos_db.name,
+    resource=documentdb.SqlContainerResourceArgs(
+        id="Payments",
+        partition_key=documentdb.ContainerPartitionKeyArgs(
+            paths=["/id"],
+            kind="Hash"
+        )
+    )
+)
+
+# Create the Purchases container
+purchases_container = documentdb.SqlResourceSqlContainer("purchases-container",
+    resource_group_name=resource_group.name,
+    account_name=cosmos_db_account.name,
+    database_name=cosmos_db.name,
+    resource=documentdb.SqlContainerResourceArgs(
+        id="Purchases",
+        partition_key=documentdb.ContainerPartitionKeyArgs(
+            paths=["/id"],
+            kind="Hash"
+        )
+    )
+)
+
 # Create the Expenses container
 expenses_container = documentdb.SqlResourceSqlContainer("expenses-container",
     resource_group_name=resource_group.name,
@@ -212,6 +282,30 @@ python_api_app = web.WebApp("whobought-fastapi",
                 name="COSMOS_USER_CONTAINER_NAME",
                 value="Users"
             ),
+            web.NameValuePairArgs(
+                name="COSMOS_USER_LOOKUP_CONTAINER_NAME",
+                value="UserLookup"
+            ),
+            web.NameValuePairArgs(
+                name="COSMOS_GROUPS_CONTAINER_NAME",
+                value="Groups"
+            ),
+            web.NameValuePairArgs(
+                name="COSMOS_PAYMENTS_CONTAINER_NAME",
+                value="Payments"
+            ),
+            web.NameValuePairArgs(
+                name="COSMOS_PURCHASES_CONTAINER_NAME",
+                value="Purchases"
+            ),
+            web.NameValuePairArgs(
+                name="COSMOS_BALANCES_CONTAINER_NAME",
+                value="Balances"
+            ),
+            web.NameValuePairArgs(
+                name="COSMOS_LEASES_CONTAINER_NAME",
+                value="Leases"
+            ),
             web.NameValuePairArgs(
                 name="JWT_SECRET_KEY",
                 value=jwt_secret.result
@@ -236,10 +330,19 @@ python_api_app = web.WebApp("whobought-fastapi",
                 name="WEBSITES_PORT",
                 value="8000"
             ),
+            web.NameValuePairArgs(
+                name="WEBSITE_SWAP_WARMUP_PING_PATH",
+                value="/health/ready"
+            ),
+            web.NameValuePairArgs(
+                name="WEBSITE_SWAP_WARMUP_PING_STATUSES",
+                value="200"
+            ),
         ],
         python_version="3.9",
         always_on=True,
-        linux_fx_version="PYTHON|3.9"
+        linux_fx_version="PYTHON|3.9",
+        health_check_path="/health/ready"
     ),
     https_only=True
 )
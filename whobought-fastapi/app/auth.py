@@ -1,11 +1,16 @@
 import os
+import hashlib
+import time
 import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
+from functools import lru_cache
 import logging
 
+from .cache import LRUCache
+
 logger = logging.getLogger(__name__)
 
 # JWT Settings (loaded from environment variables)
@@ -15,9 +20,43 @@ JWT_EXPIRATION_MINUTES = int(os.environ.get("JWT_EXPIRATION_MINUTES", "60"))
 JWT_ISSUER = os.environ.get("JWT_ISSUER", "WhoBoughtApp")
 JWT_AUDIENCE = os.environ.get("JWT_AUDIENCE", "WhoBoughtUsers")
 
+# Verified tokens remembered until they expire, 0 to disable
+JWT_CACHE_MAX_ENTRIES = int(os.environ.get("JWT_CACHE_MAX_ENTRIES", "10000"))
+
 # OAuth2 scheme for token extraction
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 
+
+class VerifiedTokenCache(LRUCache):
+    """Size-bounded LRU cache of verified token claims, each kept until the token's exp"""
+    
+    # Entries expire at the token's exp, a Unix timestamp
+    clock = staticmethod(time.time)
+    
+    @staticmethod
+    def _key(token: str) -> bytes:
+        # Keep digests rather than the bearer tokens themselves
+        return hashlib.sha256(token.encode()).digest()
+    
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Get the claims of a previously verified token that has not expired"""
+        if not self.enabled:
+            return None
+        payload = self.lookup(self._key(token))
+        return dict(payload) if payload is not None else None
+    
+    def set(self, token: str, payload: Dict[str, Any]):
+        """Remember verified claims until the token's exp, evicting the least recently used if full"""
+        expires_at = payload.get("exp")
+        if self.enabled and isinstance(expires_at, (int, float)):
+            self.store(self._key(token), dict(payload), expires_at)
+
+
+@lru_cache()
+def get_token_cache() -> VerifiedTokenCache:
+    """Singleton factory function for VerifiedTokenCache"""
+    return VerifiedTokenCache(JWT_CACHE_MAX_ENTRIES)
+
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """
     Create a JWT access token
@@ -61,6 +100,9 @@ def decode_token(token: str) -> Dict[str, Any]:
     """
     Decode and validate a JWT token
     
+    Tokens that verified successfully are cached until their exp, so repeat
+    requests with the same token skip signature and claim verification.
+    
     Args:
         token: JWT token to decode
         
@@ -70,6 +112,11 @@ def decode_token(token: str) -> Dict[str, Any]:
     Raises:
         HTTPException: If token is invalid or expired
     """
+    token_cache = get_token_cache()
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+    
     try:
         payload = jwt.decode(
             token, 
@@ -79,6 +126,7 @@ def decode_token(token: str) -> Dict[str, Any]:
             issuer=JWT_ISSUER,
             audience=JWT_AUDIENCE
         )
+        token_cache.set(token, payload)
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(
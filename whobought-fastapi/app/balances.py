@@ -0,0 +1,244 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+def to_cents(amounts: np.ndarray) -> np.ndarray:
+    """Convert decimal amounts to integer cents"""
+    return np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)
+
+
+def from_cents(cents: int) -> float:
+    """Convert integer cents back to a decimal amount"""
+    return round(int(cents) / 100, 2)
+
+
+class GroupBalances:
+    """Net positions and pairwise debts for the members of a group"""
+
+    def __init__(self, members: np.ndarray, net_cents: np.ndarray, debtors: np.ndarray,
+                 creditors: np.ndarray, debt_cents: np.ndarray, item_count: int):
+        self.members = members
+        # Positive: the member is owed money, negative: the member owes money
+        self.net_cents = net_cents
+        # Netted pairwise debts: debtors[k] owes creditors[k] debt_cents[k]
+        self.debtors = debtors
+        self.creditors = creditors
+        self.debt_cents = debt_cents
+        self.item_count = item_count
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialise balances for an API response"""
+        members = self.members.tolist()
+        return {
+            "itemCount": self.item_count,
+            "balances": [
+                {"userId": user_id, "net": from_cents(net)}
+                for user_id, net in zip(members, self.net_cents.tolist())
+            ],
+            "owes": [
+                {"from": members[debtor], "to": members[creditor], "amount": from_cents(amount)}
+                for debtor, creditor, amount in zip(
+                    self.debtors.tolist(), self.creditors.tolist(), self.debt_cents.tolist()
+                )
+            ],
+        }
+
+
+def compute_balances(items: Iterable[Dict[str, Any]]) -> GroupBalances:
+    """
+    Compute net balances and pairwise debts from a group's items
+
+    Each item's amount is converted to integer cents and split evenly between
+    the users in paidFor; leftover cents go to the first participants so the
+    shares always add up to the amount. The purchaser is credited the full
+    amount and each participant is debited their share. All arithmetic is done
+    with vectorised scatter-adds over flat arrays, one entry per (item,
+    participant) pair.
+
+    Args:
+        items: Item documents with purchasedBy, amount and paidFor
+
+    Returns:
+        GroupBalances for every user that appears in the items
+    """
+    purchasers: List[str] = []
+    amounts: List[float] = []
+    counts: List[int] = []
+    participants: List[str] = []
+    for item in items:
+        paid_for = item.get("paidFor") or []
+        if not paid_for:
+            continue
+        purchasers.append(item["purchasedBy"])
+        amounts.append(item["amount"])
+        counts.append(len(paid_for))
+        participants.extend(paid_for)
+
+    item_count = len(purchasers)
+    if item_count == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return GroupBalances(np.empty(0, dtype=object), empty, empty, empty, empty, 0)
+
+    # Map user ids to dense indices (a dict is much faster than np.unique on strings)
+    member_index: Dict[str, int] = {}
+    intern = member_index.setdefault
+    purchaser_index = np.fromiter(
+        (intern(user_id, len(member_index)) for user_id in purchasers), dtype=np.int64, count=item_count
+    )
+    participant_index = np.fromiter(
+        (intern(user_id, len(member_index)) for user_id in participants), dtype=np.int64, count=len(participants)
+    )
+    members = np.array(list(member_index), dtype=object)
+    member_count = len(members)
+
+    # Split each item's cents into per-participant shares
+    amount_cents = to_cents(amounts)
+    share_counts = np.array(counts, dtype=np.int64)
+    share_item = np.repeat(np.arange(item_count), share_counts)
+    first_share = np.cumsum(share_counts) - share_counts
+    position = np.arange(len(participant_index)) - np.repeat(first_share, share_counts)
+    base, remainder = np.divmod(amount_cents, share_counts)
+    shares = base[share_item] + (position < remainder[share_item])
+
+    # Net position: credited for purchases, debited for shares
+    credited = np.bincount(purchaser_index, weights=amount_cents, minlength=member_count)
+    debited = np.bincount(participant_index, weights=shares, minlength=member_count)
+    net_cents = np.rint(credited - debited).astype(np.int64)
+
+    # Pairwise debts, netted per unordered pair: positive means low owes high
+    debtor = participant_index
+    creditor = purchaser_index[share_item]
+    owing = debtor != creditor
+    debtor, creditor, owed = debtor[owing], creditor[owing], shares[owing]
+    low = np.minimum(debtor, creditor)
+    high = np.maximum(debtor, creditor)
+    signed = np.where(debtor == low, owed, -owed)
+    pair_keys, pair_index = np.unique(low * member_count + high, return_inverse=True)
+    pair_totals = np.rint(np.bincount(pair_index, weights=signed)).astype(np.int64)
+
+    nonzero = pair_totals != 0
+    pair_keys, pair_totals = pair_keys[nonzero], pair_totals[nonzero]
+    pair_low, pair_high = np.divmod(pair_keys, member_count)
+    positive = pair_totals > 0
+    debtors = np.where(positive, pair_low, pair_high)
+    creditors = np.where(positive, pair_high, pair_low)
+
+    return GroupBalances(members, net_cents, debtors, creditors, np.abs(pair_totals), item_count)
+
+
+
+class BalanceDelta:
+    """Change to a group's net positions and pairwise debts, in cents"""
+
+    def __init__(self):
+        self.net: Dict[str, int] = {}
+        # pairs[low][high] > 0 means low owes high, < 0 means high owes low
+        self.pairs: Dict[str, Dict[str, int]] = {}
+        self.item_count = 0
+        self.payment_count = 0
+
+    def _add_net(self, user_id: str, cents: int):
+        self.net[user_id] = self.net.get(user_id, 0) + cents
+
+    def _add_debt(self, debtor: str, creditor: str, cents: int):
+        if debtor == creditor or cents == 0:
+            return
+        low, high = (debtor, creditor) if debtor < creditor else (creditor, debtor)
+        row = self.pairs.setdefault(low, {})
+        row[high] = row.get(high, 0) + (cents if debtor == low else -cents)
+
+    def add_item(self, item: Optional[Dict[str, Any]], sign: int = 1):
+        """Add (sign=1) or remove (sign=-1) an item's split, using the same rule as compute_balances"""
+        paid_for = (item or {}).get("paidFor") or []
+        if not paid_for:
+            return
+        purchaser = item["purchasedBy"]
+        cents = int(round(item["amount"] * 100))
+        base, remainder = divmod(cents, len(paid_for))
+
+        self._add_net(purchaser, sign * cents)
+        for position, participant in enumerate(paid_for):
+            share = base + (1 if position < remainder else 0)
+            self._add_net(participant, -sign * share)
+            self._add_debt(participant, purchaser, sign * share)
+        self.item_count += sign
+
+    def add_payment(self, payment: Optional[Dict[str, Any]], sign: int = 1):
+        """Add (sign=1) or remove (sign=-1) a payment from user_id to recipient_id"""
+        if not payment or not payment.get("recipient_id"):
+            return
+        payer = payment["user_id"]
+        recipient = payment["recipient_id"]
+        cents = int(round(payment["amount"] * 100))
+
+        self._add_net(payer, sign * cents)
+        self._add_net(recipient, -sign * cents)
+        # Paying someone reduces what you owe them
+        self._add_debt(payer, recipient, -sign * cents)
+        self.payment_count += sign
+
+    def is_empty(self) -> bool:
+        """Whether applying the delta would change nothing"""
+        return (
+            not self.item_count
+            and not self.payment_count
+            and not any(self.net.values())
+            and not any(any(row.values()) for row in self.pairs.values())
+        )
+
+    def apply_to(self, document: Dict[str, Any]):
+        """Merge the delta into a balance document in place"""
+        net = document.setdefault("net", {})
+        for user_id, cents in self.net.items():
+            net[user_id] = net.get(user_id, 0) + cents
+
+        pairs = document.setdefault("pairs", {})
+        for low, row in self.pairs.items():
+            stored = pairs.setdefault(low, {})
+            for high, cents in row.items():
+                total = stored.get(high, 0) + cents
+                if total:
+                    stored[high] = total
+                else:
+                    stored.pop(high, None)
+            if not stored:
+                del pairs[low]
+
+        document["itemCount"] = document.get("itemCount", 0) + self.item_count
+        document["paymentCount"] = document.get("paymentCount", 0) + self.payment_count
+
+    @classmethod
+    def from_balances(cls, balances: GroupBalances) -> "BalanceDelta":
+        """Build a delta equal to balances computed by compute_balances"""
+        delta = cls()
+        members = balances.members.tolist()
+        delta.net = dict(zip(members, balances.net_cents.tolist()))
+        for debtor, creditor, cents in zip(
+            balances.debtors.tolist(), balances.creditors.tolist(), balances.debt_cents.tolist()
+        ):
+            delta._add_debt(members[debtor], members[creditor], cents)
+        delta.item_count = balances.item_count
+        return delta
+
+
+def balance_summary(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Serialise a stored balance document for an API response"""
+    owes = []
+    for low, row in document.get("pairs", {}).items():
+        for high, cents in row.items():
+            if cents > 0:
+                owes.append({"from": low, "to": high, "amount": from_cents(cents)})
+            elif cents < 0:
+                owes.append({"from": high, "to": low, "amount": from_cents(-cents)})
+
+    return {
+        "itemCount": document.get("itemCount", 0),
+        "paymentCount": document.get("paymentCount", 0),
+        "balances": [
+            {"userId": user_id, "net": from_cents(cents)}
+            for user_id, cents in document.get("net", {}).items()
+        ],
+        "owes": owes,
+        "updatedAt": document.get("updatedAt"),
+    }
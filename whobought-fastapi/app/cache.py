@@ -0,0 +1,163 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+# Default cache settings, overridable per container with DOC_CACHE_TTL_<CONTAINER>
+DOC_CACHE_MAX_ENTRIES = int(os.environ.get("DOC_CACHE_MAX_ENTRIES", "1000"))
+DOC_CACHE_TTL_SECONDS = float(os.environ.get("DOC_CACHE_TTL_SECONDS", "30"))
+# Comma separated container names to skip caching for, or "*" for all
+DOC_CACHE_DISABLED = {
+    name.strip().lower()
+    for name in os.environ.get("DOC_CACHE_DISABLED", "").split(",")
+    if name.strip()
+}
+
+
+class LRUCache:
+    """Size-bounded LRU map with optional per-entry expiry and hit, miss and eviction counters
+
+    Expiry times are read from clock (time.monotonic unless a subclass uses
+    another clock, e.g. time.time for absolute expiry timestamps).
+    """
+
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, max_entries: int, enabled: bool = True):
+        self.max_entries = max_entries
+        self.enabled = enabled and max_entries > 0
+        # key -> (expiry time or None, value)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key: Hashable) -> Optional[Any]:
+        """Get a value and mark it recently used, or None if it is missing or expired"""
+        if not self.enabled:
+            return None
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= self.clock():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def store(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        """Store a value, evicting the least recently used entries if full"""
+        if not self.enabled:
+            return
+
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Drop an entry"""
+        self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry"""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the cache metrics"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "maxEntries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class DocumentCache(LRUCache):
+    """Size-bounded LRU cache of Cosmos documents with a time-to-live"""
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float, enabled: bool = True):
+        super().__init__(max_entries, enabled and ttl_seconds > 0)
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        # Completed writes to the container, so reads can tell whether one finished while they were in flight
+        self.generation = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached document, or None if it is missing or expired"""
+        document = self.lookup(key)
+        return dict(document) if document is not None else None
+
+    def set(self, key: str, document: Dict[str, Any], generation: Optional[int] = None):
+        """
+        Cache a document, evicting the least recently used one if full
+
+        Args:
+            key: Document id
+            document: Document to cache
+            generation: The cache's generation when the read that returned the
+                document was issued; the document is not cached if a write has
+                completed since, as it may predate that write
+        """
+        if generation is not None and generation != self.generation:
+            return
+        if self.enabled:
+            self.store(key, dict(document), self.clock() + self.ttl_seconds)
+
+    def written(self, key: Optional[str]):
+        """Drop a document after a write to it completed, and keep reads issued before the write from caching"""
+        self.generation += 1
+        if key is not None:
+            self.invalidate(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the cache metrics"""
+        stats = super().stats()
+        stats["ttlSeconds"] = self.ttl_seconds
+        return stats
+
+
+_caches: Dict[str, DocumentCache] = {}
+
+
+def get_document_cache(container_name: str) -> DocumentCache:
+    """Get the shared document cache for a container, creating it on first use"""
+    cache = _caches.get(container_name)
+    if cache is None:
+        ttl = float(os.environ.get(
+            f"DOC_CACHE_TTL_{container_name.upper()}",
+            str(DOC_CACHE_TTL_SECONDS)
+        ))
+        enabled = "*" not in DOC_CACHE_DISABLED and container_name.lower() not in DOC_CACHE_DISABLED
+        cache = DocumentCache(container_name, DOC_CACHE_MAX_ENTRIES, ttl, enabled)
+        _caches[container_name] = cache
+    return cache
+
+
+def document_written(container_name: str, key: Optional[str]):
+    """Tell the container's document cache, if it has one, that a write to key completed"""
+    cache = _caches.get(container_name)
+    if cache is not None:
+        cache.written(key)
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Metrics for every document cache, keyed by container name"""
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import os
+import socket
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from azure.cosmos import exceptions
+
+logger = logging.getLogger(__name__)
+
+# "cosmos" reads the containers' change feeds (also with COSMOS_BACKEND=memory), "off" disables push
+REALTIME_CHANGE_FEED = os.environ.get("REALTIME_CHANGE_FEED", "cosmos").lower()
+# Seconds to wait before polling again when there were no changes
+CHANGE_FEED_POLL_SECONDS = float(os.environ.get("CHANGE_FEED_POLL_SECONDS", "1"))
+# Changes read per poll
+CHANGE_FEED_PAGE_SIZE = int(os.environ.get("CHANGE_FEED_PAGE_SIZE", "100"))
+# Checkpoints are kept per processor name; each instance reads the whole feed for fan-out
+CHANGE_FEED_PROCESSOR_NAME = os.environ.get("CHANGE_FEED_PROCESSOR_NAME", socket.gethostname())
+
+
+class CosmosCheckpointStore:
+    """Checkpoint store that keeps continuation tokens in a leases container"""
+
+    def __init__(self, container):
+        self.container = container
+
+    async def load(self, name: str) -> Optional[str]:
+        try:
+            lease = await self.container.read_item(item=name, partition_key=name)
+            return lease.get("continuation")
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+
+    async def save(self, name: str, continuation: Optional[str]):
+        await self.container.upsert_item(body={"id": name, "continuation": continuation})
+
+
+class CosmosChangeFeedSource:
+    """Reads one page of changes at a time from a container's change feed"""
+
+    def __init__(self, container):
+        self.container = container
+
+    async def read_changes(self, continuation: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        headers: Dict[str, str] = {}
+
+        def capture_headers(response_headers, _):
+            headers.update(response_headers)
+
+        feed = self.container.query_items_change_feed(
+            is_start_from_beginning=False,
+            continuation=continuation,
+            max_item_count=CHANGE_FEED_PAGE_SIZE,
+            response_hook=capture_headers
+        )
+        changes: List[Dict[str, Any]] = []
+        async for page in feed.by_page():
+            changes = [document async for document in page]
+            break
+        # The etag response header is the change feed continuation token
+        return changes, headers.get("etag", continuation)
+
+
+class ChangeFeedProcessor:
+    """Polls a change feed source, hands each change to a handler, and checkpoints progress"""
+
+    def __init__(
+        self,
+        name: str,
+        source,
+        checkpoint_store,
+        handler: Callable[[Dict[str, Any]], Awaitable[None]],
+        poll_seconds: float = CHANGE_FEED_POLL_SECONDS
+    ):
+        self.name = name
+        self.source = source
+        self.checkpoint_store = checkpoint_store
+        self.handler = handler
+        self.poll_seconds = poll_seconds
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.changes_processed = 0
+        self.errors = 0
+
+    async def run(self):
+        """Process changes until cancelled"""
+        continuation = await self.checkpoint_store.load(self.name)
+        while True:
+            try:
+                changes, next_continuation = await self.source.read_changes(continuation)
+                for document in changes:
+                    try:
+                        await self.handler(document)
+                    except Exception as e:
+                        self.errors += 1
+                        logger.error(f"Change feed handler '{self.name}' failed: {str(e)}")
+                self.changes_processed += len(changes)
+
+                if next_continuation != continuation:
+                    await self.checkpoint_store.save(self.name, next_continuation)
+                    continuation = next_continuation
+                if not changes:
+                    await asyncio.sleep(self.poll_seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Change feed processor '{self.name}' failed: {str(e)}")
+                await asyncio.sleep(self.poll_seconds)
+
+    def start(self):
+        """Start processing in a background task"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+            logger.info(f"Started change feed processor '{self.name}'")
+
+    async def stop(self):
+        """Stop processing and wait for the background task to finish"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info(f"Stopped change feed processor '{self.name}'")
+
+
+def processor_name() -> str:
+    """Checkpoint name of this process: the instance name, plus the worker slot under gunicorn"""
+    # Every worker serves its own WebSocket clients, so each one reads the whole feed
+    worker_slot = os.environ.get("WORKER_SLOT")
+    if worker_slot is None:
+        return CHANGE_FEED_PROCESSOR_NAME
+    return f"{CHANGE_FEED_PROCESSOR_NAME}-{worker_slot}"
+
+
+def create_change_feed_processors(
+    cosmos_manager,
+    handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[None]]]
+) -> Dict[str, ChangeFeedProcessor]:
+    """
+    Build one processor per container according to REALTIME_CHANGE_FEED
+
+    Args:
+        cosmos_manager: The CosmosDBManager to read containers from
+        handlers: Change handler per container, keyed "items" or "payments"
+
+    Returns:
+        Processors keyed like handlers (empty when push is disabled)
+    """
+    if REALTIME_CHANGE_FEED != "cosmos" or not cosmos_manager.client:
+        if REALTIME_CHANGE_FEED not in ("cosmos", "off"):
+            logger.warning(f"Unknown REALTIME_CHANGE_FEED '{REALTIME_CHANGE_FEED}'; realtime push is disabled")
+        return {}
+
+    containers = {
+        "items": cosmos_manager.get_items_container(),
+        "payments": cosmos_manager.get_payments_container(),
+    }
+    name = processor_name()
+    checkpoint_store = CosmosCheckpointStore(cosmos_manager.get_leases_container())
+    return {
+        key: ChangeFeedProcessor(
+            f"{name}:{containers[key].id}",
+            CosmosChangeFeedSource(containers[key]),
+            checkpoint_store,
+            handler
+        )
+        for key, handler in handlers.items()
+    }
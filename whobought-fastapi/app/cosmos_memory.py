@@ -0,0 +1,1013 @@
+"""In-process stand-in for the async Cosmos DB client
+
+Implements the container methods the application uses, with a subset of
+Cosmos SQL, continuation tokens, etags, patch operations and a latest-version
+change feed, plus simulated latency, request charges and throttling so the
+repositories can be benchmarked and load-tested without an account. Selected
+with COSMOS_BACKEND=memory (see CosmosDBManager).
+"""
+import ast
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import re
+import time
+import uuid
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import orjson
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+
+logger = logging.getLogger(__name__)
+
+# Per-operation latency, e.g. "read=lognormal:3:0.4,write=uniform:5:12,*=fixed:1" (milliseconds)
+COSMOS_MEMORY_LATENCY = os.environ.get("COSMOS_MEMORY_LATENCY", "")
+# Fraction of requests that are randomly throttled with a 429
+COSMOS_MEMORY_THROTTLE_RATE = float(os.environ.get("COSMOS_MEMORY_THROTTLE_RATE", "0"))
+# Provisioned throughput per container; requests beyond it are throttled, 0 for unlimited
+COSMOS_MEMORY_RU_PER_SECOND = float(os.environ.get("COSMOS_MEMORY_RU_PER_SECOND", "0"))
+# Retry-after suggested for randomly throttled requests
+COSMOS_MEMORY_RETRY_AFTER_MS = float(os.environ.get("COSMOS_MEMORY_RETRY_AFTER_MS", "10"))
+# Throttled requests are retried like the SDK does (9 times by default) before a 429 is raised
+COSMOS_MEMORY_THROTTLE_RETRIES = int(os.environ.get("COSMOS_MEMORY_THROTTLE_RETRIES", "9"))
+# Seed for latency and throttling, for repeatable runs
+COSMOS_MEMORY_SEED = os.environ.get("COSMOS_MEMORY_SEED")
+
+_SYSTEM_FIELDS = ("_rid", "_self", "_etag", "_attachments", "_ts", "_lsn")
+
+
+class LatencyDistribution:
+    """Random per-request latency, configured as "kind:param:param" in milliseconds"""
+
+    KINDS = {
+        "fixed": lambda rng, ms: ms,
+        "uniform": lambda rng, low, high: rng.uniform(low, high),
+        "normal": lambda rng, mean, std: max(0.0, rng.gauss(mean, std)),
+        "lognormal": lambda rng, median, sigma: rng.lognormvariate(math.log(median), sigma),
+        "exponential": lambda rng, mean: rng.expovariate(1 / mean),
+    }
+
+    def __init__(self, kind: str, params: Tuple[float, ...]):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution: {kind!r}")
+        self.kind = kind
+        self.params = params
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        kind, *params = spec.strip().split(":")
+        return cls(kind, tuple(float(param) for param in params))
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw a latency in seconds"""
+        return self.KINDS[self.kind](rng, *self.params) / 1000
+
+
+def parse_latency(spec: str) -> Dict[str, LatencyDistribution]:
+    """
+    Parse a latency spec into distributions per operation kind
+
+    Args:
+        spec: Comma-separated "operation=distribution" pairs, where operation
+            is read, write, query or * (any other operation)
+
+    Returns:
+        Distributions keyed by operation kind
+    """
+    distributions = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        operation, _, distribution = part.partition("=")
+        if not distribution:
+            operation, distribution = "*", operation
+        distributions[operation.strip()] = LatencyDistribution.parse(distribution)
+    return distributions
+
+
+class SimulationSettings:
+    """Latency, throughput and throttling behaviour shared by the in-memory containers"""
+
+    def __init__(
+        self,
+        latency: Optional[Dict[str, LatencyDistribution]] = None,
+        throttle_rate: float = 0.0,
+        ru_per_second: float = 0.0,
+        retry_after_ms: float = 10.0,
+        throttle_retries: int = 9,
+        seed: Optional[int] = None
+    ):
+        self.latency = latency or {}
+        self.throttle_rate = throttle_rate
+        self.ru_per_second = ru_per_second
+        self.retry_after_ms = retry_after_ms
+        self.throttle_retries = throttle_retries
+        self.rng = random.Random(seed)
+
+    @classmethod
+    def from_env(cls) -> "SimulationSettings":
+        return cls(
+            latency=parse_latency(COSMOS_MEMORY_LATENCY),
+            throttle_rate=COSMOS_MEMORY_THROTTLE_RATE,
+            ru_per_second=COSMOS_MEMORY_RU_PER_SECOND,
+            retry_after_ms=COSMOS_MEMORY_RETRY_AFTER_MS,
+            throttle_retries=COSMOS_MEMORY_THROTTLE_RETRIES,
+            seed=int(COSMOS_MEMORY_SEED) if COSMOS_MEMORY_SEED else None
+        )
+
+    def delay(self, operation: str) -> float:
+        """Latency in seconds for one request of the given kind"""
+        distribution = self.latency.get(operation) or self.latency.get("*")
+        return distribution.sample(self.rng) if distribution else 0.0
+
+
+def _kilobytes(size: int) -> int:
+    return max(1, math.ceil(size / 1024))
+
+
+def read_charge(size: int) -> float:
+    """A point read costs about 1 RU per KB"""
+    return float(_kilobytes(size))
+
+
+def write_charge(size: int) -> float:
+    """A write with default indexing costs about 5.7 RU per KB"""
+    return round(5.7 * _kilobytes(size), 2)
+
+
+def query_charge(scanned: int, returned_size: int) -> float:
+    """Query base cost plus per-document scan and per-KB result costs"""
+    return round(2.8 + 0.05 * scanned + (returned_size / 1024 if returned_size else 0), 2)
+
+
+def _error(cls, status_code: int, message: str, headers: Optional[Dict[str, str]] = None):
+    error = cls(status_code=status_code, message=message)
+    error.headers = headers or {}
+    return error
+
+
+def not_found_error(message: str = "Entity with the specified id does not exist in the system."):
+    return _error(exceptions.CosmosResourceNotFoundError, 404, message)
+
+
+def conflict_error(message: str = "Entity with the specified id already exists in the system."):
+    return _error(exceptions.CosmosResourceExistsError, 409, message)
+
+
+def precondition_failed_error(message: str = "One of the specified pre-condition is not met."):
+    return _error(exceptions.CosmosAccessConditionFailedError, 412, message)
+
+
+def bad_request_error(message: str):
+    return _error(exceptions.CosmosHttpResponseError, 400, message)
+
+
+def throttled_error(retry_after: float):
+    return _error(
+        exceptions.CosmosHttpResponseError,
+        429,
+        "Request rate is large. More Request Units may be needed.",
+        {"x-ms-retry-after-ms": str(int(retry_after * 1000))}
+    )
+
+
+class _Undefined:
+    """Result of reading a property that does not exist"""
+
+    def __repr__(self):
+        return "undefined"
+
+
+UNDEFINED = _Undefined()
+
+_TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+      | (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<param>@[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<op><=|>=|!=|<>|=|<|>|\(|\)|,|\*|\.|\[|\])
+    )""", re.VERBOSE)
+
+_KEYWORDS = {
+    "SELECT", "DISTINCT", "VALUE", "TOP", "FROM", "WHERE", "ORDER", "BY", "ASC", "DESC",
+    "AND", "OR", "NOT", "AS", "TRUE", "FALSE", "NULL", "OFFSET", "LIMIT",
+}
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_PATTERN.match(text, position)
+        if not match or match.end() == position:
+            raise bad_request_error(f"Syntax error near {text[position:position + 20]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "name" and value.upper() in _KEYWORDS:
+            kind, value = "keyword", value.upper()
+        tokens.append((kind, value))
+        position = match.end()
+    tokens.append(("end", ""))
+    return tokens
+
+
+def _type_rank(value: Any) -> int:
+    if value is None:
+        return 1
+    if isinstance(value, bool):
+        return 2
+    if isinstance(value, (int, float)):
+        return 3
+    if isinstance(value, str):
+        return 4
+    return 5
+
+
+def _compare(op: str, left: Any, right: Any) -> Any:
+    if left is UNDEFINED or right is UNDEFINED:
+        return UNDEFINED
+    if op in ("=", "!=", "<>"):
+        equal = _type_rank(left) == _type_rank(right) and left == right
+        return equal if op == "=" else not equal
+    if _type_rank(left) != _type_rank(right) or _type_rank(left) > 4:
+        return UNDEFINED
+    if op == "<":
+        return left < right
+    if op == "<=":
+        return left <= right
+    if op == ">":
+        return left > right
+    return left >= right
+
+
+def _string_function(function: Callable[..., Any]) -> Callable[..., Any]:
+    def wrapper(*args):
+        if any(not isinstance(arg, str) for arg in args[:2]):
+            return UNDEFINED
+        return function(*args)
+    return wrapper
+
+
+def _array_contains(array, value, partial=False):
+    if not isinstance(array, list):
+        return UNDEFINED
+    if partial and isinstance(value, dict):
+        return any(
+            isinstance(element, dict) and all(element.get(key) == item for key, item in value.items())
+            for element in array
+        )
+    return value in array
+
+
+_FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "LOWER": _string_function(lambda value: value.lower()),
+    "UPPER": _string_function(lambda value: value.upper()),
+    "LENGTH": _string_function(len),
+    "CONTAINS": _string_function(
+        lambda value, part, ignore_case=False:
+        part.lower() in value.lower() if ignore_case else part in value
+    ),
+    "STARTSWITH": _string_function(
+        lambda value, prefix, ignore_case=False:
+        value.lower().startswith(prefix.lower()) if ignore_case else value.startswith(prefix)
+    ),
+    "ENDSWITH": _string_function(
+        lambda value, suffix, ignore_case=False:
+        value.lower().endswith(suffix.lower()) if ignore_case else value.endswith(suffix)
+    ),
+    "ARRAY_CONTAINS": _array_contains,
+    "ARRAY_LENGTH": lambda array: len(array) if isinstance(array, list) else UNDEFINED,
+    "IS_DEFINED": lambda value: value is not UNDEFINED,
+    "IS_NULL": lambda value: value is None,
+    "IS_STRING": lambda value: isinstance(value, str),
+    "IS_NUMBER": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+}
+
+# Compiled expressions take (document, parameters) and return a value
+Expression = Callable[[Dict[str, Any], Dict[str, Any]], Any]
+
+
+class CompiledSql:
+    """A parsed query that can be evaluated against documents"""
+
+    def __init__(self):
+        self.distinct = False
+        self.value = False
+        self.top: Optional[Expression] = None
+        self.projection: List[Tuple[str, Expression]] = []
+        self.where: Optional[Expression] = None
+        self.order: List[Tuple[Expression, bool]] = []
+        self.offset: Optional[Expression] = None
+        self.limit: Optional[Expression] = None
+
+    def run(self, documents: List[Dict[str, Any]], parameters: Dict[str, Any]) -> List[Any]:
+        """Evaluate the query over documents"""
+        if self.where is not None:
+            documents = [document for document in documents if self.where(document, parameters) is True]
+        for key, descending in reversed(self.order):
+            documents.sort(key=lambda document: _sort_key(key(document, parameters)), reverse=descending)
+
+        results = []
+        seen = set()
+        for document in documents:
+            result = self._project(document, parameters)
+            if result is UNDEFINED:
+                continue
+            if self.distinct:
+                marker = json.dumps(result, sort_keys=True)
+                if marker in seen:
+                    continue
+                seen.add(marker)
+            results.append(result)
+
+        if self.offset is not None:
+            results = results[self.offset({}, parameters):]
+        if self.limit is not None:
+            results = results[:self.limit({}, parameters)]
+        if self.top is not None:
+            results = results[:self.top({}, parameters)]
+        return results
+
+    def _project(self, document: Dict[str, Any], parameters: Dict[str, Any]) -> Any:
+        if not self.projection:
+            return document
+        if self.value:
+            return self.projection[0][1](document, parameters)
+        projected = {}
+        for name, expression in self.projection:
+            value = expression(document, parameters)
+            if value is not UNDEFINED:
+                projected[name] = value
+        return projected
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    if value is UNDEFINED:
+        return (0, 0)
+    rank = _type_rank(value)
+    return (rank, value if rank in (2, 3, 4) else 0)
+
+
+class _SqlParser:
+    """Recursive descent parser for the supported Cosmos SQL subset"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.position = 0
+        self.alias = "c"
+        # Name of the last property path parsed, used as the projected field name
+        self.last_name: Optional[str] = None
+
+    def peek(self, offset: int = 0) -> Tuple[str, str]:
+        return self.tokens[self.position + offset]
+
+    def take(self) -> Tuple[str, str]:
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def accept(self, value: str) -> bool:
+        if self.peek()[1] == value and self.peek()[0] in ("keyword", "op"):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, value: str):
+        if not self.accept(value):
+            raise bad_request_error(f"Expected {value!r} in query: {self.text}")
+
+    def parse(self) -> CompiledSql:
+        query = CompiledSql()
+        self.expect("SELECT")
+        query.distinct = self.accept("DISTINCT")
+        query.value = self.accept("VALUE")
+        if self.accept("TOP"):
+            query.top = self.parse_operand()
+
+        # The FROM alias is needed to resolve paths, so find it before parsing the projection
+        select_start = self.position
+        depth = 0
+        while not (self.peek() == ("keyword", "FROM") and depth == 0):
+            kind, value = self.take()
+            if kind == "end":
+                raise bad_request_error(f"Missing FROM in query: {self.text}")
+            depth += {"(": 1, ")": -1}.get(value, 0) if kind == "op" else 0
+        self.take()
+        self.alias = self.take()[1]
+        from_end = self.position
+        self.position = select_start
+
+        if not self.accept("*"):
+            while True:
+                expression, name = self.parse_expression(), None
+                if self.accept("AS"):
+                    name = self.take()[1]
+                query.projection.append((name or self.last_name or "$1", expression))
+                if not self.accept(","):
+                    break
+        self.position = from_end
+
+        if self.accept("WHERE"):
+            query.where = self.parse_expression()
+        if self.accept("ORDER"):
+            self.expect("BY")
+            while True:
+                key = self.parse_expression()
+                descending = self.accept("DESC")
+                if not descending:
+                    self.accept("ASC")
+                query.order.append((key, descending))
+                if not self.accept(","):
+                    break
+        if self.accept("OFFSET"):
+            query.offset = self.parse_operand()
+            self.expect("LIMIT")
+            query.limit = self.parse_operand()
+        if self.peek()[0] != "end":
+            raise bad_request_error(f"Unsupported query syntax near {self.peek()[1]!r}: {self.text}")
+        return query
+
+    def parse_expression(self) -> Expression:
+        left = self.parse_and()
+        while self.accept("OR"):
+            left = self._or(left, self.parse_and())
+        return left
+
+    @staticmethod
+    def _or(left: Expression, right: Expression) -> Expression:
+        return lambda document, parameters: left(document, parameters) is True or right(document, parameters) is True
+
+    @staticmethod
+    def _and(left: Expression, right: Expression) -> Expression:
+        return lambda document, parameters: left(document, parameters) is True and right(document, parameters) is True
+
+    def parse_and(self) -> Expression:
+        left = self.parse_not()
+        while self.accept("AND"):
+            left = self._and(left, self.parse_not())
+        return left
+
+    def parse_not(self) -> Expression:
+        if self.accept("NOT"):
+            operand = self.parse_not()
+
+            def negate(document, parameters):
+                value = operand(document, parameters)
+                return not value if isinstance(value, bool) else UNDEFINED
+            return negate
+        return self.parse_comparison()
+
+    def parse_comparison(self) -> Expression:
+        left = self.parse_operand()
+        kind, value = self.peek()
+        if kind == "op" and value in ("=", "!=", "<>", "<", "<=", ">", ">="):
+            self.take()
+            right = self.parse_operand()
+            return lambda document, parameters: _compare(value, left(document, parameters), right(document, parameters))
+        return left
+
+    def parse_operand(self) -> Expression:
+        self.last_name = None
+        kind, value = self.take()
+        if kind == "string":
+            literal = ast.literal_eval(value)
+            return lambda document, parameters: literal
+        if kind == "number":
+            number = float(value) if "." in value else int(value)
+            return lambda document, parameters: number
+        if kind == "param":
+            def parameter(document, parameters):
+                if value not in parameters:
+                    raise bad_request_error(f"Parameter {value} is not defined")
+                return parameters[value]
+            return parameter
+        if kind == "keyword" and value in ("TRUE", "FALSE", "NULL"):
+            constant = {"TRUE": True, "FALSE": False, "NULL": None}[value]
+            return lambda document, parameters: constant
+        if kind == "op" and value == "(":
+            expression = self.parse_expression()
+            self.expect(")")
+            return expression
+        if kind == "name" and self.peek() == ("op", "("):
+            return self.parse_function(value.upper())
+        if kind == "name" and value == self.alias:
+            return self.parse_path()
+        raise bad_request_error(f"Unsupported token {value!r} in query: {self.text}")
+
+    def parse_function(self, name: str) -> Expression:
+        if name not in _FUNCTIONS:
+            raise bad_request_error(f"Unsupported function {name} in query: {self.text}")
+        function = _FUNCTIONS[name]
+        self.expect("(")
+        arguments: List[Expression] = []
+        if not self.accept(")"):
+            while True:
+                arguments.append(self.parse_expression())
+                if not self.accept(","):
+                    break
+            self.expect(")")
+        self.last_name = None
+        return lambda document, parameters: function(*(argument(document, parameters) for argument in arguments))
+
+    def parse_path(self) -> Expression:
+        segments: List[Any] = []
+        while True:
+            if self.accept("."):
+                segments.append(self.take()[1])
+            elif self.accept("["):
+                kind, value = self.take()
+                segments.append(int(value) if kind == "number" else value[1:-1])
+                self.expect("]")
+            else:
+                break
+        path = tuple(segments)
+        self.last_name = str(path[-1]) if path else None
+
+        def resolve(document, parameters):
+            value: Any = document
+            for segment in path:
+                if isinstance(value, dict) and isinstance(segment, str) and segment in value:
+                    value = value[segment]
+                elif isinstance(value, list) and isinstance(segment, int) and 0 <= segment < len(value):
+                    value = value[segment]
+                else:
+                    return UNDEFINED
+            return value
+        return resolve
+
+
+@lru_cache(maxsize=512)
+def compile_sql(text: str) -> CompiledSql:
+    """Parse a query once per distinct query text"""
+    return _SqlParser(text).parse()
+
+
+def _split_path(path: str) -> List[str]:
+    if not path.startswith("/"):
+        raise bad_request_error(f"Invalid patch path: {path!r}")
+    return [segment.replace("~1", "/").replace("~0", "~") for segment in path[1:].split("/")]
+
+
+def apply_patch(document: Dict[str, Any], operations: List[Dict[str, Any]]):
+    """Apply Cosmos patch operations (add, set, replace, remove, incr) in place"""
+    for operation in operations:
+        op = operation.get("op")
+        segments = _split_path(operation.get("path", ""))
+        parent: Any = document
+        for segment in segments[:-1]:
+            if isinstance(parent, list):
+                parent = parent[int(segment)]
+            elif segment in parent:
+                parent = parent[segment]
+            elif op in ("add", "set"):
+                parent = parent.setdefault(segment, {})
+            else:
+                raise bad_request_error(f"Patch path {operation['path']!r} does not exist")
+        last = segments[-1]
+        value = operation.get("value")
+
+        if isinstance(parent, list):
+            if op == "add":
+                parent.insert(len(parent) if last == "-" else int(last), value)
+            elif op in ("set", "replace"):
+                parent[int(last)] = value
+            elif op == "remove":
+                del parent[int(last)]
+            elif op == "incr":
+                parent[int(last)] += value
+            else:
+                raise bad_request_error(f"Unsupported patch operation: {op!r}")
+            continue
+
+        if op in ("add", "set"):
+            parent[last] = value
+        elif op == "replace":
+            if last not in parent:
+                raise bad_request_error(f"Patch path {operation['path']!r} does not exist")
+            parent[last] = value
+        elif op == "remove":
+            if last not in parent:
+                raise bad_request_error(f"Patch path {operation['path']!r} does not exist")
+            del parent[last]
+        elif op == "incr":
+            parent[last] = parent.get(last, 0) + value
+        else:
+            raise bad_request_error(f"Unsupported patch operation: {op!r}")
+
+
+class _AsyncList:
+    """Async iterator over an already fetched page"""
+
+    def __init__(self, documents: List[Any]):
+        self._documents = iter(documents)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._documents)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class InMemoryPageIterator:
+    """Page-by-page iteration with a continuation_token, like AsyncItemPaged.by_page()"""
+
+    def __init__(self, fetch_page, continuation_token: Optional[str] = None):
+        self._fetch_page = fetch_page
+        self.continuation_token = continuation_token
+        self._done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._done:
+            raise StopAsyncIteration
+        documents, self.continuation_token = await self._fetch_page(self.continuation_token)
+        if self.continuation_token is None:
+            self._done = True
+        return _AsyncList(documents)
+
+
+class InMemoryItemPaged:
+    """Async iterable of query results that can also be read page by page"""
+
+    def __init__(self, fetch_page):
+        self._fetch_page = fetch_page
+
+    def by_page(self, continuation_token: Optional[str] = None) -> InMemoryPageIterator:
+        return InMemoryPageIterator(self._fetch_page, continuation_token)
+
+    async def _iterate(self):
+        async for page in self.by_page():
+            async for document in page:
+                yield document
+
+    def __aiter__(self):
+        return self._iterate().__aiter__()
+
+
+def _encode_continuation(offset: int) -> str:
+    return json.dumps({"offset": offset})
+
+
+def _decode_continuation(token: Optional[str]) -> int:
+    if not token:
+        return 0
+    try:
+        return int(json.loads(token)["offset"])
+    except (ValueError, KeyError, TypeError):
+        raise bad_request_error("Invalid continuation token")
+
+
+class InMemoryContainer:
+    """Container stand-in with the async ContainerProxy methods the application uses"""
+
+    # Page size used when a query does not set max_item_count
+    DEFAULT_PAGE_SIZE = 100
+
+    def __init__(self, container_id: str, settings: SimulationSettings, partition_key_path: str = "/id"):
+        self.id = container_id
+        self.settings = settings
+        self.partition_key_path = partition_key_path
+        self._partition_key_segments = partition_key_path.lstrip("/").split("/")
+        self._documents: Dict[Tuple[Any, str], Dict[str, Any]] = {}
+        self._lsn = 0
+
+        # Throughput bucket, refilled continuously at ru_per_second
+        self._tokens = settings.ru_per_second
+        self._refilled_at = time.monotonic()
+
+        # Metrics
+        self.requests: Dict[str, int] = {}
+        self.request_charge = 0.0
+        self.throttled = 0
+
+    # -- simulation ---------------------------------------------------------
+
+    def _throttle_delay(self) -> Optional[float]:
+        """Seconds the caller must wait, or None if the request may proceed"""
+        settings = self.settings
+        if settings.ru_per_second > 0:
+            now = time.monotonic()
+            self._tokens = min(
+                settings.ru_per_second,
+                self._tokens + (now - self._refilled_at) * settings.ru_per_second
+            )
+            self._refilled_at = now
+            if self._tokens <= 0:
+                return -self._tokens / settings.ru_per_second + 0.001
+        if settings.throttle_rate > 0 and settings.rng.random() < settings.throttle_rate:
+            return settings.retry_after_ms / 1000
+        return None
+
+    async def _begin(self, operation: str) -> int:
+        """Apply latency and throttling for one request, retrying 429s like the SDK
+
+        Returns the number of throttled attempts that were retried.
+        """
+        self.requests[operation] = self.requests.get(operation, 0) + 1
+        for attempt in range(self.settings.throttle_retries + 1):
+            delay = self.settings.delay(operation)
+            if delay:
+                await asyncio.sleep(delay)
+            retry_after = self._throttle_delay()
+            if retry_after is None:
+                return attempt
+            self.throttled += 1
+            if attempt == self.settings.throttle_retries:
+                raise throttled_error(retry_after)
+            await asyncio.sleep(retry_after)
+
+    def _finish(
+        self,
+        charge: float,
+        response_hook,
+        result: Any,
+        headers: Optional[Dict[str, str]] = None,
+        retries: int = 0
+    ):
+        """Account the request charge and report response headers"""
+        self.request_charge += charge
+        if self.settings.ru_per_second > 0:
+            self._tokens -= charge
+        if response_hook is not None:
+            response_headers = {
+                "x-ms-request-charge": f"{charge:.2f}",
+                "x-ms-activity-id": str(uuid.uuid4()),
+            }
+            if retries:
+                response_headers["x-ms-throttle-retry-count"] = str(retries)
+            if headers:
+                response_headers.update(headers)
+            response_hook(response_headers, result)
+
+    # -- documents ----------------------------------------------------------
+
+    def _partition_key(self, document: Dict[str, Any]) -> Any:
+        value: Any = document
+        for segment in self._partition_key_segments:
+            value = value.get(segment) if isinstance(value, dict) else None
+        return value
+
+    def _key(self, item: Any, partition_key: Any) -> Tuple[Any, str]:
+        item_id = item["id"] if isinstance(item, dict) else item
+        return (partition_key, item_id)
+
+    def _store(self, body: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+        """Save a copy of body with fresh system properties; returns the stored document and its size"""
+        if not isinstance(body.get("id"), str) or not body["id"]:
+            raise bad_request_error("The input content is invalid because the required property 'id' is missing.")
+        encoded = orjson.dumps({key: value for key, value in body.items() if key not in _SYSTEM_FIELDS})
+        document = orjson.loads(encoded)
+        self._lsn += 1
+        document.update({
+            "_rid": uuid.uuid4().hex[:16],
+            "_self": f"dbs/memory/colls/{self.id}/docs/{document['id']}",
+            "_etag": f"\"{uuid.uuid4()}\"",
+            "_attachments": "attachments/",
+            "_ts": int(time.time()),
+            "_lsn": self._lsn,
+        })
+        key = (self._partition_key(document), document["id"])
+        # Re-insert so iteration order follows modification order, like the change feed
+        self._documents.pop(key, None)
+        self._documents[key] = document
+        return document, len(encoded)
+
+    @staticmethod
+    def _copy(document: Dict[str, Any]) -> Dict[str, Any]:
+        return orjson.loads(orjson.dumps(document))
+
+    @staticmethod
+    def _check_condition(current: Dict[str, Any], etag: Optional[str], match_condition: Optional[MatchConditions]):
+        if etag is None or match_condition is None:
+            return
+        if match_condition == MatchConditions.IfNotModified and current["_etag"] != etag:
+            raise precondition_failed_error()
+        if match_condition == MatchConditions.IfModified and current["_etag"] == etag:
+            raise precondition_failed_error()
+
+    def _existing(self, item: Any, partition_key: Any) -> Dict[str, Any]:
+        document = self._documents.get(self._key(item, partition_key))
+        if document is None:
+            raise not_found_error()
+        return document
+
+    # -- container API ------------------------------------------------------
+
+    async def read(self, response_hook=None, **kwargs) -> Dict[str, Any]:
+        retries = await self._begin("read")
+        properties = {
+            "id": self.id,
+            "partitionKey": {"paths": [self.partition_key_path], "kind": "Hash"},
+        }
+        self._finish(1.0, response_hook, properties, retries=retries)
+        return properties
+
+    async def read_item(self, item: Any, partition_key: Any, response_hook=None, **kwargs) -> Dict[str, Any]:
+        retries = await self._begin("read")
+        document = self._copy(self._existing(item, partition_key))
+        self._finish(read_charge(len(orjson.dumps(document))), response_hook, document, {"etag": document["_etag"]}, retries=retries)
+        return document
+
+    async def create_item(self, body: Dict[str, Any], response_hook=None, **kwargs) -> Dict[str, Any]:
+        retries = await self._begin("write")
+        if (self._partition_key(body), body.get("id")) in self._documents:
+            raise conflict_error()
+        document, size = self._store(body)
+        result = self._copy(document)
+        self._finish(write_charge(size), response_hook, result, {"etag": result["_etag"]}, retries=retries)
+        return result
+
+    async def upsert_item(self, body: Dict[str, Any], response_hook=None, **kwargs) -> Dict[str, Any]:
+        retries = await self._begin("write")
+        document, size = self._store(body)
+        result = self._copy(document)
+        self._finish(write_charge(size), response_hook, result, {"etag": result["_etag"]}, retries=retries)
+        return result
+
+    async def replace_item(
+        self,
+        item: Any,
+        body: Dict[str, Any],
+        etag: Optional[str] = None,
+        match_condition: Optional[MatchConditions] = None,
+        response_hook=None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        retries = await self._begin("write")
+        partition_key = self._partition_key(body)
+        current = self._existing(item, partition_key)
+        self._check_condition(current, etag, match_condition)
+        document, size = self._store(body)
+        result = self._copy(document)
+        self._finish(write_charge(size), response_hook, result, {"etag": result["_etag"]}, retries=retries)
+        return result
+
+    async def patch_item(
+        self,
+        item: Any,
+        partition_key: Any,
+        patch_operations: List[Dict[str, Any]],
+        etag: Optional[str] = None,
+        match_condition: Optional[MatchConditions] = None,
+        filter_predicate: Optional[str] = None,
+        response_hook=None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        retries = await self._begin("write")
+        current = self._existing(item, partition_key)
+        self._check_condition(current, etag, match_condition)
+        if filter_predicate and not compile_sql(f"SELECT * {filter_predicate}").run([current], {}):
+            raise precondition_failed_error()
+
+        patched = self._copy(current)
+        apply_patch(patched, patch_operations)
+        if self._partition_key(patched) != partition_key or patched.get("id") != current["id"]:
+            raise bad_request_error("Patch cannot change the id or partition key")
+        document, size = self._store(patched)
+        result = self._copy(document)
+        self._finish(write_charge(size), response_hook, result, {"etag": result["_etag"]}, retries=retries)
+        return result
+
+    async def delete_item(
+        self,
+        item: Any,
+        partition_key: Any,
+        etag: Optional[str] = None,
+        match_condition: Optional[MatchConditions] = None,
+        response_hook=None,
+        **kwargs
+    ) -> None:
+        retries = await self._begin("write")
+        key = self._key(item, partition_key)
+        current = self._existing(item, partition_key)
+        self._check_condition(current, etag, match_condition)
+        del self._documents[key]
+        self._finish(write_charge(len(orjson.dumps(current))), response_hook, None, retries=retries)
+
+    def query_items(
+        self,
+        query: str,
+        parameters: Optional[List[Dict[str, Any]]] = None,
+        partition_key: Any = None,
+        max_item_count: Optional[int] = None,
+        response_hook=None,
+        **kwargs
+    ) -> InMemoryItemPaged:
+        compiled = compile_sql(query)
+        values = {parameter["name"]: parameter["value"] for parameter in parameters or []}
+        page_size = max_item_count if max_item_count and max_item_count > 0 else self.DEFAULT_PAGE_SIZE
+
+        async def fetch_page(continuation_token: Optional[str]):
+            retries = await self._begin("query")
+            offset = _decode_continuation(continuation_token)
+            documents = [
+                document for document in self._documents.values()
+                if partition_key is None or self._partition_key(document) == partition_key
+            ]
+            results = compiled.run(documents, values)
+            page = self._copy(results[offset:offset + page_size])
+            next_token = _encode_continuation(offset + page_size) if offset + page_size < len(results) else None
+
+            headers = {"x-ms-item-count": str(len(page))}
+            if next_token:
+                headers["x-ms-continuation"] = next_token
+            scanned = len(documents) if offset == 0 else 0
+            self._finish(query_charge(scanned, len(orjson.dumps(page))), response_hook, page, headers, retries=retries)
+            return page, next_token
+
+        return InMemoryItemPaged(fetch_page)
+
+    def query_items_change_feed(
+        self,
+        is_start_from_beginning: bool = False,
+        continuation: Optional[str] = None,
+        max_item_count: Optional[int] = None,
+        partition_key: Any = None,
+        response_hook=None,
+        **kwargs
+    ) -> InMemoryItemPaged:
+        """Latest version of each changed document since the continuation (an LSN); deletes are not reported"""
+        page_size = max_item_count if max_item_count and max_item_count > 0 else self.DEFAULT_PAGE_SIZE
+        if continuation is not None:
+            start = int(continuation)
+        else:
+            start = 0 if is_start_from_beginning else self._lsn
+
+        async def fetch_page(continuation_token: Optional[str]):
+            retries = await self._begin("query")
+            since = int(continuation_token) if continuation_token is not None else start
+            changes = [
+                document for document in self._documents.values()
+                if document["_lsn"] > since
+                and (partition_key is None or self._partition_key(document) == partition_key)
+            ]
+            page = self._copy(changes[:page_size])
+            last_lsn = page[-1]["_lsn"] if page else since
+            # The change feed continuation is returned in the etag header
+            self._finish(query_charge(len(page), len(orjson.dumps(page))), response_hook, page, {"etag": str(last_lsn)}, retries=retries)
+            return page, (str(last_lsn) if len(changes) > page_size else None)
+
+        return InMemoryItemPaged(fetch_page)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the simulated container metrics"""
+        return {
+            "documents": len(self._documents),
+            "requests": dict(self.requests),
+            "requestCharge": round(self.request_charge, 2),
+            "throttled": self.throttled,
+        }
+
+
+class InMemoryDatabase:
+    """Database stand-in handing out one InMemoryContainer per name"""
+
+    def __init__(self, database_id: str, settings: SimulationSettings):
+        self.id = database_id
+        self.settings = settings
+        self._containers: Dict[str, InMemoryContainer] = {}
+
+    def get_container_client(self, container: str, partition_key_path: str = "/id") -> InMemoryContainer:
+        if container not in self._containers:
+            self._containers[container] = InMemoryContainer(container, self.settings, partition_key_path)
+        return self._containers[container]
+
+    def containers(self) -> Iterator[InMemoryContainer]:
+        return iter(self._containers.values())
+
+
+class InMemoryCosmosClient:
+    """CosmosClient stand-in; data lives for the lifetime of the client"""
+
+    def __init__(self, settings: Optional[SimulationSettings] = None):
+        self.settings = settings or SimulationSettings.from_env()
+        self._databases: Dict[str, InMemoryDatabase] = {}
+
+    def get_database_client(self, database: str) -> InMemoryDatabase:
+        if database not in self._databases:
+            self._databases[database] = InMemoryDatabase(database, self.settings)
+        return self._databases[database]
+
+    async def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Simulated metrics for every container, keyed by container id"""
+        return {
+            container.id: container.stats()
+            for database in self._databases.values()
+            for container in database.containers()
+        }
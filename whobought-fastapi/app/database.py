@@ -1,15 +1,70 @@
-from azure.cosmos import CosmosClient, exceptions
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+from azure.cosmos.aio import CosmosClient
+from azure.core.pipeline.transport import AioHttpTransport
+import aiohttp
+import asyncio
+import hashlib
 import os
 import logging
+import random
+import time
 from datetime import datetime
 import uuid
 from functools import lru_cache
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterable, List, Tuple, AsyncIterator
 
-from .utils import hash_password, verify_password
+from .balances import BalanceDelta, compute_balances
+from .cache import get_document_cache
+from .cosmos_memory import InMemoryCosmosClient
+from .instrumentation import instrument_container
+from .invalidation import invalidate_on_write
+from .password_pool import get_password_pool
+from .realtime import publish_item_deleted
+from .singleflight import get_single_flight, query_key
 
 logger = logging.getLogger(__name__)
 
+# Migration switch: fall back to cross-partition queries for users that predate the lookup index.
+# Only needed until `python -m app.manage rebuild-user-lookup` has been run; costs two scans per registration.
+USER_LOOKUP_FALLBACK = os.environ.get("USER_LOOKUP_FALLBACK", "false").lower() == "true"
+
+# Concurrent Cosmos writes allowed per bulk request
+BATCH_WRITE_CONCURRENCY = int(os.environ.get("BATCH_WRITE_CONCURRENCY", "10"))
+
+# Attempts at an optimistic-concurrency write before giving up
+BALANCE_UPDATE_RETRIES = int(os.environ.get("BALANCE_UPDATE_RETRIES", "10"))
+
+# Item fields whose change alters group balances
+BALANCE_FIELDS = {"purchasedBy", "amount", "paidFor", "groupId"}
+
+
+def normalise_lookup_value(value: str) -> str:
+    """Normalise a username or email for the lookup index (trimmed, lower-cased)"""
+    return value.strip().lower()
+
+
+def lookup_key(kind: str, value: str) -> str:
+    """
+    Build the lookup document id for a username or email
+
+    The normalised value is hashed because Cosmos DB rejects ids containing
+    '/', '\\', '?' or '#', which valid usernames and emails may contain.
+    """
+    digest = hashlib.sha256(normalise_lookup_value(value).encode("utf-8")).hexdigest()
+    return f"{kind}:{digest}"
+
+
+def lookup_entry(kind: str, value: str, user_id: str) -> Dict[str, Any]:
+    """Build the lookup document that maps a username or email to a user id"""
+    return {
+        "id": lookup_key(kind, value),
+        "type": kind,
+        "value": normalise_lookup_value(value),
+        "userId": user_id
+    }
+
+
 class CosmosDBManager:
     _instance = None
     
@@ -26,35 +81,113 @@ class CosmosDBManager:
         # Load environment variables directly from Azure App Service settings
         # These will be set in the App Service Configuration or during local development
         self.connection_string = os.environ.get("COSMOS_CONNECTION_STRING")
+        # "cosmos" for a real account, "memory" for the in-process stand-in (app/cosmos_memory.py)
+        self.backend = os.environ.get("COSMOS_BACKEND", "cosmos").lower()
         self.database_name = os.environ.get("COSMOS_DATABASE_NAME", "whobought")
         self.items_container_name = os.environ.get("COSMOS_CONTAINER_NAME", "items")
         self.users_container_name = os.environ.get("COSMOS_USER_CONTAINER_NAME", "users")
+        self.user_lookup_container_name = os.environ.get("COSMOS_USER_LOOKUP_CONTAINER_NAME", "userLookup")
+        self.groups_container_name = os.environ.get("COSMOS_GROUPS_CONTAINER_NAME", "groups")
+        self.payments_container_name = os.environ.get("COSMOS_PAYMENTS_CONTAINER_NAME", "payments")
+        self.purchases_container_name = os.environ.get("COSMOS_PURCHASES_CONTAINER_NAME", "purchases")
+        self.balances_container_name = os.environ.get("COSMOS_BALANCES_CONTAINER_NAME", "balances")
+        self.leases_container_name = os.environ.get("COSMOS_LEASES_CONTAINER_NAME", "leases")
+        
+        # Connection pool sizing for the shared aiohttp session (one per worker)
+        self.max_connections = int(os.environ.get("COSMOS_MAX_CONNECTIONS", "100"))
+        self.max_connections_per_host = int(os.environ.get("COSMOS_MAX_CONNECTIONS_PER_HOST", "0"))
+        self.keepalive_timeout = float(os.environ.get("COSMOS_KEEPALIVE_SECONDS", "30"))
         
         # Initialize connections to None
+        self.session = None
         self.client = None
         self.database = None
         self.items_container = None
         self.users_container = None
+        self.user_lookup_container = None
+        self.groups_container = None
+        self.payments_container = None
+        self.purchases_container = None
+        self.balances_container = None
+        self.leases_container = None
         
-        # Initialize connection at startup if environment variables are set
-        if self.connection_string:
-            try:
-                self._initialize_connection()
-            except Exception as e:
-                logger.error(f"Failed to connect to Cosmos DB: {str(e)}")
-                # Don't raise error here, let it be handled when used
-                
+        # The async client needs a running event loop, so the connection is
+        # opened by the application lifespan (see open()) rather than here.
         self._initialized = True
         
     def _initialize_connection(self):
         """Initialize connection to Cosmos DB"""
-        if not self.client:
+        if not self.client and self.backend == "memory":
+            logger.info("Using in-memory Cosmos DB stand-in")
+            self.client = InMemoryCosmosClient()
+            self._open_containers()
+        elif not self.client:
             logger.info("Initializing Cosmos DB connection...")
-            self.client = CosmosClient.from_connection_string(self.connection_string)
-            self.database = self.client.get_database_client(self.database_name)
-            self.items_container = self.database.get_container_client(self.items_container_name)
-            self.users_container = self.database.get_container_client(self.users_container_name)
-            logger.info(f"Successfully connected to Cosmos DB database '{self.database_name}'")
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            self.session = aiohttp.ClientSession(connector=connector)
+            self.client = CosmosClient.from_connection_string(
+                self.connection_string,
+                transport=AioHttpTransport(session=self.session, session_owner=False),
+            )
+            self._open_containers()
+            logger.info(
+                f"Successfully connected to Cosmos DB database '{self.database_name}' "
+                f"(max connections: {self.max_connections})"
+            )
+    
+    def _container(self, name: str):
+        """Get a container client, instrumented per request and invalidating caches on writes"""
+        return invalidate_on_write(instrument_container(self.database.get_container_client(name)))
+    
+    def _open_containers(self):
+        """Get the database and container clients from the client"""
+        self.database = self.client.get_database_client(self.database_name)
+        self.items_container = self._container(self.items_container_name)
+        self.users_container = self._container(self.users_container_name)
+        self.user_lookup_container = self._container(self.user_lookup_container_name)
+        self.groups_container = self._container(self.groups_container_name)
+        self.payments_container = self._container(self.payments_container_name)
+        self.purchases_container = self._container(self.purchases_container_name)
+        self.balances_container = self._container(self.balances_container_name)
+        self.leases_container = self._container(self.leases_container_name)
+    
+    @property
+    def is_configured(self) -> bool:
+        """Whether a client can be opened: a connection string is set or the in-memory backend is used"""
+        return bool(self.connection_string) or self.backend == "memory"
+    
+    async def open(self):
+        """Open the shared Cosmos DB client and connection pool"""
+        if self.is_configured:
+            try:
+                self._initialize_connection()
+            except Exception as e:
+                logger.error(f"Failed to connect to Cosmos DB: {str(e)}")
+                # Don't raise error here, let it be handled when used
+    
+    async def close(self):
+        """Close the Cosmos DB client and release pooled connections"""
+        if self.client:
+            await self.client.close()
+        if self.session:
+            await self.session.close()
+        self.session = None
+        self.client = None
+        self.database = None
+        self.items_container = None
+        self.users_container = None
+        self.user_lookup_container = None
+        self.groups_container = None
+        self.payments_container = None
+        self.purchases_container = None
+        self.balances_container = None
+        self.leases_container = None
+        logger.info("Closed Cosmos DB connection")
     
     def get_items_container(self):
         """Get the items container client"""
@@ -67,6 +200,42 @@ class CosmosDBManager:
         if not self.users_container:
             self._initialize_connection()
         return self.users_container
+    
+    def get_user_lookup_container(self):
+        """Get the username/email lookup container client"""
+        if not self.user_lookup_container:
+            self._initialize_connection()
+        return self.user_lookup_container
+    
+    def get_groups_container(self):
+        """Get the groups container client"""
+        if not self.groups_container:
+            self._initialize_connection()
+        return self.groups_container
+    
+    def get_payments_container(self):
+        """Get the payments container client"""
+        if not self.payments_container:
+            self._initialize_connection()
+        return self.payments_container
+    
+    def get_purchases_container(self):
+        """Get the purchases container client"""
+        if not self.purchases_container:
+            self._initialize_connection()
+        return self.purchases_container
+    
+    def get_balances_container(self):
+        """Get the materialized group balances container client"""
+        if not self.balances_container:
+            self._initialize_connection()
+        return self.balances_container
+    
+    def get_leases_container(self):
+        """Get the change feed checkpoint (leases) container client"""
+        if not self.leases_container:
+            self._initialize_connection()
+        return self.leases_container
 
 
 @lru_cache()
@@ -75,29 +244,152 @@ def get_cosmos_manager():
     return CosmosDBManager()
 
 
+async def query_page(
+    container,
+    query: str,
+    limit: int,
+    continuation_token: Optional[str] = None,
+    parameters: Optional[List[Dict[str, Any]]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Fetch a single page of query results and the token for the next one"""
+    pager = container.query_items(
+        query=query,
+        parameters=parameters,
+        max_item_count=limit
+    ).by_page(continuation_token)
+    async for page in pager:
+        documents = [document async for document in page]
+        return documents, pager.continuation_token
+    return [], None
+
+
+def patch_operations(changes: Dict[str, Any], removed: Iterable[str] = ()) -> List[Dict[str, Any]]:
+    """Translate changed top-level fields into Cosmos set operations, and removed ones into remove operations, stamping updatedAt"""
+    operations = [
+        {"op": "set", "path": f"/{field}", "value": value}
+        for field, value in changes.items()
+    ]
+    operations.extend({"op": "remove", "path": f"/{field}"} for field in removed)
+    operations.append({"op": "set", "path": "/updatedAt", "value": datetime.utcnow().isoformat()})
+    return operations
+
+
+def match_options(etag: Optional[str]) -> Dict[str, Any]:
+    """Build optimistic concurrency options for an If-Match etag"""
+    if not etag or etag.strip() == "*":
+        return {}
+    etag = etag.strip()
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    return {"etag": etag, "match_condition": MatchConditions.IfNotModified}
+
+
+async def iter_pages(
+    container,
+    query: str,
+    page_size: int,
+    continuation_token: Optional[str] = None,
+    parameters: Optional[List[Dict[str, Any]]] = None
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield query results one page at a time so only a single page is held in memory"""
+    pager = container.query_items(
+        query=query,
+        parameters=parameters,
+        max_item_count=page_size
+    ).by_page(continuation_token)
+    async for page in pager:
+        documents = [document async for document in page]
+        if documents:
+            yield documents
+
+
 class ItemsDB:
     @staticmethod
     async def get_all_items():
         try:
             cosmos = get_cosmos_manager()
             items_container = cosmos.get_items_container()
+            query = "SELECT * FROM c ORDER BY c.createdAt DESC"
+            
+            async def read_all():
+                return [item async for item in items_container.query_items(query=query)]
             
-            items = list(items_container.query_items(
-                query="SELECT * FROM c ORDER BY c.createdAt DESC",
-                enable_cross_partition_query=True
-            ))
-            return items
+            return await get_single_flight(cosmos.items_container_name).do(query_key("all", query), read_all)
         except exceptions.CosmosHttpResponseError as e:
             logger.error(f"Cosmos DB error: {str(e)}")
             raise e
 
     @staticmethod
-    async def get_item(item_id: str):
+    async def get_items_page(limit: int, continuation_token: Optional[str] = None):
+        try:
+            cosmos = get_cosmos_manager()
+            items_container = cosmos.get_items_container()
+            query = "SELECT * FROM c ORDER BY c.createdAt DESC"
+            
+            return await get_single_flight(cosmos.items_container_name).do(
+                query_key("page", query, None, limit, continuation_token),
+                lambda: query_page(
+                    items_container,
+                    query=query,
+                    limit=limit,
+                    continuation_token=continuation_token
+                )
+            )
+        except exceptions.CosmosHttpResponseError as e:
+            logger.error(f"Cosmos DB error: {str(e)}")
+            raise e
+
+    @staticmethod
+    async def get_group_items(group_id: str) -> List[Dict[str, Any]]:
+        """Get the fields of a group's items needed to compute balances"""
         try:
             cosmos = get_cosmos_manager()
             items_container = cosmos.get_items_container()
+            query = "SELECT c.purchasedBy, c.amount, c.paidFor FROM c WHERE c.groupId = @groupId"
+            parameters = [{"name": "@groupId", "value": group_id}]
+            
+            async def read_all():
+                return [item async for item in items_container.query_items(
+                    query=query,
+                    parameters=parameters
+                )]
             
-            item = items_container.read_item(item=item_id, partition_key=item_id)
+            return await get_single_flight(cosmos.items_container_name).do(
+                query_key("query", query, parameters),
+                read_all
+            )
+        except exceptions.CosmosHttpResponseError as e:
+            logger.error(f"Cosmos DB error: {str(e)}")
+            raise e
+
+    @staticmethod
+    def iter_item_pages(page_size: int, continuation_token: Optional[str] = None):
+        cosmos = get_cosmos_manager()
+        items_container = cosmos.get_items_container()
+        
+        return iter_pages(
+            items_container,
+            query="SELECT * FROM c ORDER BY c.createdAt DESC",
+            page_size=page_size,
+            continuation_token=continuation_token
+        )
+
+    @staticmethod
+    async def get_item(item_id: str):
+        try:
+            cosmos = get_cosmos_manager()
+            cache = get_document_cache(cosmos.items_container_name)
+            cached_item = cache.get(item_id)
+            if cached_item is not None:
+                return cached_item
+            
+            items_container = cosmos.get_items_container()
+            generation = cache.generation
+            item = await get_single_flight(cosmos.items_container_name).do(
+                ("id", item_id),
+                lambda: items_container.read_item(item=item_id, partition_key=item_id)
+            )
+            cache.set(item_id, item, generation)
             return item
         except exceptions.CosmosResourceNotFoundError:
             return None
@@ -106,7 +398,7 @@ class ItemsDB:
             raise e
 
     @staticmethod
-    async def create_item(item_dict: dict):
+    async def create_item(item_dict: dict, update_balances: bool = True):
         try:
             cosmos = get_cosmos_manager()
             items_container = cosmos.get_items_container()
@@ -118,29 +410,143 @@ class ItemsDB:
             item_dict["createdAt"] = now.isoformat()
             item_dict["updatedAt"] = now.isoformat()
             
-            created_item = items_container.create_item(body=item_dict)
+            created_item = await items_container.create_item(body=item_dict)
+            get_document_cache(cosmos.items_container_name).set(created_item["id"], created_item)
+            if update_balances:
+                await BalancesDB.apply_item_change(None, created_item)
             return created_item
         except exceptions.CosmosHttpResponseError as e:
             logger.error(f"Cosmos DB error: {str(e)}")
             raise e
 
+    @staticmethod
+    async def create_items(item_dicts: List[Dict[str, Any]]) -> List[Any]:
+        """
+        Create many items with bounded concurrency.
+        
+        Items are partitioned by /id, so every item lives in its own logical
+        partition and cannot share a transactional batch; writes are issued
+        concurrently instead. Balance changes are combined into one update per
+        group. Returns, in input order, either the created item or the
+        exception raised for it.
+        """
+        semaphore = asyncio.Semaphore(BATCH_WRITE_CONCURRENCY)
+        
+        async def create_one(item_dict: Dict[str, Any]):
+            async with semaphore:
+                return await ItemsDB.create_item(item_dict, update_balances=False)
+        
+        outcomes = await asyncio.gather(
+            *(create_one(item_dict) for item_dict in item_dicts),
+            return_exceptions=True
+        )
+        
+        deltas: Dict[str, BalanceDelta] = {}
+        for outcome in outcomes:
+            if not isinstance(outcome, Exception) and outcome.get("groupId"):
+                deltas.setdefault(outcome["groupId"], BalanceDelta()).add_item(outcome)
+        for group_id, delta in deltas.items():
+            await BalancesDB.apply_delta(group_id, delta)
+        
+        return outcomes
+
+    @staticmethod
+    async def _read_item_fresh(items_container, item_id: str):
+        """Read an item straight from Cosmos, bypassing the document cache"""
+        try:
+            return await items_container.read_item(item=item_id, partition_key=item_id)
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+
     @staticmethod
     async def update_item(item_id: str, item_dict: dict):
+        try:
+            cosmos = get_cosmos_manager()
+            items_container = cosmos.get_items_container()
+            cache = get_document_cache(cosmos.items_container_name)
+            cache.invalidate(item_id)
+            
+            # Replace only the version that was read, so the balance delta is exact
+            for attempt in range(BALANCE_UPDATE_RETRIES):
+                existing_item = await ItemsDB._read_item_fresh(items_container, item_id)
+                if existing_item is None:
+                    return None
+                
+                # Preserve the id and createdAt
+                item_dict["id"] = item_id
+                item_dict["createdAt"] = existing_item.get("createdAt")
+                item_dict["updatedAt"] = datetime.utcnow().isoformat()
+                
+                try:
+                    updated_item = await items_container.replace_item(
+                        item=item_id,
+                        body=item_dict,
+                        **match_options(existing_item.get("_etag"))
+                    )
+                except exceptions.CosmosAccessConditionFailedError:
+                    if attempt == BALANCE_UPDATE_RETRIES - 1:
+                        raise
+                    continue
+                
+                cache.set(item_id, updated_item)
+                await BalancesDB.apply_item_change(existing_item, updated_item)
+                return updated_item
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+        except exceptions.CosmosHttpResponseError as e:
+            logger.error(f"Cosmos DB error: {str(e)}")
+            raise e
+
+    @staticmethod
+    async def patch_item(item_id: str, changes: Dict[str, Any], etag: Optional[str] = None):
+        """Apply a partial update in one round trip, optionally only if the etag still matches"""
         try:
             cosmos = get_cosmos_manager()
             items_container = cosmos.get_items_container()
             
-            existing_item = items_container.read_item(item=item_id, partition_key=item_id)
+            cache = get_document_cache(cosmos.items_container_name)
+            cache.invalidate(item_id)
             
-            # Preserve the id and createdAt
-            item_dict["id"] = item_id
-            item_dict["createdAt"] = existing_item.get("createdAt")
-            item_dict["updatedAt"] = datetime.utcnow().isoformat()
+            if BALANCE_FIELDS.isdisjoint(changes):
+                patched_item = await items_container.patch_item(
+                    item=item_id,
+                    partition_key=item_id,
+                    patch_operations=patch_operations(changes),
+                    **match_options(etag)
+                )
+                cache.set(item_id, patched_item)
+                return patched_item
             
-            updated_item = items_container.replace_item(item=item_id, body=item_dict)
-            return updated_item
+            # Changes that move money need the previous version for the balance delta
+            client_condition = match_options(etag)
+            # An explicit null groupId takes the item out of its group
+            cleared = {"groupId"} if "groupId" in changes and changes["groupId"] is None else set()
+            kept = {field: value for field, value in changes.items() if field not in cleared}
+            for attempt in range(BALANCE_UPDATE_RETRIES):
+                existing_item = await ItemsDB._read_item_fresh(items_container, item_id)
+                if existing_item is None:
+                    return None
+                
+                try:
+                    patched_item = await items_container.patch_item(
+                        item=item_id,
+                        partition_key=item_id,
+                        # Removing a path the item does not have fails, so only remove what it has
+                        patch_operations=patch_operations(kept, [field for field in cleared if field in existing_item]),
+                        **(client_condition or match_options(existing_item.get("_etag")))
+                    )
+                except exceptions.CosmosAccessConditionFailedError:
+                    if client_condition or attempt == BALANCE_UPDATE_RETRIES - 1:
+                        raise
+                    continue
+                
+                cache.set(item_id, patched_item)
+                await BalancesDB.apply_item_change(existing_item, patched_item)
+                return patched_item
         except exceptions.CosmosResourceNotFoundError:
             return None
+        except exceptions.CosmosAccessConditionFailedError:
+            raise
         except exceptions.CosmosHttpResponseError as e:
             logger.error(f"Cosmos DB error: {str(e)}")
             raise e
@@ -151,8 +557,28 @@ class ItemsDB:
             cosmos = get_cosmos_manager()
             items_container = cosmos.get_items_container()
             
-            items_container.delete_item(item=item_id, partition_key=item_id)
-            return True
+            get_document_cache(cosmos.items_container_name).invalidate(item_id)
+            
+            # Delete only the version that was read, so its split can be removed exactly
+            for attempt in range(BALANCE_UPDATE_RETRIES):
+                existing_item = await ItemsDB._read_item_fresh(items_container, item_id)
+                if existing_item is None:
+                    return False
+                
+                try:
+                    await items_container.delete_item(
+                        item=item_id,
+                        partition_key=item_id,
+                        **match_options(existing_item.get("_etag"))
+                    )
+                except exceptions.CosmosAccessConditionFailedError:
+                    if attempt == BALANCE_UPDATE_RETRIES - 1:
+                        raise
+                    continue
+                
+                await BalancesDB.apply_item_change(existing_item, None)
+                publish_item_deleted(existing_item)
+                return True
         except exceptions.CosmosResourceNotFoundError:
             return False
         except exceptions.CosmosHttpResponseError as e:
@@ -160,6 +586,167 @@ class ItemsDB:
             raise e
 
 
+class BalancesDB:
+    @staticmethod
+    async def get_balances(group_id: str) -> Optional[Dict[str, Any]]:
+        """Point read of a group's materialized balance document"""
+        try:
+            cosmos = get_cosmos_manager()
+            balances_container = cosmos.get_balances_container()
+            
+            return await balances_container.read_item(item=group_id, partition_key=group_id)
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+        except exceptions.CosmosHttpResponseError as e:
+            logger.error(f"Cosmos DB error: {str(e)}")
+            raise e
+
+    @staticmethod
+    async def get_or_rebuild_balances(group_id: str) -> Dict[str, Any]:
+        """Read a group's balance document, building it from history the first time"""
+        document = await BalancesDB.get_balances(group_id)
+        if document is None:
+            document = await BalancesDB.rebuild_balances(group_id, create_only=True)
+        return document
+
+    @staticmethod
+    async def _compute_balances(group_id: str) -> Dict[str, Any]:
+        """
+        Build a group's balance document from all of its items and payments
+
+        builtAt records when the reads started, so writes acknowledged before
+        then are known to be counted (see apply_delta).
+        """
+        payments_container = get_cosmos_manager().get_payments_container()
+        
+        built_at = time.time()
+        items = await ItemsDB.get_group_items(group_id)
+        payments = [payment async for payment in payments_container.query_items(
+            query="SELECT c.user_id, c.recipient_id, c.amount FROM c WHERE c.group_id = @groupId",
+            parameters=[{"name": "@groupId", "value": group_id}]
+        )]
+        
+        delta = BalanceDelta.from_balances(compute_balances(items))
+        for payment in payments:
+            delta.add_payment(payment)
+        
+        document = {"id": group_id, "groupId": group_id, "builtAt": built_at}
+        delta.apply_to(document)
+        document["updatedAt"] = datetime.utcnow().isoformat()
+        return document
+
+    @staticmethod
+    async def rebuild_balances(group_id: str, create_only: bool = False) -> Dict[str, Any]:
+        """
+        Recompute a group's balance document from all of its items and payments.
+        
+        With create_only, an existing document is left untouched and returned
+        instead, so a lazy first build cannot overwrite concurrent updates.
+        """
+        try:
+            balances_container = get_cosmos_manager().get_balances_container()
+            document = await BalancesDB._compute_balances(group_id)
+            if not create_only:
+                return await balances_container.upsert_item(body=document)
+            try:
+                return await balances_container.create_item(body=document)
+            except exceptions.CosmosResourceExistsError:
+                return await balances_container.read_item(item=group_id, partition_key=group_id)
+        except exceptions.CosmosHttpResponseError as e:
+            logger.error(f"Cosmos DB error: {str(e)}")
+            raise e
+
+    @staticmethod
+    async def apply_delta(group_id: str, delta: BalanceDelta):
+        """
+        Merge a delta into a group's balance document with optimistic concurrency.
+        
+        The source item or payment has already been written, so failures are
+        logged rather than raised; `python -m app.manage rebuild-balances`
+        repairs a group whose document has drifted.
+        
+        A document built from history after the source write was acknowledged
+        already counts it, so the delta is skipped for it. Across instances this
+        relies on their clocks agreeing to within the write's latency.
+        """
+        if delta.is_empty():
+            return
+        
+        written_at = time.time()
+        try:
+            cosmos = get_cosmos_manager()
+            balances_container = cosmos.get_balances_container()
+            
+            for attempt in range(BALANCE_UPDATE_RETRIES):
+                document = await BalancesDB.get_balances(group_id)
+                if document is None:
+                    # A build started now reads the write that produced this delta. If another
+                    # writer's build is created first it may predate that write, so go round
+                    # again and apply the delta to the document that won unless it is newer.
+                    try:
+                        await balances_container.create_item(body=await BalancesDB._compute_balances(group_id))
+                        return
+                    except exceptions.CosmosResourceExistsError:
+                        continue
+                
+                if document.get("builtAt", 0) > written_at:
+                    return
+                
+                delta.apply_to(document)
+                document["updatedAt"] = datetime.utcnow().isoformat()
+                try:
+                    await balances_container.replace_item(
+                        item=group_id,
+                        body=document,
+                        **match_options(document.get("_etag"))
+                    )
+                    return
+                except exceptions.CosmosAccessConditionFailedError:
+                    # Another writer got there first; back off briefly and re-read
+                    await asyncio.sleep(random.uniform(0, 0.005 * (attempt + 1)))
+            
+            logger.error(f"Gave up updating balances for group {group_id} after {BALANCE_UPDATE_RETRIES} attempts")
+        except exceptions.CosmosHttpResponseError as e:
+            logger.error(f"Failed to update balances for group {group_id}: {str(e)}")
+
+    @staticmethod
+    async def apply_item_change(old_item: Optional[Dict[str, Any]], new_item: Optional[Dict[str, Any]]):
+        """Subtract an item's old split and add its new one, across groups if it moved"""
+        deltas: Dict[str, BalanceDelta] = {}
+        if old_item and old_item.get("groupId"):
+            deltas.setdefault(old_item["groupId"], BalanceDelta()).add_item(old_item, sign=-1)
+        if new_item and new_item.get("groupId"):
+            deltas.setdefault(new_item["groupId"], BalanceDelta()).add_item(new_item)
+        for group_id, delta in deltas.items():
+            await BalancesDB.apply_delta(group_id, delta)
+
+    @staticmethod
+    async def apply_payment_change(old_payment: Optional[Dict[str, Any]], new_payment: Optional[Dict[str, Any]]):
+        """Subtract a payment's old effect and add its new one, across groups if it moved"""
+        deltas: Dict[str, BalanceDelta] = {}
+        if old_payment and old_payment.get("group_id"):
+            deltas.setdefault(old_payment["group_id"], BalanceDelta()).add_payment(old_payment, sign=-1)
+        if new_payment and new_payment.get("group_id"):
+            deltas.setdefault(new_payment["group_id"], BalanceDelta()).add_payment(new_payment)
+        for group_id, delta in deltas.items():
+            await BalancesDB.apply_delta(group_id, delta)
+
+    @staticmethod
+    async def get_group_ids() -> List[str]:
+        """Every group id referenced by an item or payment"""
+        cosmos = get_cosmos_manager()
+        group_ids = set()
+        async for group_id in cosmos.get_items_container().query_items(
+            query="SELECT DISTINCT VALUE c.groupId FROM c WHERE IS_DEFINED(c.groupId) AND NOT IS_NULL(c.groupId)"
+        ):
+            group_ids.add(group_id)
+        async for group_id in cosmos.get_payments_container().query_items(
+            query="SELECT DISTINCT VALUE c.group_id FROM c WHERE IS_DEFINED(c.group_id)"
+        ):
+            group_ids.add(group_id)
+        return sorted(group_ids)
+
+
 class UsersDB:
     @staticmethod
     async def get_all_users():
@@ -167,22 +754,55 @@ class UsersDB:
             cosmos = get_cosmos_manager()
             users_container = cosmos.get_users_container()
             
-            users = list(users_container.query_items(
-                query="SELECT * FROM c",
-                enable_cross_partition_query=True
-            ))
+            users = [user async for user in users_container.query_items(
+                query="SELECT * FROM c"
+            )]
             return users
         except exceptions.CosmosHttpResponseError as e:
             logger.error(f"Cosmos DB error: {str(e)}")
             raise e
 
     @staticmethod
-    async def get_user(user_id: str):
+    async def get_users_page(limit: int, continuation_token: Optional[str] = None):
         try:
             cosmos = get_cosmos_manager()
             users_container = cosmos.get_users_container()
             
-            user = users_container.read_item(item=user_id, partition_key=user_id)
+            return await query_page(
+                users_container,
+                query="SELECT * FROM c",
+                limit=limit,
+                continuation_token=continuation_token
+            )
+        except exceptions.CosmosHttpResponseError as e:
+            logger.error(f"Cosmos DB error: {str(e)}")
+            raise e
+
+    @staticmethod
+    def iter_user_pages(page_size: int, continuation_token: Optional[str] = None):
+        cosmos = get_cosmos_manager()
+        users_container = cosmos.get_users_container()
+        
+        return iter_pages(
+            users_container,
+            query="SELECT * FROM c",
+            page_size=page_size,
+            continuation_token=continuation_token
+        )
+
+    @staticmethod
+    async def get_user(user_id: str):
+        try:
+            cosmos = get_cosmos_manager()
+            cache = get_document_cache(cosmos.users_container_name)
+            cached_user = cache.get(user_id)
+            if cached_user is not None:
+                return cached_user
+            
+            users_container = cosmos.get_users_container()
+            generation = cache.generation
+            user = await users_container.read_item(item=user_id, partition_key=user_id)
+            cache.set(user_id, user, generation)
             return user
         except exceptions.CosmosResourceNotFoundError:
             return None
@@ -190,22 +810,50 @@ class UsersDB:
             logger.error(f"Cosmos DB error: {str(e)}")
             raise e
 
+    @staticmethod
+    async def _find_user_by_lookup(kind: str, value: str):
+        """Resolve a username or email through the lookup index with two point reads"""
+        cosmos = get_cosmos_manager()
+        lookup_container = cosmos.get_user_lookup_container()
+        lookup_cache = get_document_cache(cosmos.user_lookup_container_name)
+        key = lookup_key(kind, value)
+        
+        entry = lookup_cache.get(key)
+        if entry is None:
+            try:
+                generation = lookup_cache.generation
+                entry = await lookup_container.read_item(item=key, partition_key=key)
+                lookup_cache.set(key, entry, generation)
+            except exceptions.CosmosResourceNotFoundError:
+                entry = None
+        
+        if entry:
+            return await UsersDB.get_user(entry["userId"])
+        
+        if not USER_LOOKUP_FALLBACK:
+            return None
+        
+        # Users registered before the lookup index existed are only reachable by query,
+        # matched case-insensitively like the index
+        users_container = cosmos.get_users_container()
+        users = [user async for user in users_container.query_items(
+            query=f"SELECT * FROM c WHERE LOWER(c.{kind}) = @value",
+            parameters=[{"name": "@value", "value": normalise_lookup_value(value)}]
+        )]
+        if not users:
+            return None
+        
+        user = users[0]
+        try:
+            await lookup_container.upsert_item(body=lookup_entry(kind, user[kind], user["id"]))
+        except exceptions.CosmosHttpResponseError as e:
+            logger.warning(f"Failed to backfill {kind} lookup for user {user['id']}: {str(e)}")
+        return user
+
     @staticmethod
     async def get_user_by_username(username: str):
         try:
-            cosmos = get_cosmos_manager()
-            users_container = cosmos.get_users_container()
-            
-            # Query for user by username
-            query = f"SELECT * FROM c WHERE c.username = '{username}'"
-            users = list(users_container.query_items(
-                query=query,
-                enable_cross_partition_query=True
-            ))
-            
-            if users:
-                return users[0]
-            return None
+            return await UsersDB._find_user_by_lookup("username", username)
         except exceptions.CosmosHttpResponseError as e:
             logger.error(f"Cosmos DB error: {str(e)}")
             raise e
@@ -213,58 +861,117 @@ class UsersDB:
     @staticmethod
     async def get_user_by_email(email: str):
         try:
-            cosmos = get_cosmos_manager()
-            users_container = cosmos.get_users_container()
-            
-            # Query for user by email
-            query = f"SELECT * FROM c WHERE c.email = '{email}'"
-            users = list(users_container.query_items(
-                query=query,
-                enable_cross_partition_query=True
-            ))
-            
-            if users:
-                return users[0]
-            return None
+            return await UsersDB._find_user_by_lookup("email", email)
         except exceptions.CosmosHttpResponseError as e:
             logger.error(f"Cosmos DB error: {str(e)}")
             raise e
 
+    @staticmethod
+    async def _release_lookup(kind: str, value: str):
+        """Remove a lookup reservation, ignoring entries that are already gone"""
+        cosmos = get_cosmos_manager()
+        lookup_container = cosmos.get_user_lookup_container()
+        key = lookup_key(kind, value)
+        get_document_cache(cosmos.user_lookup_container_name).invalidate(key)
+        try:
+            await lookup_container.delete_item(item=key, partition_key=key)
+        except exceptions.CosmosResourceNotFoundError:
+            pass
+        except exceptions.CosmosHttpResponseError as e:
+            logger.error(f"Failed to release {kind} lookup '{key}': {str(e)}")
+
     @staticmethod
     async def create_user(user_data: Dict[str, Any]):
         try:
             cosmos = get_cosmos_manager()
             users_container = cosmos.get_users_container()
+            lookup_container = cosmos.get_user_lookup_container()
             
-            # Check if username already exists
-            existing_user = await UsersDB.get_user_by_username(user_data.get("username", ""))
-            if existing_user:
-                return {"error": "Username already exists"}
+            username = user_data.get("username", "")
+            email = user_data.get("email", "")
             
-            # Check if email already exists
-            existing_email = await UsersDB.get_user_by_email(user_data.get("email", ""))
-            if existing_email:
-                return {"error": "Email already exists"}
+            if USER_LOOKUP_FALLBACK:
+                # Legacy users have no lookup entries yet, so check them explicitly
+                if await UsersDB.get_user_by_username(username):
+                    return {"error": "Username already exists"}
+                if await UsersDB.get_user_by_email(email):
+                    return {"error": "Email already exists"}
             
-            # Create new user with hashed password
             if not user_data.get("id"):
                 user_data["id"] = str(uuid.uuid4())
             
-            # Hash the password if provided
-            if "password" in user_data:
-                hashed_password = hash_password(user_data["password"])
-                user_data["hashed_password"] = hashed_password
-                # Remove plain password
-                del user_data["password"]
+            # Reserve the username and email; creating an existing id fails with a conflict
+            try:
+                await lookup_container.create_item(body=lookup_entry("username", username, user_data["id"]))
+            except exceptions.CosmosResourceExistsError:
+                return {"error": "Username already exists"}
             
-            user_data["createdAt"] = datetime.utcnow().isoformat()
+            try:
+                await lookup_container.create_item(body=lookup_entry("email", email, user_data["id"]))
+            except exceptions.CosmosResourceExistsError:
+                await UsersDB._release_lookup("username", username)
+                return {"error": "Email already exists"}
             
-            created_user = users_container.create_item(body=user_data)
-            return created_user
+            try:
+                # Hash the password if provided
+                if "password" in user_data:
+                    hashed_password = await get_password_pool().hash_password(user_data["password"])
+                    user_data["hashed_password"] = hashed_password
+                    # Remove plain password
+                    del user_data["password"]
+                
+                user_data["createdAt"] = datetime.utcnow().isoformat()
+                
+                created_user = await users_container.create_item(body=user_data)
+                get_document_cache(cosmos.users_container_name).set(created_user["id"], created_user)
+                return created_user
+            except Exception:
+                await UsersDB._release_lookup("username", username)
+                await UsersDB._release_lookup("email", email)
+                raise
         except exceptions.CosmosHttpResponseError as e:
             logger.error(f"Cosmos DB error: {str(e)}")
             raise e
 
+    @staticmethod
+    async def rebuild_lookup_index() -> Tuple[int, Dict[str, List[str]]]:
+        """
+        Upsert lookup entries for every existing user
+
+        Users whose usernames or emails differ only by case or surrounding
+        whitespace normalise to the same entry. Those entries are left as they
+        are and reported instead of letting the last user overwrite the others.
+
+        Returns:
+            (number of users indexed, user ids per colliding "kind:value")
+        """
+        cosmos = get_cosmos_manager()
+        users_container = cosmos.get_users_container()
+        lookup_container = cosmos.get_user_lookup_container()
+        
+        count = 0
+        # (kind, normalised value) -> ids of the users that map to it
+        owners: Dict[Tuple[str, str], List[str]] = {}
+        async for user in users_container.query_items(
+            query="SELECT c.id, c.username, c.email FROM c"
+        ):
+            for kind in ("username", "email"):
+                if user.get(kind):
+                    owners.setdefault((kind, normalise_lookup_value(user[kind])), []).append(user["id"])
+            count += 1
+        
+        collisions: Dict[str, List[str]] = {}
+        for (kind, value), user_ids in owners.items():
+            if len(user_ids) > 1:
+                collisions[f"{kind}:{value}"] = user_ids
+                logger.warning(f"Not indexing {kind} '{value}': shared by users {', '.join(user_ids)}")
+                continue
+            await lookup_container.upsert_item(body=lookup_entry(kind, value, user_ids[0]))
+            get_document_cache(cosmos.user_lookup_container_name).invalidate(lookup_key(kind, value))
+        
+        logger.info(f"Rebuilt user lookup index for {count} users ({len(collisions)} collisions)")
+        return count, collisions
+
     @staticmethod
     async def authenticate_user(username: str, password: str) -> Optional[Dict[str, Any]]:
         """Authenticate a user with username and password"""
@@ -274,7 +981,7 @@ class UsersDB:
             return None
         
         # Verify password
-        if not verify_password(password, user.get("hashed_password", "")):
+        if not await get_password_pool().verify_password(password, user.get("hashed_password", "")):
             return None
         
         # Remove hashed password before returning
@@ -5,12 +5,12 @@ from .database import get_cosmos_manager, CosmosDBManager
 
 logger = logging.getLogger(__name__)
 
-def get_db():
+async def get_db():
     """Dependency to get the database connection"""
     cosmos_manager = get_cosmos_manager()
     
-    # Check if connection string is set
-    if not cosmos_manager.connection_string:
+    # Check if connection string is set (not needed for the in-memory backend)
+    if not cosmos_manager.is_configured:
         logger.error("COSMOS_CONNECTION_STRING environment variable is not set")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from .database import get_cosmos_manager
+
+logger = logging.getLogger(__name__)
+
+# Seconds a readiness probe result is reused, so probes cost at most one Cosmos read per interval
+READINESS_CACHE_SECONDS = float(os.environ.get("READINESS_CACHE_SECONDS", "5"))
+
+# Seconds the Cosmos readiness probe may take before the instance is reported unready
+READINESS_TIMEOUT_SECONDS = float(os.environ.get("READINESS_TIMEOUT_SECONDS", "2"))
+
+
+class ReadinessProbe:
+    """Cached, single-flight check that Cosmos DB is reachable and the worker has warmed up"""
+
+    def __init__(self, cache_seconds: float, timeout_seconds: float):
+        self.cache_seconds = cache_seconds
+        self.timeout_seconds = timeout_seconds
+        # Set by the lifespan once warm-up has finished
+        self.warmed = False
+
+        self._result: Optional[Dict[str, Any]] = None
+        self._checked_at = 0.0
+        self._pending: Optional[asyncio.Future] = None
+
+        # Metrics
+        self.probes = 0
+        self.failures = 0
+
+    async def check(self) -> Dict[str, Any]:
+        """
+        Get the latest probe result, probing Cosmos DB if it is older than cache_seconds
+
+        Concurrent callers share a single probe.
+
+        Returns:
+            Dict with "ok", "error" (when not ok), "latencyMs" and "checkedAt"
+        """
+        if self._result is not None and time.monotonic() - self._checked_at < self.cache_seconds:
+            return self._result
+
+        if self._pending is None:
+            self._pending = asyncio.ensure_future(self._probe())
+        # Shielded so a caller that disconnects does not cancel the probe for the others
+        return await asyncio.shield(self._pending)
+
+    async def _probe(self) -> Dict[str, Any]:
+        self.probes += 1
+        started = time.perf_counter()
+        cosmos_manager = get_cosmos_manager()
+        result: Dict[str, Any] = {"ok": False}
+        try:
+            if not cosmos_manager.is_configured:
+                result["error"] = "Database connection string is not configured"
+            elif not cosmos_manager.client:
+                result["error"] = "Database connection is unavailable"
+            else:
+                await asyncio.wait_for(cosmos_manager.get_items_container().read(), self.timeout_seconds)
+                result["ok"] = True
+        except asyncio.TimeoutError:
+            result["error"] = f"Cosmos DB did not respond within {self.timeout_seconds:g}s"
+        except Exception as e:
+            result["error"] = f"Cosmos DB probe failed: {str(e)}"
+        finally:
+            result["latencyMs"] = round((time.perf_counter() - started) * 1000, 1)
+            result["checkedAt"] = datetime.utcnow().isoformat()
+            if not result["ok"]:
+                self.failures += 1
+                logger.warning(f"Readiness probe failed: {result.get('error')}")
+            self._result = result
+            self._checked_at = time.monotonic()
+            self._pending = None
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the probe metrics"""
+        return {
+            "warmed": self.warmed,
+            "probes": self.probes,
+            "failures": self.failures,
+            "lastResult": self._result,
+        }
+
+
+@lru_cache()
+def get_readiness_probe() -> ReadinessProbe:
+    """Singleton factory function for ReadinessProbe"""
+    return ReadinessProbe(READINESS_CACHE_SECONDS, READINESS_TIMEOUT_SECONDS)
@@ -0,0 +1,387 @@
+"""Per-request accounting of Cosmos DB calls
+
+Container clients handed out by CosmosDBManager are wrapped in an
+InstrumentedContainer, so every repository and DB helper is measured without
+changes at the call sites. Each call records its latency, request charge (the
+x-ms-request-charge response header), throttled retries and, for queries, the
+query text shape. Calls made while serving a request are collected into that
+request's RequestStats, which InstrumentationMiddleware reports as a
+Server-Timing header and, for slow requests, a structured log line; every
+call, including those made by background tasks, is also counted in the
+/metrics Cosmos DB metrics. Cache and single-flight invalidation on writes is
+a separate wrapper (app/invalidation.py).
+"""
+import json
+import logging
+import os
+import re
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from azure.cosmos import exceptions
+from starlette.datastructures import MutableHeaders
+
+from .metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Add a Server-Timing header with the Cosmos calls made by each request
+SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING_ENABLED", "true").lower() == "true"
+
+# Log one structured line per slow request with its Cosmos calls
+REQUEST_LOG_ENABLED = os.environ.get("REQUEST_LOG_ENABLED", "true").lower() == "true"
+
+# Only log requests that took at least this long (slow requests), 0 to log every request
+REQUEST_LOG_MIN_MS = float(os.environ.get("REQUEST_LOG_MIN_MS", "500"))
+
+REQUEST_CHARGE_HEADER = "x-ms-request-charge"
+THROTTLE_RETRY_COUNT_HEADER = "x-ms-throttle-retry-count"
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL = re.compile(r"(?<![\w@.])-?\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def query_shape(query: str) -> str:
+    """Normalise query text so queries differing only in literals group together"""
+    shape = _STRING_LITERAL.sub("?", query)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def _request_charge(headers: Optional[Dict[str, str]]) -> float:
+    try:
+        return float(headers.get(REQUEST_CHARGE_HEADER, 0)) if headers else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _throttle_retries(headers: Optional[Dict[str, str]]) -> int:
+    try:
+        return int(headers.get(THROTTLE_RETRY_COUNT_HEADER, 0)) if headers else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+class RequestStats:
+    """Cosmos calls made while serving one request, grouped by container, operation and query shape"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.calls = 0
+        self.request_charge = 0.0
+        self.seconds = 0.0
+        self.throttled = 0
+        self.errors = 0
+        self.operations: Dict[Tuple[str, str, Optional[str]], List[float]] = {}
+
+    def record(
+        self,
+        container: str,
+        operation: str,
+        shape: Optional[str],
+        seconds: float,
+        charge: float,
+        status_code: int,
+        throttled: int
+    ):
+        self.calls += 1
+        self.request_charge += charge
+        self.seconds += seconds
+        self.throttled += throttled
+        if status_code >= 400:
+            self.errors += 1
+
+        # [calls, request charge, seconds]
+        totals = self.operations.get((container, operation, shape))
+        if totals is None:
+            self.operations[(container, operation, shape)] = [1, charge, seconds]
+        else:
+            totals[0] += 1
+            totals[1] += charge
+            totals[2] += seconds
+
+    def server_timing(self, total_seconds: float) -> str:
+        """Server-Timing header value for the Cosmos time and charge and the total time"""
+        return (
+            f'cosmos;dur={self.seconds * 1000:.1f};desc="{self.calls} calls, {self.request_charge:.2f} RU", '
+            f"app;dur={total_seconds * 1000:.1f}"
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        """Snapshot of the calls, most expensive operations first"""
+        operations = [
+            {
+                "container": container,
+                "operation": operation,
+                "query": shape,
+                "calls": calls,
+                "requestCharge": round(charge, 2),
+                "durationMs": round(seconds * 1000, 1),
+            }
+            for (container, operation, shape), (calls, charge, seconds) in self.operations.items()
+        ]
+        operations.sort(key=lambda entry: entry["requestCharge"], reverse=True)
+        return {
+            "calls": self.calls,
+            "requestCharge": round(self.request_charge, 2),
+            "durationMs": round(self.seconds * 1000, 1),
+            "throttled": self.throttled,
+            "errors": self.errors,
+            "operations": operations,
+        }
+
+
+# Stats of the request being served; None outside a request (e.g. background tasks)
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("cosmos_request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """Get the Cosmos call stats of the request being served, if any"""
+    return _current_request.get()
+
+
+def record_cosmos_call(
+    container: str,
+    operation: str,
+    shape: Optional[str],
+    seconds: float,
+    charge: float,
+    status_code: int = 200,
+    throttled: int = 0
+):
+    """Account one Cosmos DB call in the metrics and against the current request"""
+    get_metrics().observe_cosmos_call(container, operation, seconds, charge, status_code, throttled)
+    stats = _current_request.get()
+    if stats is not None:
+        stats.record(container, operation, shape, seconds, charge, status_code, throttled)
+
+
+class _ResponseCapture:
+    """response_hook that remembers the last response headers and chains to the caller's hook"""
+
+    __slots__ = ("hook", "headers")
+
+    def __init__(self, hook=None):
+        self.hook = hook
+        self.headers = None
+
+    def __call__(self, headers, result):
+        # The async SDK also calls the hook when a query pager is created, with
+        # the client's previous response headers and the pager as the result;
+        # only page and point responses carry this call's charge.
+        if isinstance(result, (dict, list)) or result is None:
+            self.headers = headers
+        if self.hook is not None:
+            self.hook(headers, result)
+
+
+async def _timed(container_id: str, operation: str, shape: Optional[str], function, *args, **kwargs):
+    capture = _ResponseCapture(kwargs.pop("response_hook", None))
+    status_code = 200
+    headers = None
+    started = time.perf_counter()
+    try:
+        result = await function(*args, response_hook=capture, **kwargs)
+        headers = capture.headers
+        return result
+    except exceptions.CosmosHttpResponseError as e:
+        status_code = e.status_code or 500
+        headers = e.headers
+        raise
+    finally:
+        record_cosmos_call(
+            container_id, operation, shape, time.perf_counter() - started,
+            _request_charge(headers), status_code, _throttle_retries(headers)
+        )
+
+
+class InstrumentedPageIterator:
+    """Page iterator that measures every page fetch"""
+
+    def __init__(self, pages, container_id: str, operation: str, shape: Optional[str], capture: _ResponseCapture):
+        self._pages = pages
+        self._container_id = container_id
+        self._operation = operation
+        self._shape = shape
+        self._capture = capture
+
+    @property
+    def continuation_token(self):
+        return self._pages.continuation_token
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        self._capture.headers = None
+        status_code = 200
+        headers = None
+        started = time.perf_counter()
+        try:
+            page = await self._pages.__anext__()
+            headers = self._capture.headers
+            return page
+        except StopAsyncIteration:
+            # No request is made once the last page has been read
+            started = None
+            raise
+        except exceptions.CosmosHttpResponseError as e:
+            status_code = e.status_code or 500
+            headers = e.headers
+            raise
+        finally:
+            if started is not None:
+                record_cosmos_call(
+                    self._container_id, self._operation, self._shape, time.perf_counter() - started,
+                    _request_charge(headers), status_code, _throttle_retries(headers)
+                )
+
+
+class InstrumentedItemPaged:
+    """Query results whose page fetches are measured"""
+
+    def __init__(self, paged, container_id: str, operation: str, shape: Optional[str], capture: _ResponseCapture):
+        self._paged = paged
+        self._container_id = container_id
+        self._operation = operation
+        self._shape = shape
+        self._capture = capture
+
+    def by_page(self, continuation_token: Optional[str] = None) -> InstrumentedPageIterator:
+        return InstrumentedPageIterator(
+            self._paged.by_page(continuation_token),
+            self._container_id, self._operation, self._shape, self._capture
+        )
+
+    async def _iterate(self):
+        async for page in self.by_page():
+            async for item in page:
+                yield item
+
+    def __aiter__(self):
+        return self._iterate().__aiter__()
+
+
+class InstrumentedContainer:
+    """Container client proxy that measures the Cosmos DB calls made through it"""
+
+    def __init__(self, container):
+        self._container = container
+        self.id = container.id
+
+    def __getattr__(self, name: str):
+        return getattr(self._container, name)
+
+    async def read(self, **kwargs):
+        return await _timed(self.id, "read", None, self._container.read, **kwargs)
+
+    async def read_item(self, item, partition_key, **kwargs):
+        return await _timed(self.id, "read_item", None, self._container.read_item, item, partition_key, **kwargs)
+
+    async def _write(self, operation: str, function, *args, **kwargs):
+        return await _timed(self.id, operation, None, function, *args, **kwargs)
+
+    async def create_item(self, body, **kwargs):
+        return await self._write("create_item", self._container.create_item, body, **kwargs)
+
+    async def upsert_item(self, body, **kwargs):
+        return await self._write("upsert_item", self._container.upsert_item, body, **kwargs)
+
+    async def replace_item(self, item, body, **kwargs):
+        return await self._write("replace_item", self._container.replace_item, item, body, **kwargs)
+
+    async def patch_item(self, item, partition_key, patch_operations, **kwargs):
+        return await self._write("patch_item", self._container.patch_item, item, partition_key, patch_operations, **kwargs)
+
+    async def delete_item(self, item, partition_key, **kwargs):
+        return await self._write("delete_item", self._container.delete_item, item, partition_key, **kwargs)
+
+    def query_items(self, query, **kwargs) -> InstrumentedItemPaged:
+        capture = _ResponseCapture(kwargs.pop("response_hook", None))
+        paged = self._container.query_items(query, response_hook=capture, **kwargs)
+        return InstrumentedItemPaged(paged, self.id, "query_items", query_shape(query), capture)
+
+    def query_items_change_feed(self, **kwargs) -> InstrumentedItemPaged:
+        capture = _ResponseCapture(kwargs.pop("response_hook", None))
+        paged = self._container.query_items_change_feed(response_hook=capture, **kwargs)
+        return InstrumentedItemPaged(paged, self.id, "query_items_change_feed", None, capture)
+
+
+def instrument_container(container):
+    """Wrap a container client so its calls are measured"""
+    if container is None or isinstance(container, InstrumentedContainer):
+        return container
+    return InstrumentedContainer(container)
+
+
+# Path templates of routes that do not put themselves in the scope, by endpoint
+_endpoint_paths: Dict[Any, Optional[str]] = {}
+
+
+def _route_path(scope) -> Optional[str]:
+    """Path template of the route that served the request, or None if no route matched"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return None
+    if endpoint not in _endpoint_paths:
+        app = scope.get("app")
+        _endpoint_paths[endpoint] = next(
+            (candidate.path for candidate in getattr(app, "routes", ())
+             if getattr(candidate, "endpoint", None) is endpoint),
+            None
+        )
+    return _endpoint_paths[endpoint]
+
+
+class InstrumentationMiddleware:
+    """ASGI middleware recording request metrics and each request's Cosmos calls (Server-Timing and a log line)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = get_metrics()
+        metrics.http_in_flight.inc()
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if SERVER_TIMING_ENABLED:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", stats.server_timing(time.perf_counter() - stats.started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_request.reset(token)
+            metrics.http_in_flight.dec()
+            duration = time.perf_counter() - stats.started
+            route = _route_path(scope)
+            # Unmatched paths share one label so scanners cannot blow up the series count
+            metrics.observe_request(scope["method"], route or "unmatched", status_code, duration)
+            duration_ms = duration * 1000
+            if REQUEST_LOG_ENABLED and duration_ms >= REQUEST_LOG_MIN_MS:
+                logger.info(json.dumps({
+                    "event": "request",
+                    "method": scope["method"],
+                    "route": route or scope["path"],
+                    "status": status_code,
+                    "durationMs": round(duration_ms, 1),
+                    "cosmos": stats.summary(),
+                }))
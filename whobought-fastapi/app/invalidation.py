@@ -0,0 +1,59 @@
+"""Write hook that keeps the document caches and single-flight groups coherent
+
+Every container client is wrapped so that, once a write completes (or fails,
+since a timed-out write may still have been applied), the written document is
+dropped from the container's document cache and the cache's generation moves
+on, and reads already in flight can no longer be joined. A read issued before
+the write therefore neither caches nor shares the version it returns.
+"""
+from typing import Any, Optional
+
+from .cache import document_written
+from .singleflight import get_single_flight
+
+
+def _document_id(item: Any) -> Optional[str]:
+    """Id of a document passed to the SDK either as its id or as the document itself"""
+    if isinstance(item, dict):
+        return item.get("id")
+    return item
+
+
+class InvalidatingContainer:
+    """Container client proxy that runs the write hook after every write"""
+
+    def __init__(self, container):
+        self._container = container
+        self.id = container.id
+
+    def __getattr__(self, name: str):
+        return getattr(self._container, name)
+
+    async def _write(self, item: Any, function, *args, **kwargs):
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            document_written(self.id, _document_id(item))
+            get_single_flight(self.id).invalidate()
+
+    async def create_item(self, body, **kwargs):
+        return await self._write(body, self._container.create_item, body, **kwargs)
+
+    async def upsert_item(self, body, **kwargs):
+        return await self._write(body, self._container.upsert_item, body, **kwargs)
+
+    async def replace_item(self, item, body, **kwargs):
+        return await self._write(item, self._container.replace_item, item, body, **kwargs)
+
+    async def patch_item(self, item, partition_key, patch_operations, **kwargs):
+        return await self._write(item, self._container.patch_item, item, partition_key, patch_operations, **kwargs)
+
+    async def delete_item(self, item, partition_key, **kwargs):
+        return await self._write(item, self._container.delete_item, item, partition_key, **kwargs)
+
+
+def invalidate_on_write(container):
+    """Wrap a container client so writes through it invalidate its cache and single-flight group"""
+    if container is None or isinstance(container, InvalidatingContainer):
+        return container
+    return InvalidatingContainer(container)
@@ -1,13 +1,24 @@
-from fastapi import FastAPI, Depends, Request
+from fastapi import FastAPI, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+import asyncio
 import logging
 import os
 from datetime import datetime
 
-from .routers import items_router, users_router
+from .routers import items_router, users_router, groups_router, realtime_router
 from .routers.auth import router as auth_router
 from .database import get_cosmos_manager
-from .responses import success_response, error_response
+from .password_pool import get_password_pool
+from .change_feed import create_change_feed_processors
+from .realtime import publish_item_change, publish_payment_change
+from .responses import FastJSONResponse, success_response, error_response
+from .instrumentation import InstrumentationMiddleware
+from .metrics import (
+    METRICS_ENABLED, METRICS_MULTIPROCESS_DIR, CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsWriter, get_metrics
+)
+from .health import get_readiness_probe
+from .warmup import WARMUP_ENABLED, WARMUP_TIMEOUT_SECONDS, warm_up
 
 # Configure logging
 logging.basicConfig(
@@ -36,11 +47,48 @@ for var in env_vars:
     else:
         logger.warning(f"✗ {var} is not set")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared resources on startup and release them on shutdown"""
+    cosmos_manager = get_cosmos_manager()
+    password_pool = get_password_pool()
+    await cosmos_manager.open()
+    password_pool.start()
+    change_feed_processors = create_change_feed_processors(
+        cosmos_manager,
+        {"items": publish_item_change, "payments": publish_payment_change}
+    )
+    for processor in change_feed_processors.values():
+        processor.start()
+    # Share this worker's metrics with the others for instance-wide /metrics
+    metrics_writer = MetricsWriter(METRICS_MULTIPROCESS_DIR) if METRICS_MULTIPROCESS_DIR else None
+    if metrics_writer is not None:
+        metrics_writer.start()
+    if WARMUP_ENABLED:
+        try:
+            await asyncio.wait_for(warm_up(cosmos_manager), WARMUP_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning(f"Warm-up did not finish within {WARMUP_TIMEOUT_SECONDS:g}s, serving anyway")
+    get_readiness_probe().warmed = True
+    try:
+        yield
+    finally:
+        # Report unready while draining
+        get_readiness_probe().warmed = False
+        for processor in change_feed_processors.values():
+            await processor.stop()
+        if metrics_writer is not None:
+            await metrics_writer.stop()
+        password_pool.shutdown()
+        await cosmos_manager.close()
+
 # Create FastAPI app
 app = FastAPI(
     title="WhoBought API",
     description="API for tracking shared expenses",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # Add CORS middleware
@@ -50,11 +98,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Request metrics and per-request Cosmos DB calls (Server-Timing header and a log line)
+app.add_middleware(InstrumentationMiddleware)
+
 # Include routers
 app.include_router(items_router)
 app.include_router(users_router)
+app.include_router(groups_router)
+app.include_router(realtime_router)
 app.include_router(auth_router)
 
 @app.get("/")
@@ -70,25 +124,24 @@ async def health_check(request: Request):
     # Try to access the database
     try:
         cosmos_manager = get_cosmos_manager()
-        db_status = "disconnected"
+        probe = await get_readiness_probe().check()
         
-        if cosmos_manager.connection_string:
-            if cosmos_manager.client:
-                status = "healthy"
-                message = "Service is healthy"
-                db_status = "connected"
-            else:
-                status = "degraded"
-                message = "Database connection is unavailable"
+        if probe["ok"]:
+            status = "healthy"
+            message = "Service is healthy"
+            db_status = "connected"
         else:
             status = "degraded"
-            message = "Database connection string is not configured"
+            message = probe["error"]
+            db_status = "disconnected"
             
         return success_response(
             data={
                 "status": status,
                 "version": app.version,
                 "db_status": db_status,
+                "db_latency_ms": probe["latencyMs"],
+                "db_checked_at": probe["checkedAt"],
                 "environment": {
                     "COSMOS_DATABASE_NAME": cosmos_manager.database_name,
                     "COSMOS_CONTAINER_NAME": cosmos_manager.items_container_name,
@@ -104,3 +157,29 @@ async def health_check(request: Request):
             message="Service health check failed",
             errors=[str(e)]
         )
+
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe: the worker is up and its event loop is responsive"""
+    return success_response(data={"status": "alive"}, message="Service is alive")
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: warm-up has finished and Cosmos DB answers (checked at most every READINESS_CACHE_SECONDS)"""
+    readiness_probe = get_readiness_probe()
+    if not readiness_probe.warmed:
+        return error_response(message="Service is warming up", status_code=503)
+    
+    probe = await readiness_probe.check()
+    if not probe["ok"]:
+        return error_response(message="Service is not ready", status_code=503, errors=[probe["error"]])
+    return success_response(
+        data={"status": "ready", "db_latency_ms": probe["latencyMs"], "db_checked_at": probe["checkedAt"]},
+        message="Service is ready"
+    )
+
+if METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus metrics for this worker, or the whole instance under gunicorn"""
+        return Response(content=await get_metrics().render(), media_type=METRICS_CONTENT_TYPE)
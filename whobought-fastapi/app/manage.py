@@ -0,0 +1,73 @@
+"""Maintenance commands for the WhoBought backend
+
+Usage:
+    python -m app.manage rebuild-user-lookup
+    python -m app.manage rebuild-balances [GROUP_ID ...]
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from .database import BalancesDB, UsersDB, get_cosmos_manager
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+
+async def rebuild_user_lookup(args: argparse.Namespace):
+    """Index every existing user by username and email"""
+    count, collisions = await UsersDB.rebuild_lookup_index()
+    logger.info(f"Indexed {count} users")
+    if collisions:
+        for key, user_ids in collisions.items():
+            logger.error(f"Lookup collision for {key}: users {', '.join(user_ids)}")
+        logger.error(
+            f"{len(collisions)} usernames/emails are shared by several users and were not indexed; "
+            "rename or merge those users and run the command again"
+        )
+        return 1
+    return 0
+
+
+async def rebuild_balances(args: argparse.Namespace):
+    """Recompute materialized balances for the given groups, or all groups"""
+    group_ids = args.ids or await BalancesDB.get_group_ids()
+    for group_id in group_ids:
+        document = await BalancesDB.rebuild_balances(group_id)
+        logger.info(
+            f"Rebuilt balances for group {group_id} "
+            f"({document.get('itemCount', 0)} items, {document.get('paymentCount', 0)} payments)"
+        )
+    return 0
+
+
+COMMANDS = {
+    "rebuild-user-lookup": rebuild_user_lookup,
+    "rebuild-balances": rebuild_balances,
+}
+
+
+async def run(args: argparse.Namespace) -> int:
+    """Run a maintenance command with an open Cosmos DB connection, returning its exit status"""
+    cosmos_manager = get_cosmos_manager()
+    await cosmos_manager.open()
+    try:
+        return await COMMANDS[args.command](args)
+    finally:
+        await cosmos_manager.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WhoBought maintenance commands")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("ids", nargs="*", help="Optional ids to limit the command to")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,500 @@
+"""Prometheus text-format metrics
+
+Counters and histograms are plain in-process numbers. They are only updated
+from the event loop thread and an update never awaits, so no locks are needed
+between async tasks. Gauges for the caches, the password hashing pool and the
+realtime hub are read from their stats() when /metrics is scraped.
+
+Each worker process keeps its own metrics. Under gunicorn every worker also
+writes them to METRICS_MULTIPROCESS_DIR (see MetricsWriter), and /metrics
+reports the whole instance whichever worker answers: counters and histograms
+are summed across workers, and gauges are reported per worker with a "worker"
+label. When a worker exits its counters are folded into an archive file
+(archive_worker), so instance totals never go backwards.
+"""
+import asyncio
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .auth import get_token_cache
+from .cache import cache_stats
+from .password_pool import get_password_pool
+from .rate_limit import rate_limit_stats
+from .realtime import get_connection_hub
+from .singleflight import single_flight_stats
+
+logger = logging.getLogger(__name__)
+
+# Expose GET /metrics
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+
+# Directory the workers share to report instance-wide metrics (gunicorn.conf.py sets one);
+# unset to report only the worker that answers
+METRICS_MULTIPROCESS_DIR = os.environ.get("METRICS_MULTIPROCESS_DIR")
+
+# Seconds between a worker's writes of its metrics to METRICS_MULTIPROCESS_DIR
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", "1"))
+
+ARCHIVE_FILE = "archive.json"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COSMOS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric(ABC):
+    """A named metric family with labelled series"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        """Exposition lines for the metric, its HELP and TYPE header first"""
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[Tuple[Any, ...], Any]]:
+        """(labels, value) pairs for writing the metric to another process"""
+
+    @abstractmethod
+    def merge(self, labels: Tuple[Any, ...], value: Any):
+        """Add a sample written by another process"""
+
+    def family(self) -> Dict[str, Any]:
+        """JSON-serialisable description and samples of the metric"""
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "documentation": self.documentation,
+            "labelnames": list(self.labelnames),
+            "samples": [[list(labels), value] for labels, value in self.samples()],
+        }
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[Any, ...], float] = {}
+
+    def inc(self, labels: Tuple[Any, ...] = (), amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            for labels, value in self._values.items()
+        ]
+
+    def samples(self) -> List[Tuple[Tuple[Any, ...], Any]]:
+        return list(self._values.items())
+
+    def merge(self, labels: Tuple[Any, ...], value: Any):
+        self.inc(labels, value)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[Any, ...], float] = {}
+
+    def set(self, value: float, labels: Tuple[Any, ...] = ()):
+        self._values[labels] = value
+
+    def inc(self, labels: Tuple[Any, ...] = (), amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: Tuple[Any, ...] = (), amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            for labels, value in self._values.items()
+        ]
+
+    def samples(self) -> List[Tuple[Tuple[Any, ...], Any]]:
+        return list(self._values.items())
+
+    def merge(self, labels: Tuple[Any, ...], value: Any):
+        self.set(value, labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (the last one is +Inf)..., sum]
+        self._series: Dict[Tuple[Any, ...], List[float]] = {}
+
+    def observe(self, value: float, labels: Tuple[Any, ...] = ()):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        bounds = self.buckets + (float("inf"),)
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+    def samples(self) -> List[Tuple[Tuple[Any, ...], Any]]:
+        return [(labels, list(series)) for labels, series in self._series.items()]
+
+    def merge(self, labels: Tuple[Any, ...], value: Any):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        for position, count in enumerate(value):
+            series[position] += count
+
+    def family(self) -> Dict[str, Any]:
+        family = super().family()
+        family["buckets"] = list(self.buckets)
+        return family
+
+
+class AppMetrics:
+    """Request, Cosmos DB and runtime metrics of this worker"""
+
+    def __init__(self):
+        self.http_requests = Counter(
+            "whobought_http_requests_total", "HTTP requests by route template and status",
+            ("method", "route", "status")
+        )
+        self.http_request_duration = Histogram(
+            "whobought_http_request_duration_seconds", "HTTP request latency by route template",
+            ("method", "route"), REQUEST_BUCKETS
+        )
+        self.http_in_flight = Gauge("whobought_http_requests_in_flight", "HTTP requests being served")
+        self.http_in_flight.set(0)
+
+        self.cosmos_requests = Counter(
+            "whobought_cosmos_requests_total", "Cosmos DB calls by container, operation and status",
+            ("container", "operation", "status")
+        )
+        self.cosmos_request_duration = Histogram(
+            "whobought_cosmos_request_duration_seconds", "Cosmos DB call latency, including SDK retries",
+            ("container", "operation"), COSMOS_BUCKETS
+        )
+        self.cosmos_request_units = Counter(
+            "whobought_cosmos_request_units_total", "Request units charged by Cosmos DB",
+            ("container", "operation")
+        )
+        self.cosmos_throttled = Counter(
+            "whobought_cosmos_throttled_total", "Throttled (429) Cosmos DB responses, including ones retried by the SDK",
+            ("container", "operation")
+        )
+
+        self.metrics: List[Metric] = [
+            self.http_requests, self.http_request_duration, self.http_in_flight,
+            self.cosmos_requests, self.cosmos_request_duration, self.cosmos_request_units, self.cosmos_throttled,
+        ]
+
+    def observe_request(self, method: str, route: str, status_code: int, seconds: float):
+        self.http_requests.inc((method, route, status_code))
+        self.http_request_duration.observe(seconds, (method, route))
+
+    def observe_cosmos_call(
+        self,
+        container: str,
+        operation: str,
+        seconds: float,
+        charge: float,
+        status_code: int,
+        throttled: int
+    ):
+        labels = (container, operation)
+        self.cosmos_requests.inc((container, operation, status_code))
+        self.cosmos_request_duration.observe(seconds, labels)
+        if charge:
+            self.cosmos_request_units.inc(labels, charge)
+        if status_code == 429:
+            throttled += 1
+        if throttled:
+            self.cosmos_throttled.inc(labels, throttled)
+
+    def collect(self) -> List[Metric]:
+        """This worker's request and Cosmos DB metrics and its runtime gauges"""
+        return self.metrics + runtime_metrics()
+
+    def families(self) -> List[Dict[str, Any]]:
+        """Snapshot of collect() for another thread or process; taken on the event loop, which updates the values"""
+        return [metric.family() for metric in self.collect()]
+
+    async def render(self) -> str:
+        """All metrics in the Prometheus text exposition format, for the instance when workers share a directory"""
+        if not METRICS_MULTIPROCESS_DIR:
+            return render_metrics(self.collect())
+        # Report this worker's current values rather than its last periodic write. The
+        # file I/O and merging run off the event loop so they do not delay requests.
+        return await asyncio.get_running_loop().run_in_executor(
+            None, _render_instance, METRICS_MULTIPROCESS_DIR, self.families()
+        )
+
+
+def render_metrics(metrics: Iterable[Metric]) -> str:
+    """Metrics in the Prometheus text exposition format"""
+    lines: List[str] = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _render_instance(directory: str, families: List[Dict[str, Any]]) -> str:
+    write_worker_metrics(directory, families)
+    return render_metrics(read_instance_metrics(directory))
+
+
+def _cache_metrics(caches: Dict[str, Dict[str, Any]]) -> Iterable[Metric]:
+    hits = Counter("whobought_cache_hits_total", "Cache lookups that were hits", ("cache",))
+    misses = Counter("whobought_cache_misses_total", "Cache lookups that were misses", ("cache",))
+    evictions = Counter("whobought_cache_evictions_total", "Entries evicted to stay within the size bound", ("cache",))
+    ratio = Gauge("whobought_cache_hit_ratio", "Hits over lookups since start", ("cache",))
+    size = Gauge("whobought_cache_entries", "Entries currently cached", ("cache",))
+    for name, stats in caches.items():
+        hits.inc((name,), stats["hits"])
+        misses.inc((name,), stats["misses"])
+        evictions.inc((name,), stats["evictions"])
+        ratio.set(stats["hitRatio"], (name,))
+        size.set(stats["size"], (name,))
+    return hits, misses, evictions, ratio, size
+
+
+def runtime_metrics() -> List[Metric]:
+    """Gauges read from the caches, password hashing pool, single-flight groups, rate limiters and realtime hub at scrape time"""
+    caches = {f"document:{name}": stats for name, stats in cache_stats().items()}
+    caches["jwt"] = get_token_cache().stats()
+    metrics = list(_cache_metrics(caches))
+
+    pool = get_password_pool().stats()
+    pool_gauges = {
+        "whobought_password_hash_queue_depth": ("Password hashing jobs waiting for a worker", pool["queueDepth"]),
+        "whobought_password_hash_in_flight": ("Password hashing jobs submitted and not finished", pool["inFlight"]),
+        "whobought_password_hash_workers": ("Password hashing workers", pool["workers"]),
+        "whobought_password_hash_queue_limit": ("Jobs allowed to wait before requests get a 503", pool["queueLimit"]),
+    }
+    for name, (documentation, value) in pool_gauges.items():
+        gauge = Gauge(name, documentation)
+        gauge.set(value)
+        metrics.append(gauge)
+    pool_counters = {
+        "whobought_password_hash_completed_total": ("Password hashing jobs completed", pool["completed"]),
+        "whobought_password_hash_rejected_total": ("Password hashing jobs rejected with a 503", pool["rejected"]),
+        "whobought_password_hash_seconds_total": ("Time spent in password hashing jobs", pool["totalSeconds"]),
+    }
+    for name, (documentation, value) in pool_counters.items():
+        counter = Counter(name, documentation)
+        counter.inc(amount=value)
+        metrics.append(counter)
+
+    calls = Counter("whobought_single_flight_calls_total", "Cosmos reads issued by the single-flight layer", ("container",))
+    coalesced = Counter(
+        "whobought_single_flight_coalesced_total", "Reads that joined an identical read already in flight", ("container",)
+    )
+    for name, stats in single_flight_stats().items():
+        calls.inc((name,), stats["calls"])
+        coalesced.inc((name,), stats["coalesced"])
+    metrics.extend((calls, coalesced))
+
+    allowed = Counter("whobought_rate_limit_allowed_total", "Auth attempts admitted by the rate limiter", ("limiter",))
+    rejected = Counter("whobought_rate_limit_rejected_total", "Auth attempts refused with a 429", ("limiter",))
+    buckets = Gauge("whobought_rate_limit_buckets", "Token buckets currently tracked", ("limiter",))
+    for name, stats in rate_limit_stats().items():
+        allowed.inc((name,), stats["allowed"])
+        rejected.inc((name,), stats["rejected"])
+        buckets.set(stats["buckets"], (name,))
+    metrics.extend((allowed, rejected, buckets))
+
+    hub = get_connection_hub().stats()
+    connections = Gauge("whobought_realtime_connections", "Open realtime WebSocket connections")
+    connections.set(hub["connections"])
+    metrics.append(connections)
+    return metrics
+
+
+def _worker_file(directory: str, pid: int) -> str:
+    return os.path.join(directory, f"worker-{pid}.json")
+
+
+def _write_json(path: str, document: Dict[str, Any]):
+    # Readers only ever see whole files
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(document, f, separators=(",", ":"))
+    os.replace(temporary, path)
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_worker_metrics(directory: str, families: List[Dict[str, Any]]):
+    """Write this worker's metric families (AppMetrics.families) for the other workers' /metrics to merge"""
+    _write_json(_worker_file(directory, os.getpid()), {
+        "pid": os.getpid(),
+        "worker": os.environ.get("WORKER_SLOT", str(os.getpid())),
+        "families": families,
+    })
+
+
+def _empty_metric(family: Dict[str, Any], per_worker: bool) -> Metric:
+    labelnames = tuple(family["labelnames"]) + (("worker",) if per_worker else ())
+    if family["kind"] == "histogram":
+        return Histogram(family["name"], family["documentation"], labelnames, family["buckets"])
+    if family["kind"] == "gauge":
+        return Gauge(family["name"], family["documentation"], labelnames)
+    return Counter(family["name"], family["documentation"], labelnames)
+
+
+def merge_metrics(snapshots: Iterable[Dict[str, Any]]) -> List[Metric]:
+    """Sum counters and histograms across snapshots and keep each worker's gauges under a "worker" label"""
+    merged: Dict[str, Metric] = {}
+    for snapshot in snapshots:
+        worker = snapshot.get("worker")
+        for family in snapshot["families"]:
+            per_worker = family["kind"] == "gauge"
+            metric = merged.get(family["name"])
+            if metric is None:
+                metric = merged[family["name"]] = _empty_metric(family, per_worker)
+            for labels, value in family["samples"]:
+                labels = tuple(labels) + ((worker,) if per_worker else ())
+                metric.merge(labels, value)
+    return list(merged.values())
+
+
+def read_instance_metrics(directory: str) -> List[Metric]:
+    """Merge the metrics of every live worker with the counters archived from exited ones"""
+    workers = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith("worker-") and name.endswith(".json"):
+            snapshot = _read_json(os.path.join(directory, name))
+            if snapshot is not None:
+                workers.append(snapshot)
+    # Read after the workers: a worker archived in between is then either in
+    # the archive and skipped below, or counted from its file with the old archive
+    archive = _read_json(os.path.join(directory, ARCHIVE_FILE)) or {"archived": [], "families": []}
+    archived = set(archive["archived"])
+    return merge_metrics([archive] + [snapshot for snapshot in workers if snapshot["pid"] not in archived])
+
+
+def archive_worker(directory: str, pid: int):
+    """
+    Fold an exited worker's counters and histograms into the archive
+
+    Called by the gunicorn master when a worker exits. The worker's gauges are
+    dropped. The archive lists the pid before the worker's file is removed, so
+    a concurrent /metrics never counts it twice or not at all.
+    """
+    path = _worker_file(directory, pid)
+    snapshot = _read_json(path)
+    if snapshot is None:
+        return
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    archive = _read_json(archive_path) or {"archived": [], "families": []}
+    counters = {
+        **snapshot,
+        "families": [family for family in snapshot["families"] if family["kind"] != "gauge"],
+    }
+    totals = merge_metrics([archive, counters])
+    _write_json(archive_path, {
+        # Only workers whose files may still exist need listing
+        "archived": [pid],
+        "families": [metric.family() for metric in totals],
+    })
+    os.remove(path)
+
+
+class MetricsWriter:
+    """Periodically writes this worker's metrics to the shared directory"""
+
+    def __init__(self, directory: str, interval_seconds: float = METRICS_FLUSH_SECONDS):
+        self.directory = directory
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def write(self):
+        """Write the current values, serialising and writing the file off the event loop"""
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, write_worker_metrics, self.directory, get_metrics().families()
+            )
+        except Exception as e:
+            logger.error(f"Failed to write metrics to {self.directory}: {str(e)}")
+
+    async def run(self):
+        while True:
+            await self.write()
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        """Start writing in a background task"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        """Stop writing, after a last write so the archive gets this worker's final counts"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            await self.write()
+
+
+@lru_cache()
+def get_metrics() -> AppMetrics:
+    """Singleton factory function for AppMetrics"""
+    return AppMetrics()
@@ -21,4 +21,15 @@ from .dto.item_dto import (
     ItemUpdateDto,
     ItemResponseDto
 )
-from .dto.response_dto import ApiResponseDto 
\ No newline at end of file
+from .dto.response_dto import ApiResponseDto
+
+# Re-export request/response models used by the routers and response helpers
+from .api import (
+    UserCreate,
+    UserInDB,
+    Token,
+    TokenData,
+    LoginRequest,
+    ApiResponse,
+    ResponseModel
+)
@@ -11,6 +11,7 @@ class Item(BaseModel):
     purchasedBy: str
     amount: float
     paidFor: List[str]
+    groupId: Optional[str] = None
     createdAt: Optional[datetime] = None
     updatedAt: Optional[datetime] = None
 
@@ -21,7 +22,8 @@ class Item(BaseModel):
                 "description": "Weekly shopping",
                 "purchasedBy": "user1",
                 "amount": 45.50,
-                "paidFor": ["user1", "user2"]
+                "paidFor": ["user1", "user2"],
+                "groupId": "group1"
             }
         }
 
@@ -94,13 +96,15 @@ class ApiResponse(Generic[T]):
         message: str = "Success",
         success: bool = True,
         status_code: int = 200,
-        errors: Optional[List[str]] = None
+        errors: Optional[List[str]] = None,
+        next_cursor: Optional[str] = None
     ):
         self.data = data
         self.message = message
         self.success = success
         self.status_code = status_code
         self.errors = errors or []
+        self.next_cursor = next_cursor
         self.timestamp = datetime.utcnow().isoformat()
 
     def dict(self):
@@ -111,6 +115,7 @@ class ApiResponse(Generic[T]):
             "success": self.success,
             "statusCode": self.status_code,
             "errors": self.errors,
+            "nextCursor": self.next_cursor,
             "timestamp": self.timestamp
         }
 
@@ -122,4 +127,5 @@ class ResponseModel(BaseModel):
     success: bool = True
     statusCode: int = 200
     errors: List[str] = []
+    nextCursor: Optional[str] = None
     timestamp: str 
\ No newline at end of file
@@ -10,6 +10,7 @@ class ItemCreateDto(BaseModel):
     purchasedBy: str
     amount: float = Field(..., gt=0)
     paidFor: List[str]
+    groupId: Optional[str] = None
 
     class Config:
         json_schema_extra = {
@@ -18,7 +19,8 @@ class ItemCreateDto(BaseModel):
                 "description": "Weekly shopping",
                 "purchasedBy": "550e8400-e29b-41d4-a716-446655440000",
                 "amount": 45.50,
-                "paidFor": ["550e8400-e29b-41d4-a716-446655440000", "550e8400-e29b-41d4-a716-446655440001"]
+                "paidFor": ["550e8400-e29b-41d4-a716-446655440000", "550e8400-e29b-41d4-a716-446655440001"],
+                "groupId": "7c9e6679-7425-40de-944b-e07fc1f90ae7"
             }
         }
 
@@ -30,6 +32,7 @@ class ItemUpdateDto(BaseModel):
     purchasedBy: Optional[str] = None
     amount: Optional[float] = Field(None, gt=0)
     paidFor: Optional[List[str]] = None
+    groupId: Optional[str] = None
 
     class Config:
         json_schema_extra = {
@@ -49,6 +52,7 @@ class ItemResponseDto(BaseModel):
     purchasedBy: str
     amount: float
     paidFor: List[str]
+    groupId: Optional[str] = None
     createdAt: str
     updatedAt: str
 
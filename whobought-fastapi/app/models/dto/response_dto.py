@@ -11,6 +11,7 @@ class ApiResponseDto(BaseModel, Generic[T]):
     message: str = ""
     statusCode: int = 200
     errors: List[str] = []
+    nextCursor: Optional[str] = None
     timestamp: str
 
     class Config:
@@ -20,6 +21,7 @@ class ApiResponseDto(BaseModel, Generic[T]):
                 "message": "Success",
                 "statusCode": 200,
                 "errors": [],
+                "nextCursor": None,
                 "timestamp": "2023-04-01T00:00:00.000Z"
             }
         } 
\ No newline at end of file
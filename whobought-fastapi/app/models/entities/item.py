@@ -11,6 +11,7 @@ class Item(BaseModel):
     purchasedBy: str
     amount: float
     paidFor: List[str]
+    groupId: Optional[str] = None
     createdAt: Optional[datetime] = None
     updatedAt: Optional[datetime] = None
 
@@ -21,6 +22,7 @@ class Item(BaseModel):
                 "description": "Weekly shopping",
                 "purchasedBy": "user1",
                 "amount": 45.50,
-                "paidFor": ["user1", "user2"]
+                "paidFor": ["user1", "user2"],
+                "groupId": "group1"
             }
         } 
\ No newline at end of file
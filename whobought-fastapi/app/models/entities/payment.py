@@ -7,6 +7,7 @@ class Payment(BaseModel):
     """Payment entity model"""
     id: Optional[str] = None
     user_id: str
+    recipient_id: Optional[str] = None
     group_id: str
     amount: float
     description: Optional[str] = None
@@ -18,6 +19,7 @@ class Payment(BaseModel):
         json_schema_extra = {
             "example": {
                 "user_id": "user1",
+                "recipient_id": "user2",
                 "group_id": "group1",
                 "amount": 45.50,
                 "description": "Repayment for groceries",
@@ -0,0 +1,69 @@
+import base64
+import binascii
+import os
+from typing import Optional
+
+# Page size limits for list endpoints
+DEFAULT_PAGE_SIZE = int(os.environ.get("DEFAULT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", "200"))
+# Cosmos page size used when streaming a whole list
+STREAM_PAGE_SIZE = int(os.environ.get("STREAM_PAGE_SIZE", "100"))
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_stream(accept: Optional[str], stream: bool = False) -> bool:
+    """
+    Decide whether a list request asked for a streamed NDJSON response
+
+    Args:
+        accept: Value of the request's Accept header
+        stream: Value of the stream query flag
+
+    Returns:
+        True if the response should be streamed
+    """
+    return stream or (accept is not None and NDJSON_MEDIA_TYPE in accept)
+
+
+def encode_cursor(continuation_token: Optional[str]) -> Optional[str]:
+    """
+    Wrap a Cosmos continuation token into an opaque, URL-safe cursor
+
+    Args:
+        continuation_token: Continuation token returned by Cosmos DB
+
+    Returns:
+        Cursor string, or None if there are no more pages
+    """
+    if not continuation_token:
+        return None
+    encoded = base64.urlsafe_b64encode(continuation_token.encode("utf-8"))
+    return encoded.decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[str]:
+    """
+    Unwrap a cursor produced by encode_cursor
+
+    Args:
+        cursor: Cursor string from the client
+
+    Returns:
+        Cosmos continuation token, or None for the first page
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if not cursor:
+        return None
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        # validate: urlsafe_b64decode silently drops characters outside the alphabet
+        token = base64.b64decode(padded.encode("ascii"), altchars=b"-_", validate=True).decode("utf-8")
+    except (binascii.Error, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not token:
+        # An empty token would silently restart from the first page
+        raise ValueError("Invalid cursor")
+    return token
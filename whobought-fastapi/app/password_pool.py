@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+
+from .utils import hash_password, verify_password
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordPoolSaturatedError(Exception):
+    """Raised when the password hashing queue is full"""
+
+
+class PasswordHashingPool:
+    """Bounded executor that runs bcrypt work off the event loop"""
+
+    def __init__(self):
+        # "process" gives real parallelism across cores, "thread" is cheaper to start
+        self.executor_type = os.environ.get("PASSWORD_HASH_EXECUTOR", "process").lower()
+        self.max_workers = int(os.environ.get("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+        # Jobs allowed to wait for a worker before new ones are rejected
+        self.max_queue = int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", str(self.max_workers * 8)))
+
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+
+        # Metrics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+
+    def start(self):
+        """Create the underlying executor"""
+        if self._executor is not None:
+            return
+        if self.executor_type == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="password-hash"
+            )
+        else:
+            # Spawn rather than fork: the parent is running an event loop and threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        logger.info(
+            f"Started password hashing pool ({self.executor_type}, "
+            f"{self.max_workers} workers, queue limit {self.max_queue})"
+        )
+
+    def shutdown(self):
+        """Shut down the executor, cancelling queued work"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("Stopped password hashing pool")
+
+    @property
+    def in_flight(self) -> int:
+        """Number of jobs submitted and not yet finished"""
+        return self._pending
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of jobs waiting for a free worker"""
+        return max(0, self._pending - self.max_workers)
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run a password function in the pool
+
+        Args:
+            func: Picklable top-level function to run
+            args: Positional arguments for the function
+
+        Returns:
+            The function's result
+
+        Raises:
+            PasswordPoolSaturatedError: If the queue limit has been reached
+        """
+        if self._pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordPoolSaturatedError("Password hashing queue is full")
+
+        if self._executor is None:
+            self.start()
+
+        self._pending += 1
+        self.submitted += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor, func, *args)
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pending -= 1
+            self.total_seconds += time.perf_counter() - started
+
+    async def hash_password(self, password: str) -> str:
+        """Hash a password in the pool"""
+        return await self.run(hash_password, password)
+
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password against its hash in the pool"""
+        return await self.run(verify_password, plain_password, hashed_password)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the pool metrics"""
+        return {
+            "executor": self.executor_type,
+            "workers": self.max_workers,
+            "queueLimit": self.max_queue,
+            "inFlight": self.in_flight,
+            "queueDepth": self.queue_depth,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "totalSeconds": round(self.total_seconds, 6),
+        }
+
+
+@lru_cache()
+def get_password_pool() -> PasswordHashingPool:
+    """Singleton factory function for PasswordHashingPool"""
+    return PasswordHashingPool()
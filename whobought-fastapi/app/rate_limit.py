@@ -0,0 +1,176 @@
+import math
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from .cache import LRUCache
+
+# Enforce the auth endpoint rate limits
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+# Default limits as "<attempts>/<seconds>", overridable per route with
+# RATE_LIMIT_<ROUTE>_PER_IP and RATE_LIMIT_<ROUTE>_PER_USER, "0" for no limit
+RATE_LIMIT_PER_IP = os.environ.get("RATE_LIMIT_PER_IP", "30/60")
+RATE_LIMIT_PER_USER = os.environ.get("RATE_LIMIT_PER_USER", "10/60")
+
+# Buckets kept per limiter; the least recently used are forgotten beyond this
+RATE_LIMIT_MAX_BUCKETS = int(os.environ.get("RATE_LIMIT_MAX_BUCKETS", "10000"))
+
+# Proxies in front of the app that append the address they saw to X-Forwarded-For
+# (1 for the App Service front end), 0 to ignore the header and use the peer address
+TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", "1"))
+
+
+def parse_limit(spec: str) -> Tuple[float, float]:
+    """
+    Parse "<attempts>/<seconds>" into a bucket capacity and refill rate
+
+    Args:
+        spec: Limit such as "10/60" (a burst of 10, refilled at 10 per minute), or "0"
+
+    Returns:
+        (capacity, tokens added per second); a capacity of 0 means no limit
+    """
+    attempts, _, seconds = spec.strip().partition("/")
+    capacity = float(attempts)
+    period = float(seconds) if seconds else 1.0
+    if capacity <= 0 or period <= 0:
+        return 0.0, 0.0
+    return capacity, capacity / period
+
+
+class TokenBucketLimiter:
+    """Token buckets per key (client IP or username), bounded by an LRU of buckets"""
+
+    def __init__(self, name: str, capacity: float, refill_per_second: float, max_buckets: int):
+        self.name = name
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.enabled = capacity > 0 and refill_per_second > 0 and max_buckets > 0
+        # key -> [tokens, monotonic time of the last refill]
+        self._buckets = LRUCache(max_buckets)
+
+        # Metrics
+        self.allowed = 0
+        self.rejected = 0
+
+    def acquire(self, key: str) -> float:
+        """
+        Take one token from the key's bucket
+
+        Returns:
+            0 if the attempt is allowed, otherwise the seconds until a token is available
+        """
+        if not self.enabled:
+            return 0.0
+
+        now = time.monotonic()
+        bucket = self._buckets.lookup(key)
+        if bucket is None:
+            bucket = [self.capacity, now]
+            self._buckets.store(key, bucket)
+        else:
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_per_second)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.allowed += 1
+            return 0.0
+        self.rejected += 1
+        return (1 - bucket[0]) / self.refill_per_second
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the limiter metrics"""
+        return {
+            "enabled": self.enabled,
+            "capacity": self.capacity,
+            "refillPerSecond": round(self.refill_per_second, 4),
+            "buckets": len(self._buckets),
+            "maxBuckets": self._buckets.max_entries,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "evictions": self._buckets.evictions,
+        }
+
+
+def _strip_port(address: str) -> str:
+    """Drop the port App Service appends ("203.0.113.5:51234", "[2001:db8::1]:51234")"""
+    if address.startswith("["):
+        return address[1:].partition("]")[0]
+    if address.count(":") == 1:
+        return address.partition(":")[0]
+    return address
+
+
+def client_ip(forwarded_for: Optional[str], peer: Optional[str], trusted_hops: int = TRUSTED_PROXY_HOPS) -> Optional[str]:
+    """
+    Client address for the per-IP limits
+
+    Each trusted proxy appends the address it received the request from, so
+    the entry trusted_hops from the right was written by the outermost trusted
+    proxy. Entries to its left come from the client and are ignored, as anyone
+    can send them. A header too short to hold the trusted entries means the
+    request did not come through the proxies, so the peer address is used.
+
+    Args:
+        forwarded_for: X-Forwarded-For header value, or None
+        peer: Address of the connecting peer, or None if unknown
+        trusted_hops: Number of trusted proxies in front of the app
+
+    Returns:
+        The client address, or None if unknown
+    """
+    if trusted_hops <= 0 or not forwarded_for:
+        return peer
+    entries = [entry.strip() for entry in forwarded_for.split(",")]
+    if len(entries) < trusted_hops or not entries[-trusted_hops]:
+        return peer
+    return _strip_port(entries[-trusted_hops])
+
+
+_limiters: Dict[str, TokenBucketLimiter] = {}
+
+
+def get_rate_limiter(route: str, kind: str) -> TokenBucketLimiter:
+    """Get the shared limiter for a route ("login", "token", "register") and kind ("ip" or "user")"""
+    name = f"{route}:{kind}"
+    limiter = _limiters.get(name)
+    if limiter is None:
+        default = RATE_LIMIT_PER_IP if kind == "ip" else RATE_LIMIT_PER_USER
+        spec = os.environ.get(f"RATE_LIMIT_{route.upper()}_PER_{kind.upper()}", default)
+        capacity, refill_per_second = parse_limit(spec)
+        limiter = TokenBucketLimiter(name, capacity, refill_per_second, RATE_LIMIT_MAX_BUCKETS)
+        limiter.enabled = limiter.enabled and RATE_LIMIT_ENABLED
+        _limiters[name] = limiter
+    return limiter
+
+
+def check_rate_limit(route: str, client_ip: Optional[str], username: Optional[str]) -> Optional[int]:
+    """
+    Admit an attempt on an auth route against its per-IP and per-user limits
+
+    The IP bucket is checked first, so attempts refused for the IP do not use
+    up the user's allowance.
+
+    Args:
+        route: Route name used for the limits ("login", "token", "register")
+        client_ip: Client address, or None if unknown
+        username: Username the attempt is for, or None
+
+    Returns:
+        None if the attempt is allowed, otherwise the Retry-After seconds
+    """
+    checks = (("ip", client_ip), ("user", username.strip().lower() if username else None))
+    for kind, key in checks:
+        if not key:
+            continue
+        wait = get_rate_limiter(route, kind).acquire(key)
+        if wait > 0:
+            return max(1, math.ceil(wait))
+    return None
+
+
+def rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    """Metrics for every limiter, keyed by route and kind (e.g. "login:ip")"""
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
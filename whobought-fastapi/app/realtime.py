@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import os
+from functools import lru_cache
+from typing import Any, Dict, Optional, Set
+
+from .responses import encode_json
+
+logger = logging.getLogger(__name__)
+
+# Messages buffered per connection before a slow client is disconnected
+REALTIME_SEND_QUEUE_SIZE = int(os.environ.get("REALTIME_SEND_QUEUE_SIZE", "100"))
+
+# WebSocket close code for clients that could not keep up ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# Cosmos system properties that clients have no use for
+_SYSTEM_FIELDS = {"_rid", "_self", "_attachments", "_ts", "_lsn"}
+
+
+class ClientConnection:
+    """A WebSocket subscriber with a bounded outgoing message queue"""
+
+    def __init__(self, websocket, max_queue: int = REALTIME_SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(maxsize=max_queue)
+        self.groups: Set[str] = set()
+        self.overflowed = False
+
+    def offer(self, message: str) -> bool:
+        """Queue a message without waiting; False if the queue is full"""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def send_loop(self):
+        """Write queued messages to the socket until stopped"""
+        while True:
+            message = await self.queue.get()
+            if message is None:
+                return
+            await self.websocket.send_text(message)
+
+    async def close_slow(self):
+        """Disconnect a client whose queue overflowed"""
+        try:
+            await self.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception as e:
+            logger.debug(f"Error closing slow WebSocket client: {str(e)}")
+
+
+class ConnectionHub:
+    """Fans out group events to subscribed WebSocket connections"""
+
+    def __init__(self):
+        self.channels: Dict[str, Set[ClientConnection]] = {}
+        self.connections: Set[ClientConnection] = set()
+
+        # Metrics
+        self.published = 0
+        self.delivered = 0
+        self.disconnected_slow = 0
+
+    def add(self, connection: ClientConnection):
+        """Register a new connection"""
+        self.connections.add(connection)
+
+    def remove(self, connection: ClientConnection):
+        """Forget a connection and all of its subscriptions"""
+        for group_id in list(connection.groups):
+            self.unsubscribe(connection, group_id)
+        self.connections.discard(connection)
+
+    def subscribe(self, connection: ClientConnection, group_id: str):
+        """Subscribe a connection to a group's channel"""
+        self.channels.setdefault(group_id, set()).add(connection)
+        connection.groups.add(group_id)
+
+    def unsubscribe(self, connection: ClientConnection, group_id: str):
+        """Unsubscribe a connection from a group's channel"""
+        subscribers = self.channels.get(group_id)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self.channels[group_id]
+        connection.groups.discard(group_id)
+
+    def publish(self, group_id: str, event_type: str, payload: Any):
+        """
+        Send an event to every subscriber of a group
+
+        The message is encoded once and queued on each connection without
+        waiting. A subscriber whose queue is full is disconnected so one slow
+        client cannot hold back the others or grow memory without bound.
+
+        Args:
+            group_id: Group channel to publish to
+            event_type: Event name, e.g. EXPENSE_ADDED
+            payload: JSON-serialisable event payload
+        """
+        subscribers = self.channels.get(group_id)
+        if not subscribers:
+            return
+
+        message = encode_json({"type": event_type, "payload": payload}).decode()
+        self.published += 1
+        for connection in list(subscribers):
+            if connection.offer(message):
+                self.delivered += 1
+            elif not connection.overflowed:
+                connection.overflowed = True
+                self.disconnected_slow += 1
+                logger.warning(f"Disconnecting slow WebSocket client subscribed to group {group_id}")
+                self.remove(connection)
+                asyncio.ensure_future(connection.close_slow())
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the hub metrics"""
+        return {
+            "connections": len(self.connections),
+            "channels": len(self.channels),
+            "published": self.published,
+            "delivered": self.delivered,
+            "disconnectedSlow": self.disconnected_slow,
+        }
+
+
+@lru_cache()
+def get_connection_hub() -> ConnectionHub:
+    """Singleton factory function for ConnectionHub"""
+    return ConnectionHub()
+
+
+def _client_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop Cosmos system properties from a document sent to clients"""
+    return {key: value for key, value in document.items() if key not in _SYSTEM_FIELDS}
+
+
+def _change_kind(document: Dict[str, Any]) -> str:
+    """ADDED for a document that has never been updated, otherwise UPDATED"""
+    updated_at = document.get("updatedAt")
+    return "ADDED" if updated_at is None or updated_at == document.get("createdAt") else "UPDATED"
+
+
+async def publish_item_change(document: Dict[str, Any]):
+    """Change feed handler for the items container"""
+    group_id = document.get("groupId")
+    if group_id:
+        get_connection_hub().publish(group_id, f"EXPENSE_{_change_kind(document)}", _client_document(document))
+
+
+async def publish_payment_change(document: Dict[str, Any]):
+    """Change feed handler for the payments container"""
+    group_id = document.get("group_id")
+    if group_id:
+        get_connection_hub().publish(group_id, f"PAYMENT_{_change_kind(document)}", _client_document(document))
+
+
+def publish_item_deleted(item: Dict[str, Any]):
+    """
+    Announce a deleted item to this worker's clients
+
+    The change feed does not report deletes, so this is best effort: clients
+    connected to other workers or instances are not told (see README).
+    """
+    group_id = item.get("groupId")
+    if group_id:
+        get_connection_hub().publish(group_id, "EXPENSE_DELETED", item["id"])
+
+
+def publish_payment_deleted(payment: Dict[str, Any]):
+    """Announce a deleted payment to this worker's clients; best effort, like publish_item_deleted"""
+    group_id = payment.get("group_id")
+    if group_id:
+        get_connection_hub().publish(group_id, "PAYMENT_DELETED", payment["id"])
@@ -1,95 +1,71 @@
-from azure.cosmos import CosmosClient, exceptions
-import os
+from azure.cosmos import exceptions
 import logging
 from datetime import datetime
 import uuid
-from functools import lru_cache
-from typing import Optional, Dict, Any, List, Type, TypeVar, Generic, Callable
+from typing import Optional, Dict, Any, List, Tuple, Type, TypeVar, Generic, Callable
+
+from ..cache import DocumentCache, get_document_cache
+from ..database import query_page, patch_operations, match_options
+from ..singleflight import SingleFlight, get_single_flight, query_key
+from .query_builder import QueryBuilder
 
 
 T = TypeVar('T')
 logger = logging.getLogger(__name__)
 
 
-class CosmosDBManager:
-    """Singleton manager for Cosmos DB connections"""
-    _instance = None
-    
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(CosmosDBManager, cls).__new__(cls)
-            cls._instance._initialized = False
-        return cls._instance
-    
-    def __init__(self):
-        if self._initialized:
-            return
-            
-        # Load environment variables directly from Azure App Service settings
-        self.connection_string = os.environ.get("COSMOS_CONNECTION_STRING")
-        self.database_name = os.environ.get("COSMOS_DATABASE_NAME", "whobought")
-        self.items_container_name = os.environ.get("COSMOS_CONTAINER_NAME", "items")
-        self.users_container_name = os.environ.get("COSMOS_USER_CONTAINER_NAME", "users")
-        
-        # Initialize connections to None
-        self.client = None
-        self.database = None
-        self.items_container = None
-        self.users_container = None
-        
-        # Initialize connection at startup if environment variables are set
-        if self.connection_string:
-            try:
-                self._initialize_connection()
-            except Exception as e:
-                logger.error(f"Failed to connect to Cosmos DB: {str(e)}")
-                
-        self._initialized = True
-        
-    def _initialize_connection(self):
-        """Initialize connection to Cosmos DB"""
-        if not self.client:
-            logger.info("Initializing Cosmos DB connection...")
-            self.client = CosmosClient.from_connection_string(self.connection_string)
-            self.database = self.client.get_database_client(self.database_name)
-            self.items_container = self.database.get_container_client(self.items_container_name)
-            self.users_container = self.database.get_container_client(self.users_container_name)
-            logger.info(f"Successfully connected to Cosmos DB database '{self.database_name}'")
-    
-    def get_items_container(self):
-        """Get the items container client"""
-        if not self.items_container:
-            self._initialize_connection()
-        return self.items_container
-    
-    def get_users_container(self):
-        """Get the users container client"""
-        if not self.users_container:
-            self._initialize_connection()
-        return self.users_container
-
-
-@lru_cache()
-def get_cosmos_manager():
-    """Singleton factory function for CosmosDBManager"""
-    return CosmosDBManager()
-
-
 class BaseCosmosRepository(Generic[T]):
     """Base repository for Cosmos DB operations"""
     
-    def __init__(self, container_getter: Callable):
+    def __init__(self, container_getter: Callable, partition_key_path: str = "/id"):
         self.container_getter = container_getter
+        self.partition_key_path = partition_key_path
+    
+    def cache_for(self, container) -> DocumentCache:
+        """Get the document cache for this repository's container"""
+        return get_document_cache(container.id)
+    
+    def single_flight_for(self, container) -> SingleFlight:
+        """Get the group that coalesces concurrent identical reads of this repository's container"""
+        return get_single_flight(container.id)
+    
+    def query_builder(self) -> QueryBuilder:
+        """Create a query builder for this repository's container"""
+        return QueryBuilder(partition_key_path=self.partition_key_path)
     
     async def get_all(self, query: str = "SELECT * FROM c") -> List[Dict[str, Any]]:
         """Get all documents"""
         try:
             container = self.container_getter()
-            items = list(container.query_items(
-                query=query,
-                enable_cross_partition_query=True
-            ))
-            return items
+            
+            async def read_all():
+                return [item async for item in container.query_items(
+                    query=query
+                )]
+            
+            return await self.single_flight_for(container).do(query_key("all", query), read_all)
+        except exceptions.CosmosHttpResponseError as e:
+            logger.error(f"Cosmos DB error: {str(e)}")
+            raise e
+    
+    async def get_page(
+        self,
+        limit: int,
+        continuation_token: Optional[str] = None,
+        query: str = "SELECT * FROM c"
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Get one page of documents and the continuation token for the next page"""
+        try:
+            container = self.container_getter()
+            return await self.single_flight_for(container).do(
+                query_key("page", query, None, limit, continuation_token),
+                lambda: query_page(
+                    container,
+                    query=query,
+                    limit=limit,
+                    continuation_token=continuation_token
+                )
+            )
         except exceptions.CosmosHttpResponseError as e:
             logger.error(f"Cosmos DB error: {str(e)}")
             raise e
@@ -98,7 +74,17 @@ class BaseCosmosRepository(Generic[T]):
         """Get document by ID"""
         try:
             container = self.container_getter()
-            item = container.read_item(item=item_id, partition_key=item_id)
+            cache = self.cache_for(container)
+            cached_item = cache.get(item_id)
+            if cached_item is not None:
+                return cached_item
+            
+            generation = cache.generation
+            item = await self.single_flight_for(container).do(
+                ("id", item_id),
+                lambda: container.read_item(item=item_id, partition_key=item_id)
+            )
+            cache.set(item_id, item, generation)
             return item
         except exceptions.CosmosResourceNotFoundError:
             return None
@@ -123,21 +109,26 @@ class BaseCosmosRepository(Generic[T]):
             if "updatedAt" in item_dict:
                 item_dict["updatedAt"] = now.isoformat()
             
-            created_item = container.create_item(body=item_dict)
+            created_item = await container.create_item(body=item_dict)
+            self.cache_for(container).set(created_item["id"], created_item)
             return created_item
         except exceptions.CosmosHttpResponseError as e:
             logger.error(f"Cosmos DB error: {str(e)}")
             raise e
     
-    async def update(self, item_id: str, item_dict: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Update an existing document"""
+    async def update(
+        self,
+        item_id: str,
+        item_dict: Dict[str, Any],
+        etag: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Update an existing document, optionally only if the etag still matches"""
         try:
             container = self.container_getter()
             
-            # Read existing item first
-            try:
-                existing_item = container.read_item(item=item_id, partition_key=item_id)
-            except exceptions.CosmosResourceNotFoundError:
+            # Read existing item first (served from the cache when possible)
+            existing_item = await self.get_by_id(item_id)
+            if existing_item is None:
                 return None
             
             # Preserve the id and createdAt
@@ -149,35 +140,88 @@ class BaseCosmosRepository(Generic[T]):
             if "updatedAt" in existing_item or "updatedAt" in item_dict:
                 item_dict["updatedAt"] = datetime.utcnow().isoformat()
             
-            updated_item = container.replace_item(item=item_id, body=item_dict)
+            cache = self.cache_for(container)
+            cache.invalidate(item_id)
+            updated_item = await container.replace_item(item=item_id, body=item_dict, **match_options(etag))
+            cache.set(item_id, updated_item)
             return updated_item
         except exceptions.CosmosResourceNotFoundError:
             return None
+        except exceptions.CosmosAccessConditionFailedError:
+            raise
+        except exceptions.CosmosHttpResponseError as e:
+            logger.error(f"Cosmos DB error: {str(e)}")
+            raise e
+    
+    async def patch(
+        self,
+        item_id: str,
+        changes: Dict[str, Any],
+        etag: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Apply a partial update with Cosmos patch operations in a single round trip"""
+        try:
+            container = self.container_getter()
+            cache = self.cache_for(container)
+            cache.invalidate(item_id)
+            patched_item = await container.patch_item(
+                item=item_id,
+                partition_key=item_id,
+                patch_operations=patch_operations(changes),
+                **match_options(etag)
+            )
+            cache.set(item_id, patched_item)
+            return patched_item
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+        except exceptions.CosmosAccessConditionFailedError:
+            raise
         except exceptions.CosmosHttpResponseError as e:
             logger.error(f"Cosmos DB error: {str(e)}")
             raise e
     
-    async def delete(self, item_id: str) -> bool:
-        """Delete a document"""
+    async def delete(self, item_id: str, etag: Optional[str] = None) -> bool:
+        """Delete a document, optionally only if the etag still matches"""
         try:
             container = self.container_getter()
-            container.delete_item(item=item_id, partition_key=item_id)
+            self.cache_for(container).invalidate(item_id)
+            await container.delete_item(item=item_id, partition_key=item_id, **match_options(etag))
             return True
         except exceptions.CosmosResourceNotFoundError:
             return False
+        except exceptions.CosmosAccessConditionFailedError:
+            raise
         except exceptions.CosmosHttpResponseError as e:
             logger.error(f"Cosmos DB error: {str(e)}")
             raise e
     
-    async def query(self, query: str) -> List[Dict[str, Any]]:
+    async def query(
+        self,
+        query: str,
+        parameters: Optional[List[Dict[str, Any]]] = None,
+        partition_key: Optional[Any] = None
+    ) -> List[Dict[str, Any]]:
         """Run a custom query"""
         try:
             container = self.container_getter()
-            items = list(container.query_items(
-                query=query,
-                enable_cross_partition_query=True
-            ))
-            return items
+            options = {"partition_key": partition_key} if partition_key is not None else {}
+            
+            async def read_all():
+                return [item async for item in container.query_items(
+                    query=query,
+                    parameters=parameters,
+                    **options
+                )]
+            
+            return await self.single_flight_for(container).do(
+                query_key("query", query, parameters, partition_key),
+                read_all
+            )
         except exceptions.CosmosHttpResponseError as e:
             logger.error(f"Cosmos DB error: {str(e)}")
-            raise e 
\ No newline at end of file
+            raise e 
+    
+    async def find(self, builder: QueryBuilder) -> List[Dict[str, Any]]:
+        """Run a query composed with a QueryBuilder"""
+        query, parameters, partition_key = builder.build()
+        return await self.query(query, parameters=parameters, partition_key=partition_key)
@@ -1,5 +1,5 @@
 from typing import TypeVar, Generic, Dict, Any, List, Optional, Callable, Type
-from .cosmosdb_repository import BaseCosmosRepository, get_cosmos_manager
+from .cosmosdb_repository import BaseCosmosRepository
 
 T = TypeVar('T')
 
@@ -12,20 +12,17 @@ class GenericRepository(BaseCosmosRepository[T]):
     
     async def find_by_field(self, field_name: str, value: Any) -> List[Dict[str, Any]]:
         """Generic method to find items by a specific field value"""
-        query = f"SELECT * FROM c WHERE c.{field_name} = '{value}'"
-        return await self.query(query)
+        return await self.find(self.query_builder().where(field_name, value))
     
     async def find_one_by_field(self, field_name: str, value: Any) -> Optional[Dict[str, Any]]:
         """Generic method to find one item by a specific field value"""
-        results = await self.find_by_field(field_name, value)
+        results = await self.find(self.query_builder().where(field_name, value).limit(1))
         return results[0] if results else None
     
     async def find_by_contains_field(self, field_name: str, value: Any) -> List[Dict[str, Any]]:
         """Generic method to find items by a field containing a value (case insensitive)"""
-        query = f"SELECT * FROM c WHERE CONTAINS(LOWER(c.{field_name}), LOWER('{value}'))"
-        return await self.query(query)
+        return await self.find(self.query_builder().contains(field_name, value))
     
     async def find_by_array_contains(self, array_field: str, value: Any) -> List[Dict[str, Any]]:
         """Generic method to find items where an array field contains a value"""
-        query = f"SELECT * FROM c WHERE ARRAY_CONTAINS(c.{array_field}, '{value}')"
-        return await self.query(query) 
\ No newline at end of file
+        return await self.find(self.query_builder().array_contains(array_field, value)) 
\ No newline at end of file
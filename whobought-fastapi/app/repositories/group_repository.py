@@ -1,6 +1,6 @@
 from typing import List, Dict, Any, Optional
 from .generic_repository import GenericRepository
-from .cosmosdb_repository import get_cosmos_manager
+from ..database import get_cosmos_manager
 from ..models.entities.group import Group
 
 
@@ -15,13 +15,11 @@ class GroupRepository(GenericRepository[Group]):
     
     async def find_by_user_id(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all groups a user belongs to"""
-        query = f"SELECT * FROM c WHERE ARRAY_CONTAINS(c.member_ids, '{user_id}')"
-        return await self.query(query)
+        return await self.find_by_array_contains("member_ids", user_id)
     
     async def find_by_name(self, name: str) -> List[Dict[str, Any]]:
         """Find groups by partial name match (case insensitive)"""
-        query = f"SELECT * FROM c WHERE CONTAINS(LOWER(c.name), LOWER('{name}'))"
-        return await self.query(query)
+        return await self.find_by_contains_field("name", name)
 
 
 def get_group_repository() -> GroupRepository:
@@ -1,6 +1,6 @@
 from typing import List, Optional, Dict, Any
 from .generic_repository import GenericRepository
-from .cosmosdb_repository import get_cosmos_manager
+from ..database import get_cosmos_manager
 from ..models.entities.item import Item
 
 
@@ -15,8 +15,7 @@ class ItemRepository(GenericRepository[Item]):
     
     async def find_by_user_id(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all items created by a specific user"""
-        query = f"SELECT * FROM c WHERE c.purchasedBy = '{user_id}'"
-        return await self.query(query)
+        return await self.find_by_field("purchasedBy", user_id)
     
     async def find_paid_for_user(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all items where a specific user is marked as 'paidFor'"""
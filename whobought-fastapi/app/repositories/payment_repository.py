@@ -1,7 +1,10 @@
 from typing import List, Dict, Any, Optional
+from azure.cosmos import exceptions
 from .generic_repository import GenericRepository
-from .cosmosdb_repository import get_cosmos_manager
+from ..database import get_cosmos_manager
+from ..database import BALANCE_UPDATE_RETRIES, BalancesDB
 from ..models.entities.payment import Payment
+from ..realtime import publish_payment_deleted
 
 
 class PaymentRepository(GenericRepository[Payment]):
@@ -13,6 +16,80 @@ class PaymentRepository(GenericRepository[Payment]):
             entity_type=Payment
         )
     
+    async def create(self, item_dict: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a payment and add it to its group's balances"""
+        created_payment = await super().create(item_dict)
+        await BalancesDB.apply_payment_change(None, created_payment)
+        return created_payment
+    
+    async def update(self, item_id: str, item_dict: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update a payment and move its effect on group balances"""
+        # Replace only the version that was read, so the balance delta is exact
+        for attempt in range(BALANCE_UPDATE_RETRIES):
+            existing_payment = await self._read_fresh(item_id)
+            if existing_payment is None:
+                return None
+            
+            try:
+                updated_payment = await super().update(item_id, item_dict, etag=existing_payment.get("_etag"))
+            except exceptions.CosmosAccessConditionFailedError:
+                if attempt == BALANCE_UPDATE_RETRIES - 1:
+                    raise
+                continue
+            
+            if updated_payment:
+                await BalancesDB.apply_payment_change(existing_payment, updated_payment)
+            return updated_payment
+    
+    async def patch(
+        self,
+        item_id: str,
+        changes: Dict[str, Any],
+        etag: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Patch a payment and move its effect on group balances"""
+        for attempt in range(BALANCE_UPDATE_RETRIES):
+            existing_payment = await self._read_fresh(item_id)
+            if existing_payment is None:
+                return None
+            
+            try:
+                patched_payment = await super().patch(item_id, changes, etag=etag or existing_payment.get("_etag"))
+            except exceptions.CosmosAccessConditionFailedError:
+                if etag or attempt == BALANCE_UPDATE_RETRIES - 1:
+                    raise
+                continue
+            
+            if patched_payment:
+                await BalancesDB.apply_payment_change(existing_payment, patched_payment)
+            return patched_payment
+    
+    async def delete(self, item_id: str) -> bool:
+        """Delete a payment and remove it from its group's balances"""
+        # Delete only the version that was read, so its effect can be removed exactly
+        for attempt in range(BALANCE_UPDATE_RETRIES):
+            existing_payment = await self._read_fresh(item_id)
+            if existing_payment is None:
+                return False
+            
+            try:
+                deleted = await super().delete(item_id, etag=existing_payment.get("_etag"))
+            except exceptions.CosmosAccessConditionFailedError:
+                if attempt == BALANCE_UPDATE_RETRIES - 1:
+                    raise
+                continue
+            
+            if deleted:
+                await BalancesDB.apply_payment_change(existing_payment, None)
+                publish_payment_deleted(existing_payment)
+            return deleted
+    
+    async def _read_fresh(self, item_id: str) -> Optional[Dict[str, Any]]:
+        """Read the current payment, bypassing the document cache"""
+        container = self.container_getter()
+        self.cache_for(container).invalidate(item_id)
+        return await self.get_by_id(item_id)
+    
     async def find_by_group_id(self, group_id: str) -> List[Dict[str, Any]]:
         """Get all payments for a group"""
         return await self.find_by_field("group_id", group_id)
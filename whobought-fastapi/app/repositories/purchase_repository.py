@@ -1,6 +1,6 @@
 from typing import List, Optional, Dict, Any
 from .generic_repository import GenericRepository
-from .cosmosdb_repository import get_cosmos_manager
+from ..database import get_cosmos_manager
 from ..models.entities.purchase import Purchase
 
 
@@ -23,13 +23,12 @@ class PurchaseRepository(GenericRepository[Purchase]):
     
     async def find_by_group_and_timeframe(self, group_id: str, start_date: str, end_date: str) -> List[Dict[str, Any]]:
         """Find purchases in a group within a specific timeframe"""
-        query = f"""
-        SELECT * FROM c 
-        WHERE c.group_id = '{group_id}' 
-        AND c.purchase_date >= '{start_date}' 
-        AND c.purchase_date <= '{end_date}'
-        """
-        return await self.query(query)
+        return await self.find(
+            self.query_builder()
+            .where("group_id", group_id)
+            .where("purchase_date", start_date, op=">=")
+            .where("purchase_date", end_date, op="<=")
+        )
 
 
 def get_purchase_repository() -> PurchaseRepository:
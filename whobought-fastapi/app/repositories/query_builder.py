@@ -0,0 +1,177 @@
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Number of distinct query shapes kept compiled
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "256"))
+
+_FIELD_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+_COMPARISON_OPERATORS = {"=", "!=", "<", "<=", ">", ">="}
+
+# Filter kinds and the SQL template each one compiles to
+_FILTER_TEMPLATES = {
+    "compare": "c.{field} {op} {param}",
+    "contains": "CONTAINS(LOWER(c.{field}), LOWER({param}))",
+    "array_contains": "ARRAY_CONTAINS(c.{field}, {param})",
+    "starts_with": "STARTSWITH(c.{field}, {param})",
+}
+
+
+def _check_field(field: str) -> str:
+    """Reject field names that are not plain (optionally dotted) identifiers"""
+    if not _FIELD_PATTERN.match(field):
+        raise ValueError(f"Invalid field name: {field!r}")
+    return field
+
+
+class CompiledQuery:
+    """Parameterized query text for one query shape plus execution metadata"""
+
+    __slots__ = ("text", "parameter_names", "partition_key_parameter")
+
+    def __init__(self, text: str, parameter_names: Tuple[str, ...], partition_key_parameter: Optional[str]):
+        self.text = text
+        self.parameter_names = parameter_names
+        # Parameter whose value pins the query to a single partition, if any
+        self.partition_key_parameter = partition_key_parameter
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def compile_query(
+    projection: Tuple[str, ...],
+    filters: Tuple[Tuple[str, str, str], ...],
+    order: Tuple[Tuple[str, bool], ...],
+    has_limit: bool,
+    partition_key_field: str
+) -> CompiledQuery:
+    """
+    Compile a query shape into parameterized Cosmos SQL
+
+    Args:
+        projection: Fields to select, empty for SELECT *
+        filters: (kind, field, operator) tuples combined with AND
+        order: (field, descending) tuples
+        has_limit: Whether the query takes a TOP parameter
+        partition_key_field: Field the container is partitioned on
+
+    Returns:
+        CompiledQuery for the shape
+    """
+    parameter_names: List[str] = []
+    partition_key_parameter = None
+
+    select = "SELECT "
+    if has_limit:
+        select += "TOP @limit "
+    if projection:
+        select += ", ".join(f"c.{_check_field(field)}" for field in projection)
+    else:
+        select += "*"
+
+    clauses = []
+    for index, (kind, field, op) in enumerate(filters):
+        param = f"@p{index}"
+        parameter_names.append(param)
+        clauses.append(_FILTER_TEMPLATES[kind].format(field=_check_field(field), op=op, param=param))
+        if kind == "compare" and op == "=" and field == partition_key_field and partition_key_parameter is None:
+            partition_key_parameter = param
+
+    text = f"{select} FROM c"
+    if clauses:
+        text += " WHERE " + " AND ".join(clauses)
+    if order:
+        text += " ORDER BY " + ", ".join(
+            f"c.{_check_field(field)} {'DESC' if descending else 'ASC'}" for field, descending in order
+        )
+    if has_limit:
+        parameter_names.append("@limit")
+
+    return CompiledQuery(text, tuple(parameter_names), partition_key_parameter)
+
+
+class QueryBuilder:
+    """Composable builder for parameterized Cosmos DB queries"""
+
+    def __init__(self, partition_key_path: str = "/id"):
+        self._partition_key_field = partition_key_path.lstrip("/").replace("/", ".")
+        self._projection: Tuple[str, ...] = ()
+        self._filters: List[Tuple[str, str, str]] = []
+        self._values: List[Any] = []
+        self._order: List[Tuple[str, bool]] = []
+        self._limit: Optional[int] = None
+
+    def select(self, *fields: str) -> "QueryBuilder":
+        """Project only the given fields"""
+        self._projection = tuple(fields)
+        return self
+
+    def where(self, field: str, value: Any, op: str = "=") -> "QueryBuilder":
+        """Filter on a comparison between a field and a value"""
+        if op not in _COMPARISON_OPERATORS:
+            raise ValueError(f"Unsupported operator: {op!r}")
+        self._filters.append(("compare", field, op))
+        self._values.append(value)
+        return self
+
+    def contains(self, field: str, value: str) -> "QueryBuilder":
+        """Filter on a string field containing a value (case insensitive)"""
+        self._filters.append(("contains", field, ""))
+        self._values.append(value)
+        return self
+
+    def array_contains(self, field: str, value: Any) -> "QueryBuilder":
+        """Filter on an array field containing a value"""
+        self._filters.append(("array_contains", field, ""))
+        self._values.append(value)
+        return self
+
+    def starts_with(self, field: str, value: str) -> "QueryBuilder":
+        """Filter on a string field starting with a value"""
+        self._filters.append(("starts_with", field, ""))
+        self._values.append(value)
+        return self
+
+    def order_by(self, field: str, descending: bool = False) -> "QueryBuilder":
+        """Order results by a field"""
+        self._order.append((field, descending))
+        return self
+
+    def limit(self, count: int) -> "QueryBuilder":
+        """Return at most count results"""
+        self._limit = count
+        return self
+
+    def compile(self) -> CompiledQuery:
+        """Get the (cached) compiled query for this builder's shape"""
+        return compile_query(
+            self._projection,
+            tuple(self._filters),
+            tuple(self._order),
+            self._limit is not None,
+            self._partition_key_field
+        )
+
+    def build(self) -> Tuple[str, List[Dict[str, Any]], Optional[Any]]:
+        """
+        Build the query
+
+        Returns:
+            Tuple of query text, Cosmos parameter list, and the partition key
+            value if the filters pin the query to a single partition
+        """
+        compiled = self.compile()
+        values = list(self._values)
+        if self._limit is not None:
+            values.append(self._limit)
+
+        parameters = [
+            {"name": name, "value": value}
+            for name, value in zip(compiled.parameter_names, values)
+        ]
+
+        partition_key = None
+        if compiled.partition_key_parameter is not None:
+            partition_key = values[compiled.parameter_names.index(compiled.partition_key_parameter)]
+
+        return compiled.text, parameters, partition_key
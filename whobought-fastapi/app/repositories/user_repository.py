@@ -1,6 +1,7 @@
 from typing import Dict, Any, Optional, List
 from .generic_repository import GenericRepository
-from .cosmosdb_repository import get_cosmos_manager
+from ..database import get_cosmos_manager
+from ..database import UsersDB
 from ..models.entities.user import User
 
 
@@ -15,13 +16,11 @@ class UserRepository(GenericRepository[User]):
     
     async def find_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Get a user by their email address"""
-        query = f"SELECT * FROM c WHERE c.email = '{email}'"
-        result = await self.query(query)
-        return result[0] if result else None
+        return await UsersDB.get_user_by_email(email)
     
     async def find_by_username(self, username: str) -> Optional[Dict[str, Any]]:
         """Get user by username"""
-        return await self.find_one_by_field("username", username)
+        return await UsersDB.get_user_by_username(username)
 
 
 def get_user_repository() -> UserRepository:
@@ -1,15 +1,96 @@
 from fastapi import status
-from fastapi.responses import JSONResponse
-from typing import Any, Dict, List, Optional, Union
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
 from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+import logging
 
-from .models import ApiResponse, ResponseModel
+import orjson
+
+from .models import ResponseModel
+from .pagination import NDJSON_MEDIA_TYPE
+
+logger = logging.getLogger(__name__)
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _encode_default(value: Any) -> Any:
+    """Convert values orjson does not support natively"""
+    if isinstance(value, Decimal):
+        return float(value)
+    return jsonable_encoder(value)
+
+
+def encode_json(value: Any) -> bytes:
+    """
+    Encode a value as JSON with orjson.
+    
+    datetime, date, UUID, dataclasses and numpy values are encoded natively;
+    anything else (pydantic models, sets, ...) goes through jsonable_encoder.
+    
+    Args:
+        value: The value to encode
+        
+    Returns:
+        UTF-8 encoded JSON
+    """
+    return orjson.dumps(value, default=_encode_default, option=_ORJSON_OPTIONS)
+
+
+@lru_cache(maxsize=256)
+def _encode_message(message: str) -> bytes:
+    """Encode a response message; the same few messages are used everywhere"""
+    return orjson.dumps(message)
+
+
+def _envelope(
+    data: Any,
+    message: str,
+    success: bool,
+    status_code: int,
+    errors: Optional[List[str]] = None,
+    next_cursor: Optional[str] = None,
+    include_data: bool = True
+) -> bytes:
+    """
+    Encode the standard response envelope from pre-encoded fragments.
+    
+    Produces the same document as ApiResponse.dict(); only the data, errors
+    and cursor are encoded per response.
+    """
+    parts = [b'{"data":' + encode_json(data) + b"," if include_data else b"{"]
+    parts.append(b'"message":' + _encode_message(message))
+    parts.append(b',"success":true,"statusCode":' if success else b',"success":false,"statusCode":')
+    parts.append(str(status_code).encode())
+    parts.append(b',"errors":' + encode_json(errors) if errors else b',"errors":[]')
+    parts.append(b',"nextCursor":' + orjson.dumps(next_cursor) if next_cursor is not None else b',"nextCursor":null')
+    parts.append(b',"timestamp":' + orjson.dumps(datetime.utcnow()) + b"}")
+    return b"".join(parts)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; used as the application's default response class"""
+    
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
+
+
+class EnvelopeResponse(JSONResponse):
+    """JSON response whose body has already been encoded"""
+    
+    def render(self, content: bytes) -> bytes:
+        return content
 
 
 def success_response(
     data: Any = None,
     message: str = "Success",
-    status_code: int = status.HTTP_200_OK
+    status_code: int = status.HTTP_200_OK,
+    next_cursor: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None
 ) -> JSONResponse:
     """
     Create a standardized success response.
@@ -18,27 +99,77 @@ def success_response(
         data: The response data
         message: A success message
         status_code: HTTP status code
+        next_cursor: Cursor for the next page of a paginated list
+        headers: Optional extra response headers
         
     Returns:
         JSONResponse with standardized format
     """
-    response = ApiResponse(
-        data=data,
-        message=message,
-        success=True,
-        status_code=status_code
+    return EnvelopeResponse(
+        content=_envelope(data, message, True, status_code, next_cursor=next_cursor),
+        status_code=status_code,
+        headers=headers
     )
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """
+    Check whether an If-None-Match header matches a document's ETag.
+    
+    Args:
+        if_none_match: Value of the request's If-None-Match header
+        etag: Current ETag of the document
+        
+    Returns:
+        True if the client's copy is still current
+    """
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == current:
+            return True
+    return False
+
+
+def document_response(
+    document: Dict[str, Any],
+    if_none_match: Optional[str] = None,
+    message: str = "Success"
+) -> Response:
+    """
+    Create a success response for a single document with ETag support.
     
-    return JSONResponse(
-        content=response.dict(),
-        status_code=status_code
+    Args:
+        document: The Cosmos DB document, including its _etag
+        if_none_match: Value of the request's If-None-Match header
+        message: A success message
+        
+    Returns:
+        304 Not Modified if the client's copy is current, otherwise a
+        JSONResponse with standardized format and an ETag header
+    """
+    etag = document.get("_etag")
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    return success_response(
+        data=document,
+        message=message,
+        headers={"ETag": etag} if etag else None
     )
 
 
 def error_response(
     message: str = "An error occurred",
     status_code: int = status.HTTP_500_INTERNAL_SERVER_ERROR,
-    errors: Optional[List[str]] = None
+    errors: Optional[List[str]] = None,
+    headers: Optional[Dict[str, str]] = None
 ) -> JSONResponse:
     """
     Create a standardized error response.
@@ -47,21 +178,15 @@ def error_response(
         message: An error message
         status_code: HTTP status code
         errors: List of specific error messages
+        headers: Optional extra response headers
         
     Returns:
         JSONResponse with standardized format
     """
-    response = ApiResponse(
-        data=None,
-        message=message,
-        success=False,
+    return EnvelopeResponse(
+        content=_envelope(None, message, False, status_code, errors=errors),
         status_code=status_code,
-        errors=errors
-    )
-    
-    return JSONResponse(
-        content=response.dict(),
-        status_code=status_code
+        headers=headers
     )
 
 
@@ -122,4 +247,109 @@ def created_response(
         data=data,
         message=message,
         status_code=status.HTTP_201_CREATED
-    ) 
\ No newline at end of file
+    ) 
+
+
+def service_unavailable_response(
+    message: str = "Service temporarily unavailable",
+    retry_after: int = 1
+) -> JSONResponse:
+    """
+    Create a standardized 503 service unavailable response.
+    
+    Args:
+        message: Unavailable message
+        retry_after: Seconds the client should wait before retrying
+        
+    Returns:
+        JSONResponse with standardized format
+    """
+    return error_response(
+        message=message,
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(retry_after)}
+    )
+
+
+def too_many_requests_response(
+    message: str = "Too many requests",
+    retry_after: int = 1
+) -> JSONResponse:
+    """
+    Create a standardized 429 too many requests response.
+    
+    Args:
+        message: Rate limit message
+        retry_after: Seconds the client should wait before retrying
+        
+    Returns:
+        JSONResponse with standardized format
+    """
+    return error_response(
+        message=message,
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": str(retry_after)}
+    )
+
+
+async def _ndjson_lines(
+    pages: AsyncIterator[List[Dict[str, Any]]],
+    message: str
+) -> AsyncIterator[bytes]:
+    """Encode an envelope line, one line per document, and a trailer line"""
+    yield _envelope(None, message, True, status.HTTP_200_OK, include_data=False) + b"\n"
+    
+    count = 0
+    try:
+        async for page in pages:
+            count += len(page)
+            yield b"".join(encode_json(document) + b"\n" for document in page)
+    except Exception as e:
+        logger.error(f"Streaming response failed after {count} documents: {str(e)}")
+        yield encode_json({"count": count, "success": False, "errors": [str(e)]}) + b"\n"
+        return
+    
+    yield encode_json({"count": count, "success": True, "errors": []}) + b"\n"
+
+
+def ndjson_response(
+    pages: AsyncIterator[List[Dict[str, Any]]],
+    message: str = "Success"
+) -> StreamingResponse:
+    """
+    Create a streamed newline-delimited JSON response.
+    
+    The first line carries the standard envelope fields (without data), each
+    following line is one document, and the last line is a trailer with the
+    document count and whether the stream completed successfully.
+    
+    Args:
+        pages: Async iterator yielding pages of documents
+        message: A success message
+        
+    Returns:
+        StreamingResponse writing one page at a time
+    """
+    return StreamingResponse(
+        _ndjson_lines(pages, message),
+        media_type=NDJSON_MEDIA_TYPE
+    )
+
+
+
+def precondition_failed_response(
+    message: str = "Resource has been modified"
+) -> JSONResponse:
+    """
+    Create a standardized 412 precondition failed response.
+    
+    Args:
+        message: Precondition failure message
+        
+    Returns:
+        JSONResponse with standardized format
+    """
+    return error_response(
+        message=message,
+        status_code=status.HTTP_412_PRECONDITION_FAILED
+    )
@@ -1,4 +1,6 @@
 # Export routers
 from .items import router as items_router
 from .users import router as users_router
-from .auth import router as auth_router 
\ No newline at end of file
+from .auth import router as auth_router
+from .groups import router as groups_router
+from .realtime import router as realtime_router
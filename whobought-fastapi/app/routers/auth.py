@@ -1,11 +1,19 @@
 from fastapi import APIRouter, HTTPException, Depends, status, Body, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from ..models import UserCreate, Token, LoginRequest, User
 from ..database import UsersDB
 from ..auth import create_access_token, get_current_user
-from ..responses import success_response, error_response, created_response
+from ..password_pool import PasswordPoolSaturatedError
+from ..rate_limit import check_rate_limit, client_ip
+from ..responses import (
+    success_response,
+    error_response,
+    created_response,
+    service_unavailable_response,
+    too_many_requests_response
+)
 
 router = APIRouter(
     prefix="/api/auth",
@@ -13,9 +21,19 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+
+def _client_ip(request: Request) -> Optional[str]:
+    """Client address as seen by the trusted proxies (see TRUSTED_PROXY_HOPS)"""
+    return client_ip(request.headers.get("x-forwarded-for"), request.client.host if request.client else None)
+
+
 @router.post("/register")
 async def register(request: Request, user_data: UserCreate):
     """Register a new user"""
+    retry_after = check_rate_limit("register", _client_ip(request), user_data.username)
+    if retry_after is not None:
+        return too_many_requests_response(message="Too many registration attempts, try again later", retry_after=retry_after)
+    
     try:
         # Create user in database
         user_dict = user_data.dict()
@@ -52,13 +70,22 @@ async def register(request: Request, user_data: UserCreate):
             },
             message="User registered successfully"
         )
+    except PasswordPoolSaturatedError:
+        return service_unavailable_response(message="Too many authentication requests, try again shortly")
     except Exception as e:
         return error_response(message=f"Registration failed: {str(e)}")
 
 @router.post("/token")
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
     """OAuth2 compatible token login, get an access token for future requests"""
-    user = await UsersDB.authenticate_user(form_data.username, form_data.password)
+    retry_after = check_rate_limit("token", _client_ip(request), form_data.username)
+    if retry_after is not None:
+        return too_many_requests_response(message="Too many login attempts, try again later", retry_after=retry_after)
+    
+    try:
+        user = await UsersDB.authenticate_user(form_data.username, form_data.password)
+    except PasswordPoolSaturatedError:
+        return service_unavailable_response(message="Too many authentication requests, try again shortly")
     
     if not user:
         return error_response(
@@ -80,9 +107,16 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     )
 
 @router.post("/login")
-async def login(login_data: LoginRequest):
+async def login(request: Request, login_data: LoginRequest):
     """Login and get an access token"""
-    user = await UsersDB.authenticate_user(login_data.username, login_data.password)
+    retry_after = check_rate_limit("login", _client_ip(request), login_data.username)
+    if retry_after is not None:
+        return too_many_requests_response(message="Too many login attempts, try again later", retry_after=retry_after)
+    
+    try:
+        user = await UsersDB.authenticate_user(login_data.username, login_data.password)
+    except PasswordPoolSaturatedError:
+        return service_unavailable_response(message="Too many authentication requests, try again shortly")
     
     if not user:
         return error_response(
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends
+import numpy as np
+
+from ..balances import balance_summary
+from ..database import BalancesDB
+from ..dependencies import get_db
+from ..responses import success_response, error_response
+from ..settlement import settlement_payments
+
+router = APIRouter(
+    prefix="/api/groups",
+    tags=["groups"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get("/{group_id}/balances")
+async def get_group_balances(group_id: str, db=Depends(get_db)):
+    try:
+        document = await BalancesDB.get_or_rebuild_balances(group_id)
+    except Exception as e:
+        return error_response(message=f"Database error: {str(e)}")
+    
+    return success_response(data={"groupId": group_id, **balance_summary(document)})
+
+@router.get("/{group_id}/settlement-plan")
+async def get_settlement_plan(group_id: str, db=Depends(get_db)):
+    try:
+        document = await BalancesDB.get_or_rebuild_balances(group_id)
+    except Exception as e:
+        return error_response(message=f"Database error: {str(e)}")
+    
+    net = document.get("net", {})
+    members = np.array(list(net), dtype=object)
+    net_cents = np.fromiter(net.values(), dtype=np.int64, count=len(net))
+    transfers = settlement_payments(group_id, members, net_cents)
+    return success_response(data={"groupId": group_id, "transfers": transfers})
@@ -1,11 +1,19 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Body, Request
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, status, Body, Request, Query
+from typing import List, Optional, Dict, Any
 from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+import os
 
-from ..models import Item
+from azure.cosmos import exceptions
+
+from ..models import Item, ItemCreateDto, ItemUpdateDto
 from ..database import ItemsDB
 from ..dependencies import get_db
-from ..responses import success_response, error_response, not_found_response, created_response
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, STREAM_PAGE_SIZE, encode_cursor, decode_cursor, wants_stream
+from ..responses import success_response, error_response, not_found_response, created_response, bad_request_response, ndjson_response, document_response, precondition_failed_response
+
+# Largest number of items accepted by POST /api/items/batch
+ITEM_BATCH_MAX_SIZE = int(os.environ.get("ITEM_BATCH_MAX_SIZE", "100"))
 
 router = APIRouter(
     prefix="/api/items",
@@ -14,10 +22,27 @@ router = APIRouter(
 )
 
 @router.get("/")
-async def get_items(request: Request, db=Depends(get_db)):
+async def get_items(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db=Depends(get_db)
+):
     try:
-        items = await ItemsDB.get_all_items()
-        return success_response(data=items)
+        continuation_token = decode_cursor(cursor)
+    except ValueError:
+        return bad_request_response(message="Invalid cursor")
+    
+    if wants_stream(request.headers.get("accept"), stream):
+        return ndjson_response(ItemsDB.iter_item_pages(
+            page_size=STREAM_PAGE_SIZE,
+            continuation_token=continuation_token
+        ))
+    
+    try:
+        items, next_token = await ItemsDB.get_items_page(limit=limit, continuation_token=continuation_token)
+        return success_response(data=items, next_cursor=encode_cursor(next_token))
     except Exception as e:
         return error_response(message=f"Database error: {str(e)}")
 
@@ -29,12 +54,48 @@ async def create_item(item: Item, db=Depends(get_db)):
     except Exception as e:
         return error_response(message=f"Database error: {str(e)}")
 
+@router.post("/batch")
+async def create_items_batch(items: List[Dict[str, Any]] = Body(...), db=Depends(get_db)):
+    if not items:
+        return bad_request_response(message="No items to create")
+    if len(items) > ITEM_BATCH_MAX_SIZE:
+        return bad_request_response(message=f"A batch can contain at most {ITEM_BATCH_MAX_SIZE} items")
+    
+    # Validate everything up front so only valid items reach Cosmos
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    valid = []
+    for index, raw_item in enumerate(items):
+        try:
+            valid.append((index, ItemCreateDto(**raw_item).dict()))
+        except ValidationError as e:
+            results[index] = {
+                "index": index,
+                "success": False,
+                "errors": [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()]
+            }
+    
+    outcomes = await ItemsDB.create_items([item_dict for _, item_dict in valid])
+    for (index, _), outcome in zip(valid, outcomes):
+        if isinstance(outcome, Exception):
+            results[index] = {"index": index, "success": False, "errors": [f"Database error: {str(outcome)}"]}
+        else:
+            results[index] = {"index": index, "success": True, "data": outcome}
+    
+    created = sum(1 for result in results if result["success"])
+    if created == len(items):
+        return created_response(data=results, message=f"Created {created} items")
+    return success_response(
+        data=results,
+        message=f"Created {created} of {len(items)} items",
+        status_code=status.HTTP_207_MULTI_STATUS
+    )
+
 @router.get("/{item_id}")
-async def get_item(item_id: str, db=Depends(get_db)):
+async def get_item(item_id: str, request: Request, db=Depends(get_db)):
     item = await ItemsDB.get_item(item_id)
     if not item:
         return not_found_response(message="Item not found")
-    return success_response(data=item)
+    return document_response(item, if_none_match=request.headers.get("if-none-match"))
 
 @router.put("/{item_id}")
 async def update_item(item_id: str, item: Item, db=Depends(get_db)):
@@ -46,6 +107,34 @@ async def update_item(item_id: str, item: Item, db=Depends(get_db)):
         message="Item updated successfully"
     )
 
+@router.patch("/{item_id}")
+async def patch_item(item_id: str, changes: ItemUpdateDto, request: Request, db=Depends(get_db)):
+    # Only ship fields the client actually sent; required fields cannot be cleared,
+    # while a null groupId takes the item out of its group
+    fields = {
+        field: value
+        for field, value in changes.dict(exclude_unset=True).items()
+        if value is not None or field in ("description", "groupId")
+    }
+    if not fields:
+        return bad_request_response(message="No fields to update")
+    
+    try:
+        patched_item = await ItemsDB.patch_item(item_id, fields, etag=request.headers.get("if-match"))
+    except exceptions.CosmosAccessConditionFailedError:
+        return precondition_failed_response(message="Item has been modified")
+    except Exception as e:
+        return error_response(message=f"Database error: {str(e)}")
+    
+    if not patched_item:
+        return not_found_response(message="Item not found")
+    etag = patched_item.get("_etag")
+    return success_response(
+        data=patched_item,
+        message="Item updated successfully",
+        headers={"ETag": etag} if etag else None
+    )
+
 @router.delete("/{item_id}", status_code=status.HTTP_200_OK)
 async def delete_item(item_id: str, db=Depends(get_db)):
     success = await ItemsDB.delete_item(item_id)
@@ -0,0 +1,61 @@
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+import asyncio
+import json
+import logging
+
+from ..auth import decode_token
+from ..realtime import ClientConnection, get_connection_hub
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/api/realtime",
+    tags=["realtime"],
+)
+
+@router.websocket("/ws")
+async def realtime_socket(websocket: WebSocket, token: str = Query(...)):
+    """
+    Push group changes to the client
+
+    Clients send {"type": "subscribe", "payload": {"groupId": ...}} (or
+    "unsubscribe") and receive {"type": ..., "payload": ...} events such as
+    EXPENSE_ADDED, EXPENSE_UPDATED and EXPENSE_DELETED for subscribed groups.
+    """
+    try:
+        decode_token(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    hub = get_connection_hub()
+    connection = ClientConnection(websocket)
+    hub.add(connection)
+    sender = asyncio.ensure_future(connection.send_loop())
+
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if not isinstance(message, dict):
+                continue
+
+            payload = message.get("payload") or {}
+            group_id = payload.get("groupId") if isinstance(payload, dict) else None
+            if not group_id:
+                continue
+
+            if message.get("type") == "subscribe":
+                hub.subscribe(connection, group_id)
+            elif message.get("type") == "unsubscribe":
+                hub.unsubscribe(connection, group_id)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"WebSocket error: {str(e)}")
+    finally:
+        hub.remove(connection)
+        sender.cancel()
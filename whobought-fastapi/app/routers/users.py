@@ -1,11 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Body, Request
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, status, Body, Request, Query
+from typing import List, Optional
 from fastapi.responses import JSONResponse
 
 from ..models import User
 from ..database import UsersDB
 from ..dependencies import get_db
-from ..responses import success_response, error_response, not_found_response, created_response
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, STREAM_PAGE_SIZE, encode_cursor, decode_cursor, wants_stream
+from ..responses import success_response, error_response, not_found_response, created_response, bad_request_response, ndjson_response, document_response
 
 router = APIRouter(
     prefix="/api/users",
@@ -14,10 +15,27 @@ router = APIRouter(
 )
 
 @router.get("/")
-async def get_users(request: Request, db=Depends(get_db)):
+async def get_users(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db=Depends(get_db)
+):
     try:
-        users = await UsersDB.get_all_users()
-        return success_response(data=users)
+        continuation_token = decode_cursor(cursor)
+    except ValueError:
+        return bad_request_response(message="Invalid cursor")
+    
+    if wants_stream(request.headers.get("accept"), stream):
+        return ndjson_response(UsersDB.iter_user_pages(
+            page_size=STREAM_PAGE_SIZE,
+            continuation_token=continuation_token
+        ))
+    
+    try:
+        users, next_token = await UsersDB.get_users_page(limit=limit, continuation_token=continuation_token)
+        return success_response(data=users, next_cursor=encode_cursor(next_token))
     except Exception as e:
         return error_response(message=f"Database error: {str(e)}")
 
@@ -30,8 +48,8 @@ async def create_user(user: User, db=Depends(get_db)):
         return error_response(message=f"Database error: {str(e)}")
 
 @router.get("/{user_id}")
-async def get_user(user_id: str, db=Depends(get_db)):
+async def get_user(user_id: str, request: Request, db=Depends(get_db)):
     user = await UsersDB.get_user(user_id)
     if not user:
         return not_found_response(message="User not found")
-    return success_response(data=user) 
\ No newline at end of file
+    return document_response(user, if_none_match=request.headers.get("if-none-match")) 
\ No newline at end of file
@@ -0,0 +1,66 @@
+import heapq
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from .balances import from_cents
+
+
+def plan_settlement(net_cents: np.ndarray) -> List[Tuple[int, int, int]]:
+    """
+    Find a short list of transfers that brings every net position to zero
+
+    Greedy heap algorithm: repeatedly match the member who owes the most with
+    the member who is owed the most and transfer the smaller of the two
+    amounts. Each step settles at least one member, so the plan has at most
+    n - 1 transfers and runs in O(n log n).
+
+    Args:
+        net_cents: Net position per member in cents (positive means owed)
+
+    Returns:
+        List of (payer index, recipient index, amount in cents) transfers
+    """
+    creditors = [(-int(amount), index) for index, amount in enumerate(net_cents.tolist()) if amount > 0]
+    debtors = [(int(amount), index) for index, amount in enumerate(net_cents.tolist()) if amount < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers: List[Tuple[int, int, int]] = []
+    while creditors and debtors:
+        owed, creditor = heapq.heappop(creditors)
+        owing, debtor = heapq.heappop(debtors)
+        amount = min(-owed, -owing)
+        transfers.append((debtor, creditor, amount))
+
+        if -owed > amount:
+            heapq.heappush(creditors, (owed + amount, creditor))
+        if -owing > amount:
+            heapq.heappush(debtors, (owing + amount, debtor))
+
+    return transfers
+
+
+def settlement_payments(group_id: str, members: np.ndarray, net_cents: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    Build suggested transfers in the Payment entity shape
+
+    Args:
+        group_id: Group being settled
+        members: Member id per index
+        net_cents: Net position per member in cents
+
+    Returns:
+        List of payment dicts (user_id pays recipient_id the amount)
+    """
+    member_ids = members.tolist()
+    return [
+        {
+            "user_id": member_ids[payer],
+            "recipient_id": member_ids[recipient],
+            "group_id": group_id,
+            "amount": from_cents(amount),
+            "description": "Settlement",
+        }
+        for payer, recipient, amount in plan_settlement(net_cents)
+    ]
@@ -0,0 +1,107 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, TypeVar
+
+import orjson
+
+# Share one Cosmos call between concurrent identical reads; "false" to disable
+SINGLE_FLIGHT_ENABLED = os.environ.get("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+T = TypeVar("T")
+
+
+def _copy(value: Any) -> Any:
+    """Copy shared results down to the documents, like DocumentCache.get does"""
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return [_copy(entry) for entry in value]
+    if isinstance(value, tuple):
+        return tuple(_copy(entry) for entry in value)
+    return value
+
+
+def query_key(kind: str, query: str, parameters: Optional[List[Dict[str, Any]]] = None, *extra: Any) -> Hashable:
+    """Coalescing key for a query: its text, parameters and any paging or partition arguments"""
+    frozen = orjson.dumps(parameters, option=orjson.OPT_SORT_KEYS, default=str) if parameters else b""
+    return (kind, query, frozen) + extra
+
+
+class SingleFlight:
+    """Concurrent identical reads of one container share a single in-flight Cosmos call
+
+    Results are only shared while the call is in flight, so nothing is served
+    after it completes. The write hook (app/invalidation.py) calls invalidate()
+    whenever a write to the container completes, so a read that starts after a
+    write never joins a call issued before it.
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+        # Metrics
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, function: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run function, or join the call already in flight for key
+
+        Args:
+            key: Identity of the read (query text and parameters, or document id)
+            function: Coroutine function performing the read
+
+        Returns:
+            A copy of the shared result; exceptions are raised to every caller
+        """
+        if not self.enabled:
+            return await function()
+
+        future = self._calls.get(key)
+        if future is None:
+            self.calls += 1
+            future = asyncio.ensure_future(function())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._discard(key, done))
+        else:
+            self.coalesced += 1
+        # Shielded so a caller that disconnects does not cancel the read for the others
+        return _copy(await asyncio.shield(future))
+
+    def _discard(self, key: Hashable, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled():
+            # Mark the exception retrieved in case every caller went away
+            future.exception()
+
+    def invalidate(self):
+        """Stop new reads from joining calls already in flight"""
+        self._calls.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the single-flight metrics"""
+        return {
+            "enabled": self.enabled,
+            "inFlight": len(self._calls),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
+
+
+_flights: Dict[str, SingleFlight] = {}
+
+
+def get_single_flight(container_name: str) -> SingleFlight:
+    """Get the shared single-flight group for a container, creating it on first use"""
+    flight = _flights.get(container_name)
+    if flight is None:
+        flight = _flights[container_name] = SingleFlight(container_name, SINGLE_FLIGHT_ENABLED)
+    return flight
+
+
+def single_flight_stats() -> Dict[str, Dict[str, Any]]:
+    """Metrics for every single-flight group, keyed by container name"""
+    return {name: flight.stats() for name, flight in _flights.items()}
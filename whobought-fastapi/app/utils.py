@@ -1,6 +1,10 @@
 import bcrypt
+import os
 from typing import Optional
 
+# bcrypt work factor used for new hashes
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
 def hash_password(password: str) -> str:
     """
     Hash a password using bcrypt
@@ -12,7 +16,7 @@ def hash_password(password: str) -> str:
         Hashed password
     """
     password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password_bytes, salt)
     return hashed.decode('utf-8')
 
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+import bcrypt
+
+from .auth import create_access_token, decode_token
+from .models import Item, ItemCreateDto, LoginRequest, UserCreate
+from .password_pool import get_password_pool
+from .repositories.query_builder import QueryBuilder
+from .responses import success_response
+
+logger = logging.getLogger(__name__)
+
+# Run the warm-up steps in the lifespan before the worker starts serving
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "true").lower() == "true"
+
+# Seconds the whole warm-up may take before the worker starts serving anyway
+WARMUP_TIMEOUT_SECONDS = float(os.environ.get("WARMUP_TIMEOUT_SECONDS", "30"))
+
+_SAMPLE_ITEM = {
+    "id": "7c9e6679-7425-40de-944b-e07fc1f90ae7",
+    "name": "Warm-up",
+    "description": "Warm-up item",
+    "purchasedBy": "warm-up",
+    "amount": 1.5,
+    "paidFor": ["warm-up"],
+    "groupId": "warm-up",
+    "createdAt": "2024-01-01T12:00:00",
+    "updatedAt": "2024-01-01T12:00:00",
+}
+
+
+async def _read_containers(cosmos_manager):
+    """Open pooled connections and fetch container properties (partition key definitions)"""
+    if not cosmos_manager.client:
+        raise RuntimeError("Cosmos DB client is not open")
+    containers = [
+        cosmos_manager.items_container,
+        cosmos_manager.users_container,
+        cosmos_manager.user_lookup_container,
+        cosmos_manager.groups_container,
+        cosmos_manager.payments_container,
+        cosmos_manager.purchases_container,
+        cosmos_manager.balances_container,
+        cosmos_manager.leases_container,
+    ]
+    results = await asyncio.gather(
+        *(container.read() for container in containers if container is not None),
+        return_exceptions=True
+    )
+    failed = [str(result) for result in results if isinstance(result, Exception)]
+    if failed:
+        raise RuntimeError(f"{len(failed)} container(s) could not be read: {failed[0]}")
+
+
+async def _start_password_workers(cosmos_manager):
+    """Start every password hashing worker so the first logins do not pay for process start-up"""
+    pool = get_password_pool()
+    # A cheap hash: this only loads bcrypt in each worker, the cost factor is not being measured
+    hashed = bcrypt.hashpw(b"warm-up", bcrypt.gensalt(rounds=4)).decode("utf-8")
+    await asyncio.gather(*(pool.verify_password("warm-up", hashed) for _ in range(pool.max_workers)))
+
+
+async def _prime_auth(cosmos_manager):
+    """Run token creation and verification once"""
+    decode_token(create_access_token({"sub": "warm-up", "username": "warm-up", "email": "warm-up@example.com"}))
+
+
+async def _prime_validation(cosmos_manager):
+    """Run the request and entity validators, query building and response encoding once"""
+    Item.model_validate(_SAMPLE_ITEM)
+    ItemCreateDto.model_validate({key: _SAMPLE_ITEM[key] for key in ("name", "purchasedBy", "amount", "paidFor")})
+    UserCreate.model_validate({"username": "warm-up", "email": "warm-up@example.com", "password": "warm-up-password"})
+    LoginRequest.model_validate({"username": "warm-up", "password": "warm-up-password"})
+    QueryBuilder().where("groupId", "warm-up").order_by("createdAt", descending=True).limit(50).build()
+    success_response(data=[_SAMPLE_ITEM])
+
+
+WARMUP_STEPS: Dict[str, Callable[[Any], Awaitable[None]]] = {
+    "cosmos": _read_containers,
+    "passwordPool": _start_password_workers,
+    "auth": _prime_auth,
+    "validation": _prime_validation,
+}
+
+
+async def warm_up(cosmos_manager) -> Dict[str, Dict[str, Any]]:
+    """
+    Run the warm-up steps concurrently, logging but not raising failures
+
+    Args:
+        cosmos_manager: The opened CosmosDBManager
+
+    Returns:
+        Outcome and duration of each step, keyed by step name
+    """
+    async def run(name: str, step: Callable[[Any], Awaitable[None]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            await step(cosmos_manager)
+            outcome = {"ok": True}
+        except Exception as e:
+            logger.warning(f"Warm-up step '{name}' failed: {str(e)}")
+            outcome = {"ok": False, "error": str(e)}
+        outcome["durationMs"] = round((time.perf_counter() - started) * 1000, 1)
+        return outcome
+
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(run(name, step) for name, step in WARMUP_STEPS.items()))
+    report = dict(zip(WARMUP_STEPS, outcomes))
+    logger.info(f"Warm-up finished in {(time.perf_counter() - started) * 1000:.0f} ms: {report}")
+    return report
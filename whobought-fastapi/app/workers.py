@@ -0,0 +1,43 @@
+"""Per-worker process state for multi-worker serving (see gunicorn.conf.py)
+
+With preload_app the master imports the app once and forks every worker from
+it. Connections, executors and event-loop bound objects must not be shared
+across that fork, so the singletons are dropped in each worker right after it
+starts and are recreated lazily there. The application lifespan then opens the
+worker's own Cosmos DB client and password hashing pool and closes them when
+the worker shuts down.
+"""
+import logging
+import os
+from typing import Optional
+
+from .auth import get_token_cache
+from .database import CosmosDBManager, get_cosmos_manager
+from .health import get_readiness_probe
+from .metrics import get_metrics
+from .password_pool import get_password_pool
+from .realtime import get_connection_hub
+
+logger = logging.getLogger(__name__)
+
+
+def reset_after_fork(worker_slot: Optional[int] = None):
+    """
+    Forget process-wide singletons inherited from the master
+
+    Args:
+        worker_slot: Stable index of this worker (0..workers-1), used to name
+            its change feed checkpoints
+    """
+    if worker_slot is not None:
+        os.environ["WORKER_SLOT"] = str(worker_slot)
+
+    CosmosDBManager._instance = None
+    get_cosmos_manager.cache_clear()
+    get_password_pool.cache_clear()
+    get_connection_hub.cache_clear()
+    get_token_cache.cache_clear()
+    get_metrics.cache_clear()
+    get_readiness_probe.cache_clear()
+
+    logger.info(f"Worker {os.getpid()} (slot {worker_slot}) reset for a per-worker Cosmos DB client")
@@ -0,0 +1,75 @@
+"""Benchmark response encoding for item lists
+
+Compares the previous path (an envelope dict rendered by Starlette's stdlib
+json JSONResponse) with success_response's orjson envelope.
+
+Usage:
+    python -m benchmarks.bench_responses
+"""
+import time
+import uuid
+from datetime import datetime
+
+from fastapi.responses import JSONResponse
+
+from app.responses import success_response
+
+ITEM_COUNTS = [1_000, 10_000]
+REPEATS = 5
+
+
+def cosmos_items(count: int):
+    """Item documents shaped like the ones read from Cosmos DB"""
+    now = datetime.utcnow().isoformat()
+    users = [str(uuid.uuid4()) for _ in range(8)]
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"Item {index}",
+            "amount": round(1 + index * 0.37, 2),
+            "purchasedBy": users[index % len(users)],
+            "paidFor": users[:1 + index % len(users)],
+            "groupId": "group-1",
+            "createdAt": now,
+            "updatedAt": now,
+            "_etag": f"\"{uuid.uuid4()}\"",
+            "_ts": 1700000000 + index,
+        }
+        for index in range(count)
+    ]
+
+
+def stdlib_response(items):
+    """The envelope as it was encoded before, via ApiResponse.dict() and JSONResponse"""
+    return JSONResponse(content={
+        "data": items,
+        "message": "Success",
+        "success": True,
+        "statusCode": 200,
+        "errors": [],
+        "nextCursor": None,
+        "timestamp": datetime.utcnow().isoformat(),
+    })
+
+
+def best_time(encode, items) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        encode(items)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    print(f"{'items':>8} {'stdlib ms':>10} {'orjson ms':>10} {'speedup':>8} {'bytes':>10}")
+    for item_count in ITEM_COUNTS:
+        items = cosmos_items(item_count)
+        stdlib = best_time(stdlib_response, items)
+        fast = best_time(success_response, items)
+        size = len(success_response(items).body)
+        print(f"{item_count:>8} {stdlib * 1000:>10.2f} {fast * 1000:>10.2f} {stdlib / fast:>7.1f}x {size:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Benchmark the settlement planner against group size
+
+Usage:
+    python -m benchmarks.bench_settlement
+"""
+import time
+
+import numpy as np
+
+from app.settlement import plan_settlement
+
+MEMBER_COUNTS = [10, 100, 1_000, 10_000, 100_000]
+REPEATS = 5
+
+
+def random_net_positions(member_count: int, rng: np.random.Generator) -> np.ndarray:
+    """Random net positions in cents that sum to zero"""
+    net_cents = rng.integers(-100_000, 100_000, size=member_count, dtype=np.int64)
+    net_cents[-1] -= net_cents.sum()
+    return net_cents
+
+
+def main():
+    rng = np.random.default_rng(42)
+    print(f"{'members':>10} {'transfers':>10} {'best ms':>10} {'us/member':>10}")
+    for member_count in MEMBER_COUNTS:
+        net_cents = random_net_positions(member_count, rng)
+        timings = []
+        for _ in range(REPEATS):
+            started = time.perf_counter()
+            transfers = plan_settlement(net_cents)
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        print(f"{member_count:>10} {len(transfers):>10} {best * 1000:>10.2f} {best * 1e6 / member_count:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""End-to-end load test for the API
+
+Boots app.main:app in-process (ASGI, the default) or under uvicorn with N
+workers, seeds users and items, then drives a weighted mix of logins, item
+CRUD and list reads at each concurrency level. Every level starts with a
+login burst (all virtual users log in at once). Throughput, p50/p95/p99
+latency and errors are reported per route and written as JSON so runs can be
+compared across commits.
+
+Usage:
+    python -m benchmarks.loadtest --concurrency 1,8,32 --duration 15 --output loadtest.json
+    python -m benchmarks.loadtest --mode uvicorn --workers 4 --concurrency 16,64
+    python -m benchmarks.loadtest --mix "list=50,get=30,create=10,patch=5,delete=5"
+
+COSMOS_BACKEND defaults to "memory" and RATE_LIMIT_ENABLED to "false" for the run. Each uvicorn worker has its
+own in-memory store, so use --workers 1 with the memory backend or point the
+run at a real account with COSMOS_BACKEND=cosmos.
+
+The command exits with status 1 when any level's error rate exceeds
+--max-error-rate (default 10%), after writing the report.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+DEFAULT_MIX = "login=5,me=10,list=30,get=25,create=15,patch=10,delete=5"
+PASSWORD = "loadtest-password"
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """Parse "operation=weight,..." into weights"""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip():
+            mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise ValueError(f"Unknown operations in mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+class Recorder:
+    """Latencies and statuses per route for one concurrency level"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+
+    def record(self, route: str, seconds: float, status: str):
+        self.latencies.setdefault(route, []).append(seconds)
+        statuses = self.statuses.setdefault(route, {})
+        statuses[status] = statuses.get(status, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        routes = {}
+        total = errors = 0
+        for route, latencies in sorted(self.latencies.items()):
+            latencies.sort()
+            statuses = self.statuses[route]
+            route_errors = sum(count for status, count in statuses.items() if not status.startswith(("2", "3")))
+            total += len(latencies)
+            errors += route_errors
+            routes[route] = {
+                "count": len(latencies),
+                "throughput": round(len(latencies) / elapsed, 2),
+                "errors": route_errors,
+                "statuses": dict(sorted(statuses.items())),
+                "latencyMs": {
+                    "p50": round(percentile(latencies, 0.50) * 1000, 2),
+                    "p95": round(percentile(latencies, 0.95) * 1000, 2),
+                    "p99": round(percentile(latencies, 0.99) * 1000, 2),
+                    "mean": round(sum(latencies) / len(latencies) * 1000, 2),
+                    "max": round(latencies[-1] * 1000, 2),
+                },
+            }
+        return {
+            "requests": total,
+            "throughput": round(total / elapsed, 2),
+            "errors": errors,
+            "errorRate": round(errors / total, 4) if total else 0.0,
+            "routes": routes,
+        }
+
+
+class LoadTest:
+    """Shared state for the virtual users: seeded accounts, known item ids and the recorder"""
+
+    def __init__(self, client: httpx.AsyncClient, rng: random.Random):
+        self.client = client
+        self.rng = rng
+        self.users: List[Dict[str, str]] = []
+        self.tokens: List[str] = []
+        self.item_ids: List[str] = []
+        self.groups = [str(uuid.uuid4()) for _ in range(10)]
+        self.recorder = Recorder()
+
+    async def request(self, route: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except Exception as e:
+            self.recorder.record(route, time.perf_counter() - started, type(e).__name__)
+            return None
+        self.recorder.record(route, time.perf_counter() - started, str(response.status_code))
+        return response
+
+    def item_body(self) -> Dict[str, Any]:
+        members = self.rng.sample([user["id"] for user in self.users], k=min(3, len(self.users)))
+        return {
+            "name": f"Item {self.rng.randrange(1_000_000)}",
+            "description": "load test",
+            "purchasedBy": members[0],
+            "amount": round(self.rng.uniform(1, 200), 2),
+            "paidFor": members,
+            "groupId": self.rng.choice(self.groups),
+        }
+
+    async def seed(self, user_count: int, item_count: int):
+        """Register users and bulk-create items through the API"""
+        run_id = uuid.uuid4().hex[:8]
+        for index in range(user_count):
+            username = f"load-{run_id}-{index}"
+            response = await self.client.post("/api/auth/register", json={
+                "username": username,
+                "email": f"{username}@example.com",
+                "password": PASSWORD,
+            })
+            response.raise_for_status()
+            self.users.append({"id": response.json()["data"]["user"]["id"], "username": username})
+
+        for start in range(0, item_count, 100):
+            batch = [self.item_body() for _ in range(min(100, item_count - start))]
+            response = await self.client.post("/api/items/batch", json=batch)
+            for result in response.json().get("data") or []:
+                if result.get("success"):
+                    self.item_ids.append(result["data"]["id"])
+
+    def auth_headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.rng.choice(self.tokens)}"} if self.tokens else {}
+
+
+async def op_login(test: LoadTest, route: str = "POST /api/auth/login"):
+    user = test.rng.choice(test.users)
+    response = await test.request(route, "POST", "/api/auth/login", json={
+        "username": user["username"],
+        "password": PASSWORD,
+    })
+    if response is not None and response.status_code == 200:
+        token = response.json()["data"]["token"]["access_token"]
+        if len(test.tokens) < 1000:
+            test.tokens.append(token)
+
+
+async def op_me(test: LoadTest):
+    await test.request("GET /api/auth/me", "GET", "/api/auth/me", headers=test.auth_headers())
+
+
+async def op_list(test: LoadTest):
+    response = await test.request("GET /api/items/", "GET", "/api/items/", params={"limit": 50})
+    if response is not None and response.status_code == 200 and test.rng.random() < 0.3:
+        cursor = response.json().get("nextCursor")
+        if cursor:
+            await test.request("GET /api/items/?cursor", "GET", "/api/items/", params={"limit": 50, "cursor": cursor})
+
+
+async def op_get(test: LoadTest):
+    if test.item_ids:
+        await test.request("GET /api/items/{id}", "GET", f"/api/items/{test.rng.choice(test.item_ids)}")
+
+
+async def op_create(test: LoadTest):
+    response = await test.request("POST /api/items/", "POST", "/api/items/", json=test.item_body())
+    if response is not None and response.status_code == 201:
+        test.item_ids.append(response.json()["data"]["id"])
+
+
+async def op_patch(test: LoadTest):
+    if test.item_ids:
+        await test.request(
+            "PATCH /api/items/{id}", "PATCH", f"/api/items/{test.rng.choice(test.item_ids)}",
+            json={"name": f"Renamed {test.rng.randrange(1_000_000)}", "amount": round(test.rng.uniform(1, 200), 2)}
+        )
+
+
+async def op_delete(test: LoadTest):
+    # Keep a floor of items so reads and patches stay meaningful
+    if len(test.item_ids) > 100:
+        item_id = test.item_ids.pop(test.rng.randrange(len(test.item_ids)))
+        await test.request("DELETE /api/items/{id}", "DELETE", f"/api/items/{item_id}")
+
+
+OPERATIONS = {
+    "login": op_login,
+    "me": op_me,
+    "list": op_list,
+    "get": op_get,
+    "create": op_create,
+    "patch": op_patch,
+    "delete": op_delete,
+}
+
+
+async def run_level(test: LoadTest, concurrency: int, duration: float, mix: Dict[str, float]) -> Dict[str, Any]:
+    """Login burst, then the mixed workload for duration seconds with concurrency virtual users"""
+    test.recorder = Recorder()
+    started = time.perf_counter()
+    await asyncio.gather(*(op_login(test, "POST /api/auth/login [burst]") for _ in range(concurrency)))
+
+    operations = [OPERATIONS[name] for name in mix]
+    weights = list(mix.values())
+    deadline = time.perf_counter() + duration
+
+    async def virtual_user():
+        while time.perf_counter() < deadline:
+            await test.rng.choices(operations, weights)[0](test)
+
+    await asyncio.gather(*(virtual_user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"concurrency": concurrency, "elapsedSeconds": round(elapsed, 2), **test.recorder.summary(elapsed)}
+
+
+@asynccontextmanager
+async def asgi_client(concurrency: int):
+    """Client calling the app in-process, with its lifespan running"""
+    from app.main import app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+            yield client
+
+
+@asynccontextmanager
+async def uvicorn_client(concurrency: int, workers: int, port: int):
+    """Client calling the app under a uvicorn subprocess"""
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=os.environ.copy()
+    )
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60, limits=limits) as client:
+            for _ in range(100):
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn did not become ready")
+            yield client
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> Dict[str, Any]:
+    levels = [int(level) for level in args.concurrency.split(",")]
+    mix = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+
+    if args.mode == "uvicorn":
+        client_context = uvicorn_client(max(levels), args.workers, args.port)
+    else:
+        client_context = asgi_client(max(levels))
+
+    results = []
+    async with client_context as client:
+        test = LoadTest(client, rng)
+        await test.seed(args.users, args.items)
+        for concurrency in levels:
+            result = await run_level(test, concurrency, args.duration, mix)
+            results.append(result)
+            print(
+                f"concurrency {concurrency:>4}: {result['throughput']:>9.1f} req/s, "
+                f"{result['errors']} errors ({result['errorRate']:.1%})",
+                file=sys.stderr
+            )
+
+    return {
+        "meta": {
+            "maxErrorRate": args.max_error_rate,
+            "startedAt": datetime.utcnow().isoformat(),
+            "commit": git_commit(),
+            "mode": args.mode,
+            "workers": args.workers if args.mode == "uvicorn" else 1,
+            "cosmosBackend": os.environ.get("COSMOS_BACKEND"),
+            "python": platform.python_version(),
+            "durationSeconds": args.duration,
+            "users": args.users,
+            "seedItems": args.items,
+            "mix": mix,
+            "seed": args.seed,
+        },
+        "levels": results,
+    }
+
+
+def failed_levels(report: Dict[str, Any], max_error_rate: float) -> List[Dict[str, Any]]:
+    """Levels whose error rate exceeds max_error_rate"""
+    return [level for level in report["levels"] if level["errorRate"] > max_error_rate]
+
+
+def warn_failed(levels: List[Dict[str, Any]], max_error_rate: float):
+    """Print which levels and routes failed, so a broken run cannot pass for a slow one"""
+    print("=" * 72, file=sys.stderr)
+    print(f"FAILED: error rate above {max_error_rate:.1%}; throughput and latency are not meaningful",
+          file=sys.stderr)
+    for level in levels:
+        print(f"  concurrency {level['concurrency']}: {level['errors']}/{level['requests']} errors "
+              f"({level['errorRate']:.1%})", file=sys.stderr)
+        for route, stats in level["routes"].items():
+            if stats["errors"]:
+                print(f"    {route}: {stats['statuses']}", file=sys.stderr)
+    print("=" * 72, file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the API with a mixed workload")
+    parser.add_argument("--mode", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (uvicorn mode)")
+    parser.add_argument("--port", type=int, default=8765, help="uvicorn port (uvicorn mode)")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated virtual user counts to sweep")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per concurrency level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--users", type=int, default=20, help="Users registered before the run")
+    parser.add_argument("--items", type=int, default=500, help="Items created before the run")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the workload")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument(
+        "--max-error-rate", type=float, default=0.1,
+        help="Exit with status 1 if any level has a larger share of non-2xx/3xx responses (default: 0.1)"
+    )
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("COSMOS_BACKEND", "memory")
+    # Every virtual user logs in from the same address
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    if args.mode == "uvicorn" and args.workers > 1 and os.environ["COSMOS_BACKEND"] == "memory":
+        print("warning: each uvicorn worker has its own in-memory store; logins and reads may miss "
+              "data written through another worker", file=sys.stderr)
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    failed = failed_levels(report, args.max_error_rate)
+    if failed:
+        warn_failed(failed, args.max_error_rate)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
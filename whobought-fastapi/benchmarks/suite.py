@@ -0,0 +1,258 @@
+"""Microbenchmarks for the request hot path, with stored baselines
+
+Each benchmark is timed with timeit and reported as the best time per call.
+Results are compared with benchmarks/baselines.json; a benchmark slower than
+its baseline by more than the threshold is reported as a regression and the
+suite exits with status 1.
+
+Usage:
+    python -m benchmarks.suite                  # run and compare with the baselines
+    python -m benchmarks.suite --save           # run and store the results as the new baselines
+    python -m benchmarks.suite --filter auth    # only benchmarks whose name contains "auth"
+    python -m benchmarks.suite --threshold 0.1 --json results.json
+
+Baselines are machine specific: record them with --save on the machine that
+runs the comparison.
+"""
+import argparse
+import json
+import platform
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+BASELINES_PATH = Path(__file__).with_name("baselines.json")
+DEFAULT_THRESHOLD = 0.15
+REPEATS = 5
+
+# name -> (setup returning the callable to time, fixed number of calls per repeat or None to autorange)
+BENCHMARKS: Dict[str, tuple] = {}
+
+
+def benchmark(name: str, number: Optional[int] = None):
+    """Register a setup function that returns the callable to time"""
+    def register(setup: Callable[[], Callable[[], Any]]):
+        BENCHMARKS[name] = (setup, number)
+        return setup
+    return register
+
+
+@benchmark("auth.create_access_token")
+def bench_create_access_token():
+    from app.auth import create_access_token
+    claims = {"sub": "550e8400-e29b-41d4-a716-446655440000", "username": "johndoe", "email": "john@example.com"}
+    return lambda: create_access_token(claims)
+
+
+@benchmark("auth.decode_token[verify]")
+def bench_decode_token_verify():
+    from app.auth import create_access_token, decode_token, get_token_cache
+    token = create_access_token({"sub": "550e8400-e29b-41d4-a716-446655440000", "username": "johndoe"})
+    cache = get_token_cache()
+
+    def run():
+        cache.clear()
+        decode_token(token)
+    return run
+
+
+@benchmark("auth.decode_token[cached]")
+def bench_decode_token_cached():
+    from app.auth import create_access_token, decode_token
+    token = create_access_token({"sub": "550e8400-e29b-41d4-a716-446655440000", "username": "johndoe"})
+    decode_token(token)
+    return lambda: decode_token(token)
+
+
+def _response_benchmark(item_count: int):
+    def setup():
+        from app.responses import success_response
+        from benchmarks.bench_responses import cosmos_items
+        items = cosmos_items(item_count)
+        return lambda: success_response(data=items)
+    return setup
+
+
+for _item_count in (1, 100, 1_000, 10_000):
+    benchmark(f"responses.success_response[{_item_count}]")(_response_benchmark(_item_count))
+
+
+@benchmark("models.Item.model_validate")
+def bench_item_validation():
+    from app.models import Item
+    data = {
+        "id": "7c9e6679-7425-40de-944b-e07fc1f90ae7",
+        "name": "Groceries",
+        "description": "Weekly shopping",
+        "purchasedBy": "user1",
+        "amount": 45.5,
+        "paidFor": ["user1", "user2", "user3"],
+        "groupId": "group1",
+        "createdAt": "2024-01-01T12:00:00",
+        "updatedAt": "2024-01-01T12:00:00",
+    }
+    return lambda: Item.model_validate(data)
+
+
+@benchmark("models.ItemCreateDto.model_validate")
+def bench_item_create_validation():
+    from app.models import ItemCreateDto
+    data = {
+        "name": "Groceries",
+        "description": "Weekly shopping",
+        "purchasedBy": "user1",
+        "amount": 45.5,
+        "paidFor": ["user1", "user2", "user3"],
+        "groupId": "group1",
+    }
+    return lambda: ItemCreateDto.model_validate(data)
+
+
+@benchmark("models.UserCreateDto.model_validate")
+def bench_user_create_validation():
+    from app.models import UserCreateDto
+    data = {"username": "johndoe", "email": "john@example.com", "password": "securepassword123"}
+    return lambda: UserCreateDto.model_validate(data)
+
+
+@benchmark("utils.hash_password[BCRYPT_ROUNDS]", number=1)
+def bench_hash_password():
+    from app.utils import hash_password
+    return lambda: hash_password("securepassword123")
+
+
+@benchmark("utils.verify_password[BCRYPT_ROUNDS]", number=1)
+def bench_verify_password():
+    from app.utils import hash_password, verify_password
+    hashed = hash_password("securepassword123")
+    return lambda: verify_password("securepassword123", hashed)
+
+
+def _item_query(builder):
+    return (
+        builder
+        .where("groupId", "group1")
+        .contains("name", "grocer")
+        .array_contains("paidFor", "user1")
+        .order_by("createdAt", descending=True)
+        .limit(50)
+        .build()
+    )
+
+
+@benchmark("query_builder.build[cached shape]")
+def bench_query_build():
+    from app.repositories.query_builder import QueryBuilder
+    return lambda: _item_query(QueryBuilder())
+
+
+@benchmark("query_builder.build[compile]")
+def bench_query_compile():
+    from app.repositories.query_builder import QueryBuilder, compile_query
+
+    def run():
+        compile_query.cache_clear()
+        _item_query(QueryBuilder())
+    return run
+
+
+def run_benchmark(setup: Callable[[], Callable[[], Any]], number: Optional[int]) -> Dict[str, Any]:
+    """Time one benchmark and return its best seconds per call"""
+    function = setup()
+    timer = timeit.Timer(function)
+    if number is None:
+        number, _ = timer.autorange()
+    timings = timer.repeat(repeat=REPEATS, number=number)
+    return {"seconds": min(timings) / number, "number": number}
+
+
+def load_baselines() -> Dict[str, float]:
+    if not BASELINES_PATH.exists():
+        return {}
+    return json.loads(BASELINES_PATH.read_text()).get("benchmarks", {})
+
+
+def save_baselines(results: Dict[str, Dict[str, Any]]):
+    baselines = load_baselines()
+    baselines.update({name: result["seconds"] for name, result in results.items()})
+    BASELINES_PATH.write_text(json.dumps({
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": dict(sorted(baselines.items())),
+    }, indent=2) + "\n")
+
+
+def format_time(seconds: float) -> str:
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.2f} us"
+
+
+def compare(results: Dict[str, Dict[str, Any]], baselines: Dict[str, float], threshold: float) -> List[Dict[str, Any]]:
+    """Attach the change against the baseline and a status to every result"""
+    report = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        entry = {"name": name, "seconds": result["seconds"], "number": result["number"], "baseline": baseline}
+        if baseline is None:
+            entry.update(change=None, status="new")
+        else:
+            change = result["seconds"] / baseline - 1
+            if change > threshold:
+                status = "REGRESSION"
+            elif change < -threshold:
+                status = "faster"
+            else:
+                status = "ok"
+            entry.update(change=change, status=status)
+        report.append(entry)
+    return report
+
+
+def print_report(report: List[Dict[str, Any]], threshold: float):
+    width = max(len(entry["name"]) for entry in report)
+    print(f"{'benchmark':<{width}} {'time':>12} {'baseline':>12} {'change':>8}  status (threshold {threshold:.0%})")
+    for entry in report:
+        baseline = format_time(entry["baseline"]) if entry["baseline"] is not None else "-"
+        change = f"{entry['change']:+.1%}" if entry["change"] is not None else "-"
+        print(f"{entry['name']:<{width}} {format_time(entry['seconds']):>12} {baseline:>12} {change:>8}  {entry['status']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the hot path microbenchmarks")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown reported as a regression (default: 0.15)")
+    parser.add_argument("--save", action="store_true", help="Store the results as the new baselines")
+    parser.add_argument("--json", metavar="PATH", help="Also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, (setup, number) in BENCHMARKS.items():
+        if args.filter in name:
+            results[name] = run_benchmark(setup, number)
+
+    if not results:
+        print(f"No benchmarks match {args.filter!r}")
+        return 1
+
+    report = compare(results, load_baselines(), args.threshold)
+    print_report(report, args.threshold)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"threshold": args.threshold, "results": report}, indent=2) + "\n")
+    if args.save:
+        save_baselines(results)
+        print(f"Saved baselines to {BASELINES_PATH}")
+        return 0
+
+    regressions = [entry["name"] for entry in report if entry["status"] == "REGRESSION"]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
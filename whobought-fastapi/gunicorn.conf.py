@@ -0,0 +1,89 @@
+"""gunicorn settings: one uvicorn worker per core, each with its own Cosmos DB client
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+Every setting can be overridden with the environment variables below.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# Address to listen on
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# Async workers, one per core by default
+workers = int(os.environ.get("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Every worker has its own document cache and a write only clears the copy in the worker that served it,
+# so other workers could serve an item older than one the client just wrote (and its old ETag) until the
+# TTL ran out. Items are therefore not cached with several workers unless DOC_CACHE_TTL_<ITEMS> is set.
+if workers > 1:
+    os.environ.setdefault(f"DOC_CACHE_TTL_{os.environ.get('COSMOS_CONTAINER_NAME', 'items').upper()}", "0")
+
+# Import the app once in the master so workers start by forking it
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Seconds an idle keep-alive connection is held open (uvicorn's timeout_keep_alive)
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "30"))
+
+# Seconds a worker may stay silent before it is restarted, and to finish requests on shutdown
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+# Restart a worker after this many requests (plus jitter), 0 to never restart
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+# Peers whose X-Forwarded-For and X-Forwarded-Proto uvicorn applies to the request. uvicorn takes
+# the leftmost X-Forwarded-For entry, which the client controls, so no remote peer is trusted; the
+# auth rate limits read the client address from the header themselves (TRUSTED_PROXY_HOPS)
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# Directory the workers write their metrics to so /metrics reports the whole instance;
+# set here, before the app is preloaded, and emptied on start
+os.environ.setdefault(
+    "METRICS_MULTIPROCESS_DIR",
+    os.path.join(tempfile.gettempdir(), f"whobought-metrics-{os.getpid()}")
+)
+
+# Requests are logged by the app's instrumentation middleware
+accesslog = None
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    """Start the instance's metrics from zero"""
+    directory = os.environ["METRICS_MULTIPROCESS_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def on_exit(server):
+    shutil.rmtree(os.environ["METRICS_MULTIPROCESS_DIR"], ignore_errors=True)
+
+
+def pre_fork(server, worker):
+    """Give the new worker the lowest slot not held by a live worker"""
+    taken = {getattr(live, "slot", None) for live in server.WORKERS.values()}
+    worker.slot = next(slot for slot in range(len(taken) + 1) if slot not in taken)
+
+
+def post_fork(server, worker):
+    """Drop the singletons inherited from the master before the worker starts its app"""
+    # Share the cores between the workers' password hashing pools
+    os.environ.setdefault(
+        "PASSWORD_HASH_WORKERS",
+        str(max(1, multiprocessing.cpu_count() // server.num_workers))
+    )
+
+    from app.workers import reset_after_fork
+    reset_after_fork(worker.slot)
+
+
+def child_exit(server, worker):
+    """Keep an exited worker's counters in the instance totals"""
+    from app.metrics import archive_worker
+    archive_worker(os.environ["METRICS_MULTIPROCESS_DIR"], worker.pid)